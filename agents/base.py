@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from core.data_manager import DataManager
 from core.llm import LLMInterface
@@ -13,9 +14,16 @@ class BaseAgent:
     Provides common access to DataManager, LLM, and Logging.
     提供对数据管理器、LLM 和日志记录的通用访问。
     """
-    def __init__(self, data_manager: DataManager):
+    def __init__(self, data_manager: DataManager, llm=None, llm_client=None):
+        """
+        Args:
+            data_manager: Data access for the current novel (may be None during ideation).
+            llm: Optional LLM interface override (e.g. a scheduler-bound interface
+                 when several novels run concurrently). Defaults to LLMInterface.
+            llm_client: Optional LLMClient session used by the default LLMInterface.
+        """
         self.data_manager = data_manager
-        self.llm = LLMInterface()
+        self.llm = llm or LLMInterface(llm_client)
         self.console = console
         self.monitor = monitor
 
@@ -33,6 +41,20 @@ class BaseAgent:
         """
         return self.llm.chat_with_status(messages, description, target_length)
 
+    def chat_parallel(self, message_batches, description="Processing...", max_workers=None):
+        """
+        Send several independent chat requests concurrently and return the responses in order.
+        并发发送多个相互独立的聊天请求，按输入顺序返回结果。
+
+        Uses the quiet (non-Live) path, since only one live status line can be shown at a time.
+        """
+        if not message_batches:
+            return []
+        self.console.print(f"[cyan]⚡ {description} (并发 {len(message_batches)} 个请求)[/cyan]")
+        workers = max_workers or len(message_batches)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.llm.chat_quiet, message_batches))
+
     def clean_json(self, text: str) -> str:
         """
         Clean JSON string (remove markdown blocks).
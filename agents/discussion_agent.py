@@ -1,9 +1,12 @@
+import re
 from typing import List, Dict, Any
 from .base import BaseAgent
 from rich.panel import Panel
 from rich.markdown import Markdown
 import config.prompt_config as prompt_config
-import json
+from core.similarity import char_shingles, jaccard
+from core import codec
+
 
 class DiscussionAgent(BaseAgent):
     """
@@ -11,68 +14,176 @@ class DiscussionAgent(BaseAgent):
     and generate structured chapter plans.
     """
 
-    def __init__(self, data_manager):
-        super().__init__(data_manager)
+    # Display names of the expert personas, in consultation order
+    EXPERT_NAMES = {
+        "plot": "剧情策划",
+        "character": "角色设计",
+        "world": "世界观架构"
+    }
+
+    def __init__(self, data_manager, llm=None, llm_client=None):
+        super().__init__(data_manager, llm, llm_client)
         self.experts = {
             "plot": prompt_config.DISCUSSION_PLOT_EXPERT,
             "character": prompt_config.DISCUSSION_CHARACTER_EXPERT,
             "world": prompt_config.DISCUSSION_WORLD_EXPERT
         }
 
-    def run_discussion(self, context: str, topic: str, rounds: int = 1) -> str:
+    # Bounded-context settings
+    MAX_DIGEST_CHARS = 600       # Hard cap on the between-round digest
+    CONSENSUS_THRESHOLD = 0.6    # Mean round-over-round similarity that counts as agreement
+    AGREEMENT_MARKERS = ("无补充", "没有补充", "同意", "赞同", "达成共识", "无异议")
+    # A marker only counts when it is not negated ("不同意", "不太赞同", "没有达成共识", ...)
+    _AGREEMENT_RE = re.compile(
+        r"(?<!不)(?<!没)(?<!未)(?<!非)(?<!不太)(?<!不完全)(?<!无法)(?<!没有)(?<!并未)(?:"
+        + "|".join(map(re.escape, AGREEMENT_MARKERS)) + ")")
+
+    def run_discussion(self, context: str, topic: str, rounds: int = 1, mode: str = "sequential",
+                       cross_critique: bool = False, bounded: bool = True) -> str:
         """
         Runs a multi-turn discussion among experts.
         
         Args:
             context: The current story context (summary, setting, etc.)
             topic: The goal of this discussion (e.g., "Plan Chapter 10")
-            rounds: How many rounds of discussion to hold.
+            rounds: Maximum number of rounds of discussion to hold.
+            mode: "sequential" - each expert sees the previous experts' output (3 serial calls per round).
+                  "parallel" - all experts answer concurrently (about 1 call latency per round).
+            cross_critique: Parallel mode only. After each round, every expert critiques the
+                  others' answers in a second concurrent pass.
+            bounded: Fold earlier rounds into a compact digest instead of re-sending every
+                  opinion, and stop early once the experts agree. Prompt size then grows
+                  linearly with the number of rounds instead of quadratically.
             
         Returns:
             A summary of the discussion.
         """
         self.console.print(Panel(f"开启剧情研讨会: {topic}", style="bold magenta"))
         
-        discussion_log = []
-        
         # Initial Context for the experts
         base_prompt = f"背景信息：\n{context}\n\n本次研讨议题：{topic}"
         
-        current_context = base_prompt
+        digest = ""
+        history = base_prompt  # Unbounded transcript, used only when bounded=False
+        previous: Dict[str, str] = {}
         
         for r in range(rounds):
-            self.console.print(f"[bold]--- 第 {r+1} 轮讨论 ---[/bold]")
+            self.console.print(f"[bold]--- 第 {r+1} 轮讨论{' (并行)' if mode == 'parallel' else ''} ---[/bold]")
             
-            # 1. Plot Expert
-            plot_response = self._consult_expert("plot", current_context)
-            self._print_expert_opinion("剧情策划", plot_response)
-            discussion_log.append(f"【剧情策划】: {plot_response}")
-            current_context += f"\n\n剧情策划意见：{plot_response}"
+            if bounded:
+                round_context = base_prompt + (f"\n\n前几轮研讨纪要：\n{digest}" if digest else "")
+            elif mode == "parallel" and previous:
+                round_context = base_prompt + "\n\n上一轮专家意见：\n" + self._format_opinions(previous)
+            else:
+                round_context = history
             
-            # 2. Character Expert
-            char_response = self._consult_expert("character", current_context)
-            self._print_expert_opinion("角色设计", char_response)
-            discussion_log.append(f"【角色设计】: {char_response}")
-            current_context += f"\n\n角色设计意见：{char_response}"
+            if mode == "parallel":
+                opinions = self._parallel_round(base_prompt, round_context, cross_critique)
+            else:
+                opinions = self._sequential_round(round_context)
             
-            # 3. World Expert
-            world_response = self._consult_expert("world", current_context)
-            self._print_expert_opinion("世界观架构", world_response)
-            discussion_log.append(f"【世界观架构】: {world_response}")
-            current_context += f"\n\n世界观架构意见：{world_response}"
+            if not bounded:
+                history = (history if mode != "parallel" else base_prompt) + "\n\n" + self._format_opinions(opinions)
+            
+            agreed = bounded and previous and self._reached_consensus(previous, opinions)
+            previous = opinions
+            if agreed:
+                self.console.print(f"[green]专家意见已趋于一致，第 {r+1} 轮后提前结束研讨。[/green]")
+                break
+            
+            if bounded and r < rounds - 1:
+                digest = self._digest_round(digest, opinions)
+
+        if bounded:
+            discussion_history = base_prompt
+            if digest:
+                discussion_history += f"\n\n前几轮研讨纪要：\n{digest}"
+            discussion_history += "\n\n最终一轮专家意见：\n" + self._format_opinions(previous)
+        else:
+            discussion_history = history
 
         # Summarize
         self.console.print("[bold magenta]正在汇总研讨结论...[/bold magenta]")
-        summary = self._summarize_discussion(current_context)
+        summary = self._summarize_discussion(discussion_history)
         return summary
 
-    def _consult_expert(self, expert_type: str, context: str) -> str:
-        """Get opinion from a specific expert persona."""
-        sys_prompt = self.experts[expert_type]
+    def _sequential_round(self, round_context: str) -> Dict[str, str]:
+        """Each expert builds on the previous experts' opinions within the round."""
+        opinions: Dict[str, str] = {}
+        current_context = round_context
+        for expert_type, role_name in self.EXPERT_NAMES.items():
+            response = self._consult_expert(expert_type, current_context)
+            self._print_expert_opinion(role_name, response)
+            opinions[expert_type] = response
+            current_context += f"\n\n{role_name}意见：{response}"
+        return opinions
+
+    def _parallel_round(self, base_prompt: str, round_context: str, cross_critique: bool) -> Dict[str, str]:
+        """All experts answer the same context concurrently."""
+        expert_types = list(self.EXPERT_NAMES)
+        responses = self.chat_parallel(
+            [self._expert_messages(e, round_context) for e in expert_types],
+            description="专家并行研讨中..."
+        )
+        opinions = dict(zip(expert_types, responses))
+        
+        if cross_critique:
+            opinions = self._cross_critique(base_prompt, opinions)
+        
+        for expert_type in expert_types:
+            self._print_expert_opinion(self.EXPERT_NAMES[expert_type], opinions[expert_type])
+        return opinions
+
+    def _digest_round(self, digest: str, opinions: Dict[str, str]) -> str:
+        """Fold one round of opinions into the running digest (bounded size)."""
         messages = [
+            {"role": "system", "content": prompt_config.DISCUSSION_DIGEST_SYSTEM.content},
+            {"role": "user", "content": f"【已有纪要】\n{digest or '无'}\n\n【本轮专家意见】\n{self._format_opinions(opinions)}"}
+        ]
+        new_digest = self.chat(messages, description="正在整理研讨纪要...")
+        if not new_digest or new_digest.startswith("Error"):
+            # Fall back to the most recent part of the transcript so the context stays bounded
+            fallback = (digest + "\n" + self._format_opinions(opinions)).strip()
+            return fallback[-self.MAX_DIGEST_CHARS:]
+        return new_digest[:self.MAX_DIGEST_CHARS]
+
+    def _reached_consensus(self, previous: Dict[str, str], current: Dict[str, str]) -> bool:
+        """
+        Cheap consensus check without an LLM call: either every expert explicitly
+        agrees, or the experts are mostly repeating their previous round.
+        """
+        if all(self._AGREEMENT_RE.search(text) for text in current.values()):
+            return True
+        scores = [jaccard(char_shingles(previous.get(k, ""), 2), char_shingles(v, 2)) for k, v in current.items()]
+        return bool(scores) and sum(scores) / len(scores) >= self.CONSENSUS_THRESHOLD
+
+    def _cross_critique(self, base_prompt: str, opinions: Dict[str, str]) -> Dict[str, str]:
+        """Every expert revises its opinion after reading the others', concurrently."""
+        batches = []
+        for expert_type, own in opinions.items():
+            others = {k: v for k, v in opinions.items() if k != expert_type}
+            critique = prompt_config.DISCUSSION_CROSS_CRITIQUE.content.format(
+                other_opinions=self._format_opinions(others),
+                own_opinion=own
+            )
+            batches.append(self._expert_messages(expert_type, f"{base_prompt}\n\n{critique}"))
+        
+        responses = self.chat_parallel(batches, description="专家交叉点评中...")
+        return dict(zip(opinions.keys(), responses))
+
+    def _format_opinions(self, opinions: Dict[str, str]) -> str:
+        return "\n\n".join(f"{self.EXPERT_NAMES[k]}意见：{v}" for k, v in opinions.items())
+
+    def _expert_messages(self, expert_type: str, context: str) -> List[Dict[str, str]]:
+        sys_prompt = self.experts[expert_type]
+        return [
             {"role": "system", "content": sys_prompt.content},
             {"role": "user", "content": context}
         ]
+
+    def _consult_expert(self, expert_type: str, context: str) -> str:
+        """Get opinion from a specific expert persona."""
+        messages = self._expert_messages(expert_type, context)
         response = self.chat(messages, description=f"{expert_type} thinking...")
         return response
 
@@ -121,6 +232,6 @@ class DiscussionAgent(BaseAgent):
         sys_prompt = prompt_config.CREATIVE_BRIEF_GENERATOR
         messages = [
             {"role": "system", "content": sys_prompt.content},
-            {"role": "user", "content": json.dumps(chapter_plan, ensure_ascii=False)}
+            {"role": "user", "content": codec.dumps(chapter_plan)}
         ]
         return self.chat(messages, description="Generating creative report...")
@@ -8,15 +8,21 @@ from rich.panel import Panel
 from rich.prompt import Prompt, IntPrompt, Confirm
 from rich.markdown import Markdown
 
-from core.data_manager import DataManager
+from core.data_manager import DataManager, NovelView
 from core.context_manager import ContextManager
-from config.llm_config import LLMConfig, llm_client
+from config.llm_config import llm_client as default_llm_client
 import config.category_config as category_config
 
 from agents.planning_agent import PlanningAgent
 from agents.writer_agent import WriterAgent
 from agents.review_agent import ReviewAgent
 from agents.pacing_agent import PacingAgent
+from agents.volume_planner import VolumePlanner
+from agents.memory_worker import MemoryWorker
+from agents.novel_pipeline import NovelPipeline, run_concurrent
+from agents.novel_factory import NovelFactory
+from core.scheduler import LLMScheduler
+from core.idea_index import IdeaIndex
 
 console = Console()
 
@@ -26,7 +32,14 @@ class ManagerAgent:
     Manages the overall workflow, user interaction, and delegates tasks to specific agents.
     协调者。管理整体工作流、用户交互，并将任务委派给特定的 Agent。
     """
-    def __init__(self):
+    # Idea rounds in a row that may come back empty (e.g. all deduplicated) before
+    # filtering against existing novels is dropped, and before giving up after that
+    IDEA_RETRY_LIMIT = 3
+
+    def __init__(self, llm_client=None):
+        # LLM session for this manager (model choices and fallbacks are scoped to it)
+        # 本管理器使用的 LLM 会话（模型选择与故障转移仅作用于该会话）
+        self.llm_client = llm_client or default_llm_client
         self.novel_type = "long"
         self.root_dirs = {
             "long": os.path.join(os.getcwd(), "novel"),
@@ -43,9 +56,11 @@ class ManagerAgent:
         self.target_chapter_words = 2000
         self.low_score_count = 0
         self.instability_miss_count = 0
+        # Generate setting.json as skeleton + parallel sections (faster, fewer JSON repairs)
+        self.sectioned_setting = True
         
         self.data_manager: Optional[DataManager] = None
-        self.context_manager = ContextManager(max_chars=LLMConfig.DEFAULT_CONTEXT_WINDOW_CHARS)
+        self.context_manager = ContextManager(self.llm_client.config)
         
         # Sub-Agents (Initialized later when DataManager is ready)
         # 子 Agent（在 DataManager 准备好后初始化）
@@ -53,15 +68,19 @@ class ManagerAgent:
         self.writer: Optional[WriterAgent] = None
         self.reviewer: Optional[ReviewAgent] = None
         self.pacer: Optional[PacingAgent] = None
+        self.volume_planner: Optional[VolumePlanner] = None
+        self.memory_worker: Optional[MemoryWorker] = None
 
     def _init_agents(self):
         """Initialize sub-agents with the current DataManager."""
         """使用当前 DataManager 初始化子 Agent。"""
         if self.data_manager:
-            self.planner = PlanningAgent(self.data_manager)
-            self.writer = WriterAgent(self.data_manager)
-            self.reviewer = ReviewAgent(self.data_manager)
-            self.pacer = PacingAgent(self.data_manager)
+            self.planner = PlanningAgent(self.data_manager, llm_client=self.llm_client)
+            self.writer = WriterAgent(self.data_manager, llm_client=self.llm_client)
+            self.reviewer = ReviewAgent(self.data_manager, llm_client=self.llm_client)
+            self.pacer = PacingAgent(self.data_manager, llm_client=self.llm_client)
+            self.volume_planner = VolumePlanner(self.data_manager, self.planner)
+            self.memory_worker = MemoryWorker(self.pacer)
 
     def run(self):
         """Main entry point."""
@@ -86,6 +105,10 @@ class ManagerAgent:
             elif choice == 4:
                 self.configure_author_model()
             elif choice == 5:
+                self.concurrent_writing()
+            elif choice == 6:
+                self.batch_create_novels()
+            elif choice == 7:
                 console.print("[yellow]再见！[/yellow]")
                 break
 
@@ -93,26 +116,26 @@ class ManagerAgent:
         """Test connection to Author and Reviewer models."""
         console.print(Panel("模型连接测试", title="系统检查"))
         if Confirm.ask("是否进行模型连接性测试？(建议首次运行时进行)", default=True):
-            author_model = LLMConfig.AUTHOR_MODEL_KEY
-            reviewer_model = LLMConfig.REVIEWER_MODEL_KEY
+            author_model = self.llm_client.config.author_model_key
+            reviewer_model = self.llm_client.config.reviewer_model_key
             
             if author_model == reviewer_model:
                 with console.status(f"[bold green]正在测试作者与审核模型 ({author_model})...[/bold green]"):
-                    success, msg = llm_client.test_connection(author_model)
+                    success, msg = self.llm_client.test_connection(author_model)
                     if success:
                         console.print(f"[green]✅ 作者与审核模型 ({author_model}) 连接成功！[/green]")
                     else:
                         console.print(f"[red]❌ 作者与审核模型 ({author_model}) 连接失败: {msg}[/red]")
             else:
                 with console.status(f"[bold green]正在测试作者模型 ({author_model})...[/bold green]"):
-                    success, msg = llm_client.test_connection(author_model)
+                    success, msg = self.llm_client.test_connection(author_model)
                     if success:
                         console.print(f"[green]✅ 作者模型 ({author_model}) 连接成功！[/green]")
                     else:
                         console.print(f"[red]❌ 作者模型 ({author_model}) 连接失败: {msg}[/red]")
             
                 with console.status(f"[bold green]正在测试审核模型 ({reviewer_model})...[/bold green]"):
-                    success, msg = llm_client.test_connection(reviewer_model)
+                    success, msg = self.llm_client.test_connection(reviewer_model)
                     if success:
                         console.print(f"[green]✅ 审核模型 ({reviewer_model}) 连接成功！[/green]")
                     else:
@@ -148,13 +171,15 @@ class ManagerAgent:
 2. 加载小说
 3. 开始/继续写作
 4. 作者模型设置
-5. 退出
+5. 多书并发写作
+6. 批量建书
+7. 退出
 """, title=title))
-        return IntPrompt.ask("请选择", choices=["1", "2", "3", "4", "5"])
+        return IntPrompt.ask("请选择", choices=["1", "2", "3", "4", "5", "6", "7"])
 
     def create_novel(self):
         # Temporary Planner for ideation (no DataManager needed yet)
-        temp_planner = PlanningAgent(None) # BaseAgent handles None DM gracefully if just using chat? No, BaseAgent expects DM.
+        temp_planner = PlanningAgent(None, llm_client=self.llm_client) # BaseAgent handles None DM gracefully if just using chat? No, BaseAgent expects DM.
         # Actually BaseAgent just sets self.data_manager. If we don't use it, it's fine.
         # But generate_ideas doesn't use data_manager.
         
@@ -174,6 +199,8 @@ class ManagerAgent:
         target_total_words = IntPrompt.ask("请输入小说预计总字数 (单位：万字)", default=default_total)
         target_chapter_words = IntPrompt.ask("请输入单章目标字数 (单位：字)", default=default_chap)
         
+        idea_count = IntPrompt.ask("请输入候选创意数量 (超过 3 个将并发生成并去重)", default=3)
+        
         requirements = f"{category_summary}\n\n【用户补充要求】\n{user_req}\n\n【字数要求】\n预计总字数：{target_total_words}万字\n单章字数：{target_chapter_words}字"
         
         # 2. Generate Ideas
@@ -181,15 +208,27 @@ class ManagerAgent:
         # Let's instantiate with a dummy DM or handle it.
         # BaseAgent needs DM for init.
         # Workaround: Pass None and ensure generate_ideas doesn't crash.
-        temp_planner = PlanningAgent(None)
+        temp_planner = PlanningAgent(None, llm_client=self.llm_client)
         
         # Loop for idea generation
         current_req = requirements
         selected_idea = None
+        idea_index = IdeaIndex(list(self.root_dirs.values()))
         
+        empty_rounds = 0
         while True:
-            templates = temp_planner.generate_ideas(current_req, self.novel_type)
-            if not templates: continue
+            # Relax deduplication once every candidate was dropped too many times in a row
+            index = idea_index if empty_rounds < self.IDEA_RETRY_LIMIT else None
+            templates = temp_planner.generate_ideas(current_req, self.novel_type, count=idea_count, index=index)
+            if not templates:
+                empty_rounds += 1
+                if empty_rounds >= 2 * self.IDEA_RETRY_LIMIT:
+                    console.print("[red]多次未能生成可用创意，请稍后重试或调整要求。[/red]")
+                    return
+                if empty_rounds == self.IDEA_RETRY_LIMIT:
+                    console.print("[yellow]候选创意均与已有小说近似，本轮起不再按已有小说去重。[/yellow]")
+                continue
+            empty_rounds = 0
 
             console.print("\n[bold cyan]为您生成了以下方案：[/bold cyan]")
             for i, t in enumerate(templates):
@@ -218,7 +257,7 @@ class ManagerAgent:
 
         os.makedirs(self.current_novel_dir)
         # Disable auto-repair for creation mode to avoid premature file generation
-        self.data_manager = DataManager(self.current_novel_dir, enable_auto_repair=False)
+        self.data_manager = DataManager(self.current_novel_dir, enable_auto_repair=False, llm_client=self.llm_client)
         self._init_agents() # Now we have full agents
         
         # 4. Expand Settings
@@ -235,10 +274,13 @@ class ManagerAgent:
         current_setting_req = full_req_dict
         
         while True:
-            setting_json = self.planner.create_setting(selected_idea, current_setting_req)
+            setting_json = self.planner.create_setting(selected_idea, current_setting_req, sectioned=self.sectioned_setting)
+            if isinstance(setting_json, dict):
+                # Keep the original idea so IdeaIndex can fingerprint this novel later
+                setting_json["source_idea"] = selected_idea
             
             # Preview
-            self.data_manager.data["setting"] = setting_json
+            self.data_manager.replace("setting", setting_json, save=False)
             md_preview = self.data_manager.generate_markdown_setting()
             console.print(Panel(Markdown(md_preview), title="设定集预览"))
             
@@ -266,7 +308,13 @@ class ManagerAgent:
         self.novel_config = {
             "total_words_wan": target_total_words,
             "chapter_words": target_chapter_words,
-            "novel_type": self.novel_type
+            "novel_type": self.novel_type,
+            # Long novels fold history into a chapter -> arc -> volume -> book memory tree
+            "memory_mode": "hierarchical" if self.novel_type == "long" else "flat",
+            # Fold one chapter into memory after each archive (flat per-chapter latency)
+            "compression_mode": "incremental",
+            # Run that fold in a background thread, off the critical path
+            "background_compression": True
         }
         # In a real app, save novel_config to file too. DataManager handles 4 specific files. 
         # Maybe add it to setting.json?
@@ -282,7 +330,7 @@ class ManagerAgent:
                 novels.extend([
                     os.path.join(type_dir, d) 
                     for d in os.listdir(type_dir) 
-                    if os.path.isdir(os.path.join(type_dir, d))
+                    if NovelView.is_novel(os.path.join(type_dir, d))
                 ])
         
         if not novels:
@@ -291,13 +339,15 @@ class ManagerAgent:
 
         console.print(Panel("请选择要加载的小说", title="加载小说"))
         for i, path in enumerate(novels):
-            console.print(f"{i+1}. {os.path.basename(path)}")
+            # Lightweight view: reads setting/history only, no repair or LLM calls
+            status = NovelView(path).status()
+            console.print(f"{i+1}. {status['name']}（{status['title']}，已写 {status['chapters']} 章）")
             
         choice = IntPrompt.ask("请选择", choices=[str(i+1) for i in range(len(novels))])
         self.current_novel_dir = novels[choice-1]
         
         # Initialize DataManager (Automatically loads config)
-        self.data_manager = DataManager(self.current_novel_dir)
+        self.data_manager = DataManager(self.current_novel_dir, llm_client=self.llm_client)
         self._init_agents()
         
         # Load core settings to memory for Manager (though Agents should query DataManager directly)
@@ -310,7 +360,7 @@ class ManagerAgent:
 
     def writer_loop(self):
         history = self.data_manager.get_history()
-        start_chapter = len(history.get("chapters", [])) + 1
+        start_chapter = NovelPipeline.next_chapter_from_history(history)
         
         # --- Mode Selection ---
         console.print(Panel("写作模式选择", title="模式"))
@@ -349,12 +399,20 @@ class ManagerAgent:
             
             # Context Management
             settings_text = self.data_manager.generate_markdown_setting()
-            self.pacer.compress_history(self.context_manager, settings_text)
-            
-            # 2. Brief
-            brief = self.pacer.generate_chapter_brief(settings_text, start_chapter, self.novel_type, pacing_status)
+            self.memory_worker.before_brief(self.context_manager, settings_text)
+            
+            # 2. Volume plan (planned lazily; the next volume is prefetched near the end of this one)
+            volume_outline = ""
+            if self.novel_type != "short":
+                self.volume_planner.ensure_plan(start_chapter)
+                self.volume_planner.prefetch_next(start_chapter)
+                volume_outline = self.volume_planner.chapter_outline(start_chapter)
+
+            # 3. Brief
+            brief = self.pacer.generate_chapter_brief(start_chapter, self.novel_type, pacing_status,
+                                                      volume_outline=volume_outline)
             
-            # 3. Writing (with Instability Check)
+            # 4. Writing (with Instability Check)
             # Check pre-write instability
             if self.writer.check_instability_trigger("pre", self.instability_miss_count):
                 # ... handle pre-write instability generation ...
@@ -363,7 +421,7 @@ class ManagerAgent:
             # Note: target_words is now dynamically fetched by WriterAgent from config
             content = self.writer.write_chapter(brief, start_chapter, pacing_status) 
             
-            # 4. Review & Revise Loop
+            # 5. Review & Revise Loop
             final_content = self._review_process(content, start_chapter, auto_config)
             
             if not final_content:
@@ -375,38 +433,25 @@ class ManagerAgent:
                     break
                 continue
                 
-            # 5. Post-Processing
+            # 6. Post-Processing
             # Extract title from content
-            lines = final_content.strip().split('\n')
-            extracted_title = ""
-            if lines:
-                first_line = lines[0].strip()
-                # Try to clean up "第X章" part to get pure title
-                match = re.search(r'第\s*\d+\s*章\s*(.*)', first_line)
-                if match:
-                    extracted_title = match.group(1).strip()
-                elif len(first_line) < 50: # Fallback if no "Chapter X" prefix but looks like title
-                    extracted_title = first_line
+            extracted_title = NovelPipeline.extract_title(final_content)
 
             # Save chapter text file
             self.data_manager.save_chapter_text(start_chapter, final_content, title=extracted_title)
 
             summary_data = self.reviewer.generate_summary(final_content)
-            
-            chapter_entry = {
-                "chapter": start_chapter,
-                "title": f"第 {start_chapter} 章 {extracted_title}" if extracted_title else f"第 {start_chapter} 章",
-                "summary": summary_data.get("summary", ""),
-                "key_events": summary_data.get("key_events", []),
-                "foreshadowing": summary_data.get("foreshadowing", []),
-                "items_acquired": summary_data.get("items_acquired", []),
-                "score": summary_data.get("plot_progression_score", 0)
-            }
-            self.data_manager.add_chapter_history(chapter_entry)
-            
-            # 6. Author Evolution & Life Events
-            self.pacer.evolve_author_style()
-            self.pacer.check_life_event()
+            chapter_entry = NovelPipeline.build_chapter_entry(start_chapter, extracted_title, summary_data)
+
+            # Post-chapter updates are coalesced: each data file is written once when the block exits
+            with self.data_manager.transaction():
+                self.data_manager.add_chapter_history(chapter_entry)
+                # Incremental / background memory: fold now (or off the critical path) instead of a large batch later
+                self.memory_worker.after_archive(self.context_manager, settings_text)
+
+                # 7. Author Evolution & Life Events
+                self.pacer.evolve_author_style()
+                self.pacer.check_life_event()
             
             # Update counters
             start_chapter += 1
@@ -414,23 +459,9 @@ class ManagerAgent:
                 auto_config["written"] += 1
                 console.print(f"[blue]自动进度: {auto_config['written']}/{auto_config['limit']}[/blue]")
             
-            # Check Volume End (Simple logic for now: check if pacing_guide has explicit volume breaks or if we should stop)
-            # Since PacingAgent doesn't explicitly flag volume end, we might rely on user config or structure
-            # For "Volume Mode", we might check if the *next* chapter starts a new volume in structure.
-            # But structure parsing is complex. 
-            # Simplification: If mode is volume, ask user every X chapters? No, that defeats the purpose.
-            # Let's rely on manual stop for volume if not detectable, or check if 'chapter_end' matches current.
+            # Check Volume End: the chapter just written closes a volume in the pacing structure
             if auto_config["mode"] == "volume":
-                 # Try to check if current chapter is an end chapter in structure
-                 setting = self.data_manager.get_setting()
-                 pacing_guide = setting.get("pacing_guide", {})
-                 structure = pacing_guide.get("structure", []) if isinstance(pacing_guide, dict) else pacing_guide
-                 is_volume_end = False
-                 if isinstance(structure, list):
-                     for vol in structure:
-                         if vol.get("chapter_end") == start_chapter - 1:
-                             is_volume_end = True
-                             break
+                 is_volume_end = self.pacer.structure_index().is_volume_end(start_chapter - 1)
                  
                  if is_volume_end:
                      console.print("[green]✅ 本卷已完结。[/green]")
@@ -440,6 +471,9 @@ class ManagerAgent:
                 if not Confirm.ask("继续写下一章？", default=True):
                     break
 
+        # Let a running background fold finish before leaving the writing loop
+        self.memory_worker.wait(None)
+
     def _review_process(self, content, chap_num, auto_config={"mode": "manual"}):
         """Orchestrates the review and revision loop."""
         current_content = content
@@ -515,6 +549,55 @@ class ManagerAgent:
                 
         return current_content
 
+    def concurrent_writing(self):
+        """Write several novels at once, sharing the model quota through an LLMScheduler."""
+        """多本小说并发写作，通过调度器公平共享模型配额。"""
+        novels = [os.path.join(self.base_dir, d) for d in self.get_existing_novels()]
+        if not novels:
+            console.print("[yellow]当前模式下没有找到已有小说。[/yellow]")
+            return
+
+        console.print(Panel("多书并发写作（无人值守，自动审核）", title="并发模式"))
+        names = [os.path.basename(p) for p in novels]
+        selected = self._select_multi("选择要并发写作的小说", names, len(names))
+        if not selected:
+            return
+
+        chapter_count = IntPrompt.ask("每本小说写多少章", default=5)
+        max_workers = IntPrompt.ask("全局最大并发请求数", default=min(8, len(selected) * 2))
+        per_novel = IntPrompt.ask("单本小说最大并发请求数", default=2)
+
+        selected_dirs = [os.path.join(self.base_dir, name) for name in selected]
+        with LLMScheduler(client=self.llm_client, max_workers=max_workers, default_max_concurrency=per_novel) as scheduler:
+            run_concurrent(selected_dirs, chapter_count, scheduler, max_concurrency=per_novel)
+
+    def batch_create_novels(self):
+        """Create many novels unattended from category/style/difficulty combinations."""
+        """按分类、风格、难度组合无人值守地批量建书。"""
+        console.print(Panel("批量建书（无人值守）", title="批量模式"))
+        channels = None
+        if self.novel_type == "long":
+            channel = Prompt.ask("请选择频道", choices=["男频", "女频", "全部"], default="全部")
+            channels = None if channel == "全部" else [channel]
+        difficulty = Prompt.ask("请选择难度", choices=list(category_config.DIFFICULTY_LEVELS.keys()) + ["全部"], default="全部")
+        difficulties = None if difficulty == "全部" else [difficulty]
+
+        total = len(list(category_config.iter_combinations(self.novel_type, channels, difficulties)))
+        count = IntPrompt.ask(f"共 {total} 种组合，本次生成多少本 (等于总数则全部穷举)", default=min(5, total))
+        seed = IntPrompt.ask("随机种子 (相同种子可复现标签抽样)", default=42)
+        if count >= total:
+            combos = list(category_config.iter_combinations(self.novel_type, channels, difficulties, seed=seed))
+        else:
+            combos = category_config.sample_combinations(count, self.novel_type, channels, difficulties, seed=seed)
+
+        max_novels = IntPrompt.ask("同时构建的小说数", default=min(4, len(combos)))
+        max_workers = IntPrompt.ask("全局最大并发请求数", default=8)
+
+        with LLMScheduler(client=self.llm_client, max_workers=max_workers) as scheduler:
+            factory = NovelFactory(self.base_dir, scheduler, novel_type=self.novel_type, max_novels=max_novels,
+                                   sectioned=self.sectioned_setting, index_dirs=list(self.root_dirs.values()))
+            factory.build(combos)
+
     # ... Helper methods like _collect_category_tags, get_existing_novels ...
     # Copied from original main.py but adapted
     
@@ -524,9 +607,8 @@ class ManagerAgent:
             return []
         for d in os.listdir(self.base_dir):
             full_path = os.path.join(self.base_dir, d)
-            if os.path.isdir(full_path):
-                if os.path.exists(os.path.join(full_path, "setting.json")):
-                    novels.append(d)
+            if NovelView.is_novel(full_path):
+                novels.append(d)
         return novels
 
     def _select_multi(self, title: str, options: list, max_selection: int = 2) -> list:
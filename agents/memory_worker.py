@@ -0,0 +1,91 @@
+import threading
+from typing import Optional
+from rich.console import Console
+
+from agents.pacing_agent import PacingAgent
+
+console = Console()
+
+
+class MemoryWorker:
+    """
+    Runs history compression in a background thread once a chapter is archived.
+    章节归档后在后台线程中压缩历史记忆。
+
+    The fold writes a new memory version that is swapped in atomically
+    (DataManager.swap_memory). Before the next brief, callers wait() on a bounded
+    deadline; if the fold is still running, the brief uses the latest completed version.
+    Requests made while a fold is running are coalesced into one follow-up run.
+    """
+
+    # Default seconds the next chapter waits for a running fold before going ahead without it
+    DEFAULT_WAIT = 20.0
+
+    def __init__(self, pacer: PacingAgent):
+        self.pacer = pacer
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pending = None  # (context_manager, settings_text) for the next run
+        self._running = False  # True while the worker loop will still pick up _pending
+
+    @staticmethod
+    def enabled(data_manager) -> bool:
+        return bool(data_manager.get_config_value("setting.config.background_compression", False))
+
+    def schedule(self, context_manager, settings_text: str):
+        """Request a background fold. Returns immediately."""
+        with self._lock:
+            self._pending = (context_manager, settings_text)
+            if self._running:
+                return  # The running loop picks up the pending request
+            self._running = True
+            # Not a daemon: exiting mid-save would leave a truncated history.json
+            self._thread = threading.Thread(target=self._run, name="memory-worker")
+            self._thread.start()
+
+    def before_brief(self, context_manager, settings_text: str):
+        """
+        Call before building the next chapter's context. In background mode, waits on a bounded
+        deadline for a running fold and then runs the inline safety-net check; otherwise
+        compresses inline as before.
+        """
+        if self.enabled(self.pacer.data_manager) and not self.wait(self.DEFAULT_WAIT):
+            return  # Still folding: go ahead with the latest completed memory version
+        self.pacer.compress_history(context_manager, settings_text)
+
+    def after_archive(self, context_manager, settings_text: str):
+        """Call after a chapter is archived: fold in the background, or inline when disabled."""
+        if self.enabled(self.pacer.data_manager):
+            self.schedule(context_manager, settings_text)
+        else:
+            self.pacer.fold_after_archive()
+
+    def busy(self) -> bool:
+        with self._lock:
+            return bool(self._thread and self._thread.is_alive())
+
+    def wait(self, timeout: Optional[float] = DEFAULT_WAIT) -> bool:
+        """Wait up to `timeout` seconds (None = forever). Returns True if no fold is running."""
+        with self._lock:
+            thread = self._thread
+        if thread and thread.is_alive():
+            console.print("[dim]等待后台记忆压缩完成...[/dim]")
+            thread.join(timeout)
+            if thread.is_alive():
+                console.print("[yellow]后台记忆压缩未在时限内完成，本章使用上一版记忆。[/yellow]")
+                return False
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                request, self._pending = self._pending, None
+                if request is None:
+                    self._running = False
+                    return
+            context_manager, settings_text = request
+            try:
+                self.pacer.fold_after_archive(quiet=True)
+                self.pacer.compress_history(context_manager, settings_text, quiet=True)
+            except Exception as e:
+                console.print(f"[red]后台记忆压缩失败: {e}[/red]")
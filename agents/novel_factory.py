@@ -0,0 +1,181 @@
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from rich.console import Console
+from rich.panel import Panel
+
+from core.data_manager import DataManager
+from core.idea_index import IdeaIndex, IdeaDeduplicator, idea_text
+from core.similarity import MinHasher
+import config.category_config as category_config
+from agents.planning_agent import PlanningAgent
+
+console = Console()
+
+
+class NovelFactory:
+    """
+    Unattended batch creation of ready-to-write novels from category combinations.
+    按分类组合无人值守地批量创建可直接开写的小说。
+
+    For each combination it runs the same steps as ManagerAgent.create_novel
+    (ideation -> setting -> author init + structure planning) without prompts.
+    All LLM traffic goes through one LLMScheduler, so its worker count is the
+    global concurrency cap no matter how many novels are in flight.
+    """
+
+    DEFAULT_WORDS = {
+        "long": {"total_words_wan": 200, "chapter_words": 2000},
+        "short": {"total_words_wan": 15, "chapter_words": 3000},
+    }
+
+    def __init__(self, root_dir: str, scheduler, novel_type: str = "long", max_novels: int = 4,
+                 total_words_wan: Optional[int] = None, chapter_words: Optional[int] = None,
+                 sectioned: bool = True, index_dirs: Optional[List[str]] = None):
+        """
+        Args:
+            root_dir: Directory the new novels are created in (novel/ or short_novels/).
+            scheduler: A started LLMScheduler; its max_workers caps in-flight LLM requests.
+            novel_type: 'long' or 'short'.
+            max_novels: How many novels are built at the same time.
+            total_words_wan / chapter_words: Word targets (defaults depend on novel_type).
+            sectioned: Use sectioned parallel setting generation.
+            index_dirs: Directories whose existing novels new ideas must not duplicate.
+        """
+        defaults = self.DEFAULT_WORDS.get(novel_type, self.DEFAULT_WORDS["long"])
+        self.root_dir = root_dir
+        self.scheduler = scheduler
+        self.novel_type = novel_type
+        self.max_novels = max_novels
+        self.total_words_wan = total_words_wan or defaults["total_words_wan"]
+        self.chapter_words = chapter_words or defaults["chapter_words"]
+        self.sectioned = sectioned
+
+        self.deduplicator = IdeaDeduplicator()
+        self.index = IdeaIndex(index_dirs or [root_dir], self.deduplicator)
+        self._claimed: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def build(self, combinations: List[Dict]) -> List[Dict]:
+        """
+        Build one novel per combination, at most `max_novels` at a time.
+        Returns one result per combination: {"combination", "novel_dir", "status", "error"}.
+        """
+        # Snapshot existing novels once; ideas claimed during this run are added under the lock
+        self._claimed = dict(self.index.refresh())
+        console.print(Panel(f"共 {len(combinations)} 个组合，同时构建 {self.max_novels} 本，"
+                            f"全局并发请求上限 {self.scheduler.max_workers}", title="批量建书"))
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_novels)) as pool:
+            results = list(pool.map(self._build_safe, enumerate(combinations)))
+
+        done = sum(1 for r in results if r["status"] == "ok")
+        lines = [f"{'✔' if r['status'] == 'ok' else '✘'} {r['combination']['main_category']} "
+                 f"({r['combination']['difficulty']}) -> {os.path.basename(r['novel_dir']) if r['novel_dir'] else r['error']}"
+                 for r in results]
+        console.print(Panel("\n".join(lines) or "无", title=f"批量建书完成 {done}/{len(results)}"))
+        return results
+
+    def _build_safe(self, item) -> Dict:
+        slot, combo = item
+        result = {"combination": combo, "novel_dir": None, "status": "failed", "error": None}
+        try:
+            result["novel_dir"] = self.build_one(combo, lane_id=f"factory-{slot + 1}")
+            result["status"] = "ok"
+        except Exception as e:
+            result["error"] = str(e)
+            console.print(f"[red][factory-{slot + 1}] {combo['main_category']} 构建失败: {e}[/red]")
+        return result
+
+    def build_one(self, combo: Dict, lane_id: str) -> str:
+        """Run ideation, setting, author init and structure planning for one combination."""
+        self.scheduler.register(lane_id, client=self.scheduler.fork_client())
+        llm = self.scheduler.interface(lane_id)
+        category_summary = category_config.format_combination(combo)
+        requirements = (f"{category_summary}\n\n【字数要求】\n预计总字数：{self.total_words_wan}万字\n"
+                        f"单章字数：{self.chapter_words}字")
+
+        # 1. Ideation
+        ideas = PlanningAgent(None, llm=llm).generate_ideas(requirements, self.novel_type)
+        if not isinstance(ideas, list) or not ideas:
+            raise ValueError("创意生成失败")
+        selected_idea, novel_dir = self._claim_idea(ideas)
+
+        try:
+            data_manager = DataManager(novel_dir, enable_auto_repair=False, llm_client=self.scheduler.client_for(lane_id))
+            planner = PlanningAgent(data_manager, llm=llm)
+
+            # 2. Setting
+            requirement_dict = {
+                "user_input": "",
+                "category": category_summary,
+                "total_words_target": self.total_words_wan * 10000,
+                "avg_chapter_words": self.chapter_words
+            }
+            setting_json = planner.create_setting(selected_idea, requirement_dict, sectioned=self.sectioned)
+            if not isinstance(setting_json, dict) or not setting_json:
+                raise ValueError("设定集生成失败")
+            setting_json["source_idea"] = selected_idea
+            data_manager.replace("setting", setting_json)
+
+            # 3. Author init and structure planning only depend on the setting
+            setting_summary = setting_json.get("meta", {}).get("core_hook", "")
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                author_future = pool.submit(planner.init_author_profile, setting_json)
+                structure_future = pool.submit(planner.plan_structure, self.total_words_wan, self.chapter_words,
+                                               setting_summary, self.novel_type)
+                author_profile = author_future.result()
+                structure = structure_future.result()
+
+            data_manager.update_author(author_profile)
+            data_manager.update_setting({"pacing_guide": structure})
+            data_manager.update_setting({"config": {
+                "total_words_wan": self.total_words_wan,
+                "chapter_words": self.chapter_words,
+                "novel_type": self.novel_type,
+                "memory_mode": "hierarchical" if self.novel_type == "long" else "flat",
+                "compression_mode": "incremental",
+                "background_compression": True,
+                "category": combo
+            }})
+        except Exception:
+            # Do not leave half-built novels behind; they would show up in listings
+            shutil.rmtree(novel_dir, ignore_errors=True)
+            with self._lock:
+                self._claimed.pop(os.path.basename(novel_dir), None)
+            raise
+
+        console.print(f"[green]《{selected_idea.get('title', '无题')}》初始化完成。[/green]")
+        return novel_dir
+
+    def _claim_idea(self, ideas: List[Dict]):
+        """
+        Pick the first idea that does not duplicate an existing or already-claimed novel,
+        and create its directory. Both happen under one lock so parallel builds cannot collide.
+        """
+        threshold = self.deduplicator.threshold
+        with self._lock:
+            for idea in ideas:
+                if not isinstance(idea, dict):
+                    continue
+                sig = self.deduplicator.signature(idea_text(idea))
+                if any(MinHasher.similarity(sig, other) >= threshold for other in self._claimed.values()):
+                    continue
+                novel_dir = self._create_dir(idea)
+                self._claimed[os.path.basename(novel_dir)] = sig
+                return idea, novel_dir
+        raise ValueError("所有创意均与已有小说重复")
+
+    def _create_dir(self, idea: Dict) -> str:
+        novel_name = re.sub(r'[\\/*?:"<>|]', "", idea.get('title', 'New_Novel')) or "New_Novel"
+        base_name = f"short_novel_{novel_name}" if self.novel_type == "short" else novel_name
+        folder_name, suffix = base_name, 1
+        while os.path.exists(os.path.join(self.root_dir, folder_name)):
+            suffix += 1
+            folder_name = f"{base_name}_{suffix}"
+        novel_dir = os.path.join(self.root_dir, folder_name)
+        os.makedirs(novel_dir)
+        return novel_dir
@@ -0,0 +1,252 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+from rich.console import Console
+from rich.panel import Panel
+
+from core.data_manager import DataManager, ChapterConflictError
+from core.context_manager import ContextManager
+from core.monitor import monitor
+from agents.writer_agent import WriterAgent
+from agents.review_agent import ReviewAgent
+from agents.pacing_agent import PacingAgent
+from agents.planning_agent import PlanningAgent
+from agents.volume_planner import VolumePlanner
+from agents.memory_worker import MemoryWorker
+
+console = Console()
+
+
+class NovelPipeline:
+    """
+    Unattended chapter pipeline for a single novel.
+    单本小说的无人值守章节流水线。
+
+    Runs the same steps as ManagerAgent.writer_loop (brief -> write -> review/revise
+    -> archive) without any interactive prompts, so it can run in a worker thread.
+    """
+
+    # Auto-mode quality gate, same thresholds as ManagerAgent._review_process
+    PASS_SCORE = 85
+    MAX_REVISIONS = 2
+
+    def __init__(self, novel_dir: str, llm=None, llm_client=None, context_manager: Optional[ContextManager] = None):
+        """
+        Args:
+            novel_dir: Path to the novel directory (must contain setting.json).
+            llm: Optional LLM interface shared by all sub-agents (e.g. from LLMScheduler.interface()).
+            llm_client: Optional LLMClient session for this novel (ignored by agents when `llm` is given).
+            context_manager: Optional ContextManager; a default one is created otherwise.
+        """
+        self.novel_dir = novel_dir
+        self.novel_id = os.path.basename(novel_dir)
+        self.data_manager = DataManager(novel_dir, llm_client=llm_client)
+        self.writer = WriterAgent(self.data_manager, llm, llm_client)
+        self.reviewer = ReviewAgent(self.data_manager, llm, llm_client)
+        self.pacer = PacingAgent(self.data_manager, llm, llm_client)
+        self.context_manager = context_manager or ContextManager(self.pacer.llm.client.config)
+        self.memory_worker = MemoryWorker(self.pacer)
+        self.volume_planner = VolumePlanner(self.data_manager, PlanningAgent(self.data_manager, llm, llm_client))
+
+        setting = self.data_manager.get_setting()
+        self.novel_config = setting.get("config", {})
+        self.novel_type = self.novel_config.get("novel_type", "long")
+
+    @staticmethod
+    def extract_title(content: str) -> str:
+        """Extract the pure chapter title from the first line of the chapter text."""
+        lines = content.strip().split('\n')
+        if not lines:
+            return ""
+        first_line = lines[0].strip()
+        # Try to clean up "第X章" part to get pure title
+        match = re.search(r'第\s*\d+\s*章\s*(.*)', first_line)
+        if match:
+            return match.group(1).strip()
+        if len(first_line) < 50:  # Fallback if no "Chapter X" prefix but looks like title
+            return first_line
+        return ""
+
+    @staticmethod
+    def build_chapter_entry(chap_num: int, title: str, summary_data: Dict) -> Dict:
+        """Build the history.json entry for an archived chapter."""
+        return {
+            "chapter": chap_num,
+            "title": f"第 {chap_num} 章 {title}" if title else f"第 {chap_num} 章",
+            "summary": summary_data.get("summary", ""),
+            "key_events": summary_data.get("key_events", []),
+            "foreshadowing": summary_data.get("foreshadowing", []),
+            "items_acquired": summary_data.get("items_acquired", []),
+            "characters_involved": summary_data.get("characters_involved", []),
+            "score": summary_data.get("plot_progression_score", 0)
+        }
+
+    @staticmethod
+    def next_chapter_from_history(history: Dict) -> int:
+        """
+        Next chapter number. Uses the last archived entry rather than len(chapters),
+        because compression removes old entries from the active list.
+        """
+        chapters = history.get("chapters", [])
+        if not chapters:
+            return 1
+        last = chapters[-1].get("chapter") if isinstance(chapters[-1], dict) else None
+        return max(len(chapters), int(last or 0)) + 1
+
+    def next_chapter_number(self) -> int:
+        return self.next_chapter_from_history(self.data_manager.get_history())
+
+    def is_complete(self) -> bool:
+        pacing_status = self.pacer.calculate_pacing_status(self.next_chapter_number(), self.novel_config)
+        return pacing_status["progress"] >= 1.0
+
+    def write_next_chapter(self, expected_chapter: Optional[int] = None, before_commit=None) -> Optional[Dict]:
+        """
+        Produce and archive one chapter.
+        Returns the history entry, or None if the chapter could not pass review.
+
+        Args:
+            expected_chapter: If set, the chapter number this call must produce;
+                a mismatch raises ChapterConflictError before any LLM call.
+            before_commit: Optional callback run right before the chapter is committed
+                (e.g. a lease check for distributed workers).
+        """
+        chap_num = self.next_chapter_number()
+        if expected_chapter is not None and chap_num != expected_chapter:
+            raise ChapterConflictError(f"Next chapter is {chap_num}, job expects {expected_chapter}")
+        pacing_status = self.pacer.calculate_pacing_status(chap_num, self.novel_config)
+
+        settings_text = self.data_manager.generate_markdown_setting()
+        self.memory_worker.before_brief(self.context_manager, settings_text)
+
+        volume_outline = ""
+        if self.novel_type != "short":
+            self.volume_planner.ensure_plan(chap_num)
+            self.volume_planner.prefetch_next(chap_num)
+            volume_outline = self.volume_planner.chapter_outline(chap_num)
+
+        brief = self.pacer.generate_chapter_brief(chap_num, self.novel_type, pacing_status,
+                                                  volume_outline=volume_outline)
+        content = self.writer.write_chapter(brief, chap_num, pacing_status)
+
+        final_content = self._auto_review(content, chap_num)
+        if not final_content:
+            return None
+
+        title = self.extract_title(final_content)
+        summary_data = self.reviewer.generate_summary(final_content)
+        chapter_entry = self.build_chapter_entry(chap_num, title, summary_data)
+
+        if before_commit:
+            before_commit()
+        # One write per file for all post-chapter updates
+        with self.data_manager.transaction():
+            # Commit history first so a conflicting writer never overwrites the chapter file
+            self.data_manager.commit_chapter(chapter_entry, expected_chapter=chap_num)
+            self.data_manager.save_chapter_text(chap_num, final_content, title=title)
+            self.memory_worker.after_archive(self.context_manager, settings_text)
+
+            self.pacer.evolve_author_style()
+        return chapter_entry
+
+    def _auto_review(self, content: str, chap_num: int) -> Optional[str]:
+        """Review/revise loop without user interaction."""
+        target_words = self.data_manager.get_config_value("setting.config.chapter_words")
+        if target_words is None:
+            target_words = self.data_manager.get_config_value("setting.chapter_words", 2000)
+        target_words = int(target_words)
+
+        current_content = content
+        for attempt in range(self.MAX_REVISIONS + 1):
+            review = self.reviewer.review_chapter(current_content, {}, self.novel_type)
+            review_record = review.copy()
+            review_record.update({
+                "chapter": chap_num,
+                "attempt": attempt + 1,
+                "auto_mode": "pipeline"
+            })
+            self.data_manager.add_review(review_record)
+
+            if review.get("score", 0) >= self.PASS_SCORE and review.get("passed", False):
+                return current_content
+            if attempt < self.MAX_REVISIONS:
+                feedback = review.get("suggestions", ["优化剧情"])
+                current_content = self.reviewer.revise_chapter(current_content, feedback, target_words=target_words)
+        return None
+
+    def run(self, chapter_count: int) -> List[Dict]:
+        """Write up to `chapter_count` chapters, stopping early if the novel is complete or a chapter fails."""
+        written = []
+        try:
+            for _ in range(chapter_count):
+                if self.is_complete():
+                    console.print(f"[green][{self.novel_id}] 小说已完结。[/green]")
+                    break
+                entry = self.write_next_chapter()
+                if entry is None:
+                    console.print(f"[red][{self.novel_id}] 第 {self.next_chapter_number()} 章多次修改仍未达标，停止该书。[/red]")
+                    break
+                written.append(entry)
+                console.print(f"[blue][{self.novel_id}] 已完成 {entry['title']} ({len(written)}/{chapter_count})[/blue]")
+        finally:
+            # Also on errors: let a background memory fold finish before the caller moves on
+            self.close()
+        return written
+
+    def close(self):
+        """Wait for background work (memory folding) to finish."""
+        self.memory_worker.wait(None)
+
+
+def run_concurrent(novel_dirs: List[str], chapter_count: int, scheduler, weights: Optional[Dict[str, float]] = None,
+                   max_concurrency: int = 2) -> Dict[str, List[Dict]]:
+    """
+    Run one NovelPipeline per novel in parallel threads, sharing an LLMScheduler.
+    多本小说并发写作，共享同一个 LLM 调度器。
+
+    Args:
+        novel_dirs: Novel directories to write.
+        chapter_count: Chapters to write per novel.
+        scheduler: A started LLMScheduler.
+        weights: Optional novel_id -> weight map for fair sharing (default 1.0).
+        max_concurrency: Per-novel cap on in-flight LLM requests.
+
+    Returns:
+        Map of novel_id -> list of archived chapter entries.
+    """
+    weights = weights or {}
+    results: Dict[str, List[Dict]] = {}
+    lock = threading.Lock()
+
+    def _run(novel_dir):
+        novel_id = os.path.basename(novel_dir)
+        try:
+            pipeline = NovelPipeline(novel_dir, llm=scheduler.interface(novel_id),
+                                     llm_client=scheduler.client_for(novel_id))
+            written = pipeline.run(chapter_count)
+        except Exception as e:
+            console.print(f"[red][{novel_id}] 流水线异常终止: {e}[/red]")
+            written = []
+        with lock:
+            results[novel_id] = written
+
+    threads = []
+    for novel_dir in novel_dirs:
+        novel_id = os.path.basename(novel_dir)
+        # Each novel gets its own config copy: a fallback switch in one novel must not move the others
+        scheduler.register(novel_id, weight=weights.get(novel_id, 1.0), max_concurrency=max_concurrency,
+                           client=scheduler.fork_client())
+        t = threading.Thread(target=_run, args=(novel_dir,), name=f"pipeline-{novel_id}")
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+
+    summary = "\n".join(f"{nid}: {len(entries)} 章" for nid, entries in results.items())
+    hit_rate = monitor.cache_hit_rate()
+    if hit_rate is not None:
+        summary += f"\n提示词前缀缓存命中率: {hit_rate:.1%}"
+    console.print(Panel(summary or "无", title="并发写作完成"))
+    return results
@@ -1,22 +1,45 @@
-import json
 import time
 from rich.panel import Panel
 from rich.markdown import Markdown
 from agents.base import BaseAgent
+from core.structure_index import StructureIndex
+from core.story_memory import StoryMemory
+from core.context_assembler import ContextAssembler
+from core.message_builder import MessageBuilder
+from core.tokenizer import counter_for
 import config.prompt_config as prompt_config
+from core import codec
 
 class PacingAgent(BaseAgent):
     """
     Analyzes novel pacing, structure, and author style.
     Handles history compression and life events.
     """
+
+    # Incremental compression: active chapters kept verbatim, and chapters folded per archive step
+    INCREMENTAL_KEEP = 5
+    INCREMENTAL_STEP = 1
+    # Length cap for the flat rolling summary, so folding a chapter at a time cannot grow it without bound
+    ROLLING_SUMMARY_MAX_CHARS = 3000
+    # Upper token cap for the brief context, so long-context models do not get the whole history just because it fits
+    BRIEF_CONTEXT_CAP = 32000
+    # Prompt layer of each brief section (see MessageBuilder); anything not listed is RECENT
+    BRIEF_LAYERS = {
+        "设定集": MessageBuilder.SETTING,
+        "历史背景": MessageBuilder.MEMORY,
+        "未回收伏笔": MessageBuilder.MEMORY,
+        "近期伏笔": MessageBuilder.RECENT,
+        "节奏数据": MessageBuilder.TASK,
+    }
     
+    def structure_index(self) -> StructureIndex:
+        """StructureIndex of the current pacing_guide, rebuilt only when setting.json changes."""
+        return StructureIndex.of(self.data_manager)
+
     def calculate_pacing_status(self, current_chapter: int, novel_config: dict) -> dict:
         """
         Calculate pacing stage based on progress.
         """
-        setting = self.data_manager.get_setting()
-        
         # 1. Calculate Total Chapters Target
         # Use fresh config from DataManager if available, fallback to passed novel_config
         setting = self.data_manager.get_setting()
@@ -34,54 +57,36 @@ class PacingAgent(BaseAgent):
         calculated_limit = int((target_words_wan * 10000) / chapter_words)
         
         # 2. Override limit if explicitly set in config
-        total_chapters = novel_config.get("chapter_limit", calculated_limit)
+        chapter_limit = novel_config.get("chapter_limit")
         
-        # 3. Fallback to pacing guide structure
-        pacing_guide = setting.get("pacing_guide", {})
-        
-        # Fix: Handle case where pacing_guide is a list (direct structure)
-        if isinstance(pacing_guide, list):
-            pacing_guide = {"structure": pacing_guide}
-            
-        if isinstance(pacing_guide, dict):
-            if pacing_guide.get("total_chapters"):
-                 total_chapters = int(pacing_guide.get("total_chapters"))
-            elif "structure" in pacing_guide and isinstance(pacing_guide["structure"], list) and pacing_guide["structure"]:
-                 last_item = pacing_guide["structure"][-1]
-                 if not novel_config.get("chapter_limit"): 
-                     if "chapter_end" in last_item: # Volume structure
-                         total_chapters = last_item.get("chapter_end", total_chapters)
-                     elif "chapter_id" in last_item: # Flat structure
-                         total_chapters = len(pacing_guide["structure"])
+        # 3. Pacing guide structure (explicit total_chapters, or the last volume/phase/flat entry)
+        index = self.structure_index()
+        total_chapters = index.total_chapters(chapter_limit or calculated_limit, chapter_limit)
         
         limit = max(total_chapters, 5)
         remaining = max(0, limit - current_chapter)
-        progress = current_chapter / limit if limit > 0 else 0
-        
-        stage = "未知阶段"
-        if progress < 0.2:
-            stage = "铺垫期 (0-20%)"
-        elif progress < 0.5:
-            stage = "发展期 (20-50%)"
-        elif progress < 0.8:
-            stage = "高潮期 (50-80%)"
-        else:
-            stage = "收尾期 (80-100%)"
+        position = index.lookup(current_chapter, limit)
             
         return {
             "total": limit,
             "current": current_chapter,
             "remaining": remaining,
-            "stage": stage,
-            "progress": progress
+            "stage": position["stage"],
+            "progress": position["progress"],
+            "volume": position["volume"],
+            "beat": position["beat"],
+            "is_volume_end": position["is_volume_end"]
         }
 
-    def generate_chapter_brief(self, context_text, chap_num, novel_type, pacing_status):
-        """Generate a pre-write brief for the upcoming chapter."""
+    def generate_chapter_brief(self, chap_num, novel_type, pacing_status, volume_outline=""):
+        """
+        Generate a pre-write brief for the upcoming chapter.
+        The setting is always rendered from data_manager, fixed per volume (see brief_setting).
+
+        Args:
+            volume_outline: Optional current-volume plan text (see VolumePlanner.chapter_outline).
+        """
         history = self.data_manager.get_history()
-        history_context = f"【历史背景】\n{history.get('rolling_summary', '')}\n\n"
-        recent_chapters = json.dumps(history.get('chapters', []), ensure_ascii=False, indent=2)
-        history_context += f"【最近章节摘要】\n{recent_chapters}"
         
         if novel_type == "short":
              type_str = "短篇小说 (无分卷)"
@@ -108,50 +113,214 @@ class PacingAgent(BaseAgent):
 - 当前阶段：{pacing_status['stage']}
 - 总体进度：{int(pacing_status.get('progress', 0) * 100)}%
 """
+        system_prompt = prompt_config.CHAPTER_BRIEF_SYSTEM.content
+        task = f"【当前任务】请为 **第 {chap_num} 章** 生成创作简报。"
+        budget, count = self.context_budget(system_prompt + task)
+        assembler = ContextAssembler(budget, estimate=count)
+        self._add_brief_sections(assembler, history, pacing_info, volume_outline, chap_num, count)
+        sections = assembler.assemble_sections()
+        if assembler.report:
+            self.console.print(f"[dim]{assembler.summary()}[/dim]")
         
-        messages = [
-            {"role": "system", "content": prompt_config.CHAPTER_BRIEF_SYSTEM.content},
-            {"role": "user", "content": f"【当前任务】请为 **第 {chap_num} 章** 生成创作简报。\n\n{pacing_info}\n\n{context_text}\n\n{history_context}"}
-        ]
+        # Setting and memory go ahead of the per-chapter sections, so consecutive briefs share a cacheable prefix
+        builder = MessageBuilder(system_prompt)
+        for name, text in sections:
+            builder.add(self.BRIEF_LAYERS.get(name, MessageBuilder.RECENT), text)
+        messages = builder.add(MessageBuilder.TASK, task).build()
+        prefix = builder.prefix_hash()
+        self.log_event("PROMPT_PREFIX", {"chapter": chap_num, "prefix_hash": prefix[:16],
+                                         "reused": prefix == getattr(self, "_brief_prefix", None)})
+        self._brief_prefix = prefix
         
         brief = self.chat(messages, description=f"正在生成第 {chap_num} 章创作简报...")
         self.console.print(Panel(Markdown(brief), title=f"📋 第 {chap_num} 章创作简报 (Anti-Drift Check)"))
         return brief
 
-    def compress_history(self, context_manager, settings_text):
-        """Compress old chapters into rolling summary based on context manager."""
+    def context_budget(self, fixed_text=""):
+        """
+        (token budget, token counter) for assembled context: the author model's input window
+        minus `fixed_text` (system prompt etc.), capped at BRIEF_CONTEXT_CAP.
+        """
+        config = self.llm.client.config
+        key = config.author_model_key
+        count = counter_for(config.get_config(key))
+        return min(config.get_input_window(key) - count(fixed_text), self.BRIEF_CONTEXT_CAP), count
+
+    def brief_setting(self, chap_num, count=None):
+        """
+        (setting text, token size or None) for the brief's SETTING layer.
+        Limited to the factions/characters named anywhere in the current volume's skeleton and plan,
+        so it stays the same for every chapter of the volume until the setting changes;
+        the full rendering when there is nothing to filter or no volume structure.
+        """
+        dm = self.data_manager
+        bounds = self.structure_index().bounds(chap_num)
+        if not bounds or not dm.setting_entities():
+            return dm.generate_markdown_setting(), (dm.setting_tokens(count) if count else None)
+        # Projections per volume, dropped when the setting version changes
+        projections = dm.derived("brief_setting", "setting", lambda setting: {})
+        if bounds not in projections:
+            index = self.structure_index()
+            scope = [index.volume_for(chap_num)] + [index.beat_for(c) for c in range(bounds[0], bounds[1] + 1)]
+            projections[bounds] = dm.setting_projection(codec.dumps([e for e in scope if e]))
+        return projections[bounds], None
+
+    def _add_brief_sections(self, assembler, history, pacing_info, volume_outline, chap_num, count=None):
+        """
+        Brief context by priority: pacing (always kept) > current volume/arc outline >
+        open foreshadowing > relevant characters > recent chapters > story so far > relevant setting slice.
+        Each section is rendered in its BRIEF_LAYERS layer, from most static to most volatile,
+        so consecutive briefs share a long prompt prefix that providers can cache.
+        """
+        chapters = [c for c in history.get("chapters", []) if isinstance(c, dict)]
+
+        # Setting: fixed per volume; anyone the active chapters add shows up under 相关角色
+        setting_text, setting_size = self.brief_setting(chap_num, count)
+        assembler.add("设定集", setting_text, priority=6, size=setting_size)
+        recent_text = volume_outline + codec.dumps(chapters)
+        involved = {str(n) for c in chapters for n in c.get("characters_involved", []) or [] if n}
+        assembler.add("历史背景", f"【历史背景】\n{history.get('rolling_summary', '')}"
+                      if history.get("rolling_summary") else "", priority=5)
+
+        # Open foreshadowing: the archived list (memory), then what the active chapters planted (newest last)
+        foreshadowing = [str(f) for f in history.get("foreshadowing", []) if f]
+        assembler.add_items("未回收伏笔", "【未回收伏笔】", [f"- {f}" for f in foreshadowing], priority=2)
+        planted = [f"- （第 {chapter.get('chapter')} 章）{f}"
+                   for chapter in chapters for f in chapter.get("foreshadowing", []) if f]
+        assembler.add_items("近期伏笔", "【近期伏笔】", planted, priority=2)
+
+        # Relevant characters: protagonist plus anyone named in the outline or recent chapters
+        characters = [c for c in self._setting_characters()
+                      if c.get("_role") == "protagonist" or (c.get("name") and (c["name"] in recent_text
+                                                                                or c["name"] in involved))]
+        assembler.add_items("相关角色", "【相关角色】",
+                            [codec.dumps(c) for c in characters],
+                            priority=3, newest_first=False)
+
+        # Recent chapters: compact JSON, one per line, newest kept first
+        assembler.add_items("最近章节", "【最近章节摘要】",
+                            [codec.dumps(c) for c in chapters], priority=4)
+        assembler.add("本卷规划", volume_outline, priority=1)
+        assembler.add("节奏数据", pacing_info, priority=0, required=True)
+
+    def _setting_characters(self):
+        """Characters from setting.json as flat dicts tagged with their role (_role)."""
+        chars = self.data_manager.get_setting().get("characters", {})
+        if not isinstance(chars, dict):
+            return []
+        result = []
+        for role in ("protagonist", "antagonist"):
+            if isinstance(chars.get(role), dict) and chars[role]:
+                result.append(dict(chars[role], _role=role))
+        for sup in chars.get("supporting", []) or []:
+            if isinstance(sup, dict):
+                result.append(dict(sup, _role="supporting"))
+        return result
+
+    def compress_history(self, context_manager, settings_text, quiet=False):
+        """
+        Compress old chapters into rolling summary based on context manager.
+
+        Args:
+            quiet: Use the non-Live LLM path (when run by a background MemoryWorker).
+        """
         history = self.data_manager.get_history()
         
-        if not context_manager.should_compress(settings_text, history):
+        if not context_manager.should_compress(settings_text, history, self.data_manager):
             return
 
         chapters = history.get("chapters", [])
-        keep_count = context_manager.calculate_keep_count(settings_text, history)
+        keep_count = context_manager.calculate_keep_count(settings_text, history, data_manager=self.data_manager)
         
         if len(chapters) <= keep_count:
             return
             
         to_compress = chapters[:-keep_count]
-        keep_active = chapters[-keep_count:]
-        
-        self.console.print(Panel(f"正在压缩前 {len(to_compress)} 章剧情 (保留最后 {keep_count} 章)...", style="bold blue"))
         
-        compress_input = json.dumps(to_compress, ensure_ascii=False, indent=2)
+        message = f"正在压缩前 {len(to_compress)} 章剧情 (保留最后 {keep_count} 章)..."
+        if quiet:
+            self.console.print(f"[dim]后台记忆：{message}[/dim]")
+        else:
+            self.console.print(Panel(message, style="bold blue"))
+
+        self._fold(history, to_compress, quiet=quiet)
+
+    def fold_after_archive(self, keep_count=None, quiet=False):
+        """
+        Incremental mode (setting.config.compression_mode = "incremental"): right after a chapter
+        is archived, fold the oldest chapter beyond the keep window into memory.
+        Work per call is bounded to INCREMENTAL_STEP chapters, so there is no large batch
+        compression later; compress_history then only acts as a safety net.
+        """
+        if self.data_manager.get_config_value("setting.config.compression_mode", "batch") != "incremental":
+            return
+        keep_count = keep_count or self.INCREMENTAL_KEEP
+        history = self.data_manager.get_history()
+        chapters = history.get("chapters", [])
+        if len(chapters) <= keep_count:
+            return
+
+        to_fold = chapters[:len(chapters) - keep_count][:self.INCREMENTAL_STEP]
+        self.console.print(f"[dim]增量记忆：正在折叠第 {to_fold[0].get('chapter', '?')} 章...[/dim]")
+        self._fold(history, to_fold, quiet=quiet)
+
+    def _fold(self, history, to_compress, quiet=False):
+        """
+        Fold `to_compress` into memory using the novel's memory_mode, then swap the result in.
+        The swap is version-checked, so a fold computed from a stale history is discarded.
+        """
+        base_version = history.get("memory_version", 0)
+        if self.data_manager.get_config_value("setting.config.memory_mode", "flat") == "hierarchical":
+            updates = self._compress_hierarchical(history, to_compress, quiet)
+        else:
+            updates = self._compress_flat(history, to_compress, quiet)
+        if not updates:
+            self.console.print("[yellow]记忆更新失败，本次保留原章节。[/yellow]")
+            return
+
+        folded_through = max(int(c.get("chapter", 0)) for c in to_compress)
+        if self.data_manager.swap_memory(updates, folded_through, base_version):
+            self.console.print("[green]✅ 剧情压缩完成，记忆库已更新。[/green]")
+        else:
+            self.console.print("[yellow]记忆已被其他任务更新，丢弃本次压缩结果。[/yellow]")
+
+    def _compress_flat(self, history, to_compress, quiet=False):
+        """Fold chapters into the single rolling_summary string."""
+        compress_input = codec.dumps(to_compress, indent=True)
         current_summary = history.get("rolling_summary", "")
         
         messages = [
             {"role": "system", "content": prompt_config.STORY_COMPRESSION_SYSTEM.content},
-            {"role": "user", "content": f"【当前历史背景】\n{current_summary}\n\n【待压缩章节】\n{compress_input}"}
+            {"role": "user", "content": f"【当前历史背景】\n{current_summary}\n\n【待压缩章节】\n{compress_input}"
+                                        f"\n\n（滚动摘要不超过 {self.ROLLING_SUMMARY_MAX_CHARS} 字）"}
         ]
         
-        new_rolling_summary = self.chat(messages, description="剧情压缩中...")
+        if quiet:
+            new_rolling_summary = self.llm.chat_quiet(messages)
+        else:
+            new_rolling_summary = self.chat(messages, description="剧情压缩中...")
         
         if new_rolling_summary and "Error" not in new_rolling_summary:
-            self.data_manager.update_history({
-                "rolling_summary": new_rolling_summary,
-                "chapters": keep_active
-            })
-            self.console.print("[green]✅ 剧情压缩完成，记忆库已更新。[/green]")
+            return {"rolling_summary": new_rolling_summary}
+        return None
+
+    def _compress_hierarchical(self, history, to_compress, quiet=False):
+        """
+        Fold compressed chapters into the chapter -> arc -> volume -> book memory tree.
+        rolling_summary is re-rendered from the tree so every reader of it keeps working.
+        """
+        memory = StoryMemory(self.llm, self.structure_index(), quiet=quiet)
+        tree = history.get("memory") or StoryMemory.empty(prelude=history.get("rolling_summary", ""))
+        new_tree = memory.fold(tree, to_compress)
+        if new_tree is None:
+            return None
+
+        chapters = history.get("chapters", []) or to_compress
+        next_chapter = int(chapters[-1].get("chapter", len(chapters))) + 1
+        return {
+            "memory": new_tree,
+            "rolling_summary": memory.render(new_tree, next_chapter)
+        }
 
     def evolve_author_style(self):
         """Analyze recent chapters to update author style."""
@@ -161,7 +330,7 @@ class PacingAgent(BaseAgent):
 
         self.console.print("[magenta]正在分析作者近期风格演变...[/magenta]")
         
-        content_sample = json.dumps([c.get("summary", "") for c in recent_chapters], ensure_ascii=False)
+        content_sample = codec.dumps([c.get("summary", "") for c in recent_chapters])
         author = self.data_manager.get_author()
         
         current_style = "暂无"
@@ -3,6 +3,7 @@ from rich.panel import Panel
 from rich.prompt import Prompt, IntPrompt, Confirm
 from rich.markdown import Markdown
 from agents.base import BaseAgent
+from core.idea_index import IdeaDeduplicator
 import config.prompt_config as prompt_config
 
 class PlanningAgent(BaseAgent):
@@ -10,20 +11,57 @@ class PlanningAgent(BaseAgent):
     Handles novel ideation, setting creation, and structure planning.
     """
     
-    def generate_ideas(self, requirements, novel_type="long"):
-        """Generates 3 novel ideas based on requirements."""
+    IDEAS_PER_CALL = 3  # The ideation prompts return 3 ideas per response
+
+    def generate_ideas(self, requirements, novel_type="long", count=3, index=None):
+        """
+        Generates novel ideas based on requirements.
+
+        Args:
+            count: Number of candidate ideas wanted. Up to 3 uses a single call; more are
+                sampled concurrently (ceil(count/3) samples) and near-duplicates are dropped.
+            index: Optional IdeaIndex of existing novels; ideas too similar to one of them are dropped.
+        """
         sys_prompt = prompt_config.SHORT_NOVEL_GEN_SYSTEM if novel_type == "short" else prompt_config.TEMPLATE_GEN_SYSTEM
         
         messages = [
             {"role": "system", "content": sys_prompt.content},
             {"role": "user", "content": f"用户要求：\n{requirements}"}
         ]
-        response = self.chat(messages, description="正在构思 3 个创意模板...")
-            
-        return self.parse_json_safe(response) or []
+        if count <= self.IDEAS_PER_CALL and index is None:
+            response = self.chat(messages, description="正在构思 3 个创意模板...")
+            return self.parse_json_safe(response) or []
+
+        samples = max(1, -(-count // self.IDEAS_PER_CALL))
+        self.console.print(f"[cyan]⚡ 正在并发构思 {samples} 组创意模板...[/cyan]")
+        responses = self.llm.chat_samples(messages, samples)
+
+        ideas = []
+        for response in responses:
+            parsed = self.parse_json_safe(response)
+            if isinstance(parsed, dict):
+                parsed = parsed.get("ideas") or parsed.get("templates") or [parsed]
+            if isinstance(parsed, list):
+                ideas.extend(i for i in parsed if isinstance(i, dict))
+
+        kept, dropped = IdeaDeduplicator().filter(ideas, index=index)
+        if dropped:
+            self.console.print(f"[dim]已过滤 {len(dropped)} 个近似重复的创意: "
+                          + "、".join(f"《{d['idea'].get('title', '无题')}》≈{d['duplicate_of']}" for d in dropped)
+                          + "[/dim]")
+        return kept[:count]
+
+    def create_setting(self, selected_idea, requirements, sectioned=False):
+        """
+        Expands a selected idea into a full setting JSON.
+
+        Args:
+            sectioned: If True, generate a small skeleton first and then the remaining
+                sections concurrently as independent JSON fragments (faster, fewer repairs).
+        """
+        if sectioned:
+            return self.create_setting_sectioned(selected_idea, requirements)
 
-    def create_setting(self, selected_idea, requirements):
-        """Expands a selected idea into a full setting JSON."""
         expand_sys_prompt = prompt_config.SETTING_CREATE_JSON_SYSTEM
         
         full_context = {
@@ -41,6 +79,131 @@ class PlanningAgent(BaseAgent):
         setting_content = self.chat(messages, description="正在构建世界观与架构...")
         return self.parse_json_safe(setting_content)
 
+    def create_setting_sectioned(self, selected_idea, requirements):
+        """
+        Sectioned setting generation.
+        分段生成设定集：先生成核心骨架（元数据、主角、反派），再并发生成世界观、力量体系、势力、配角与人物关系。
+        """
+        full_context = json.dumps({"template": selected_idea, "requirements": requirements}, ensure_ascii=False)
+
+        # 1. Skeleton fixes the core so that sections generated in parallel stay consistent
+        messages = [
+            {"role": "system", "content": prompt_config.SETTING_SKELETON_SYSTEM.content},
+            {"role": "user", "content": f"请基于以下信息生成设定集骨架 JSON：\n{full_context}"}
+        ]
+        skeleton = self.parse_json_safe(self.chat(messages, description="正在确定设定集骨架..."))
+        if not isinstance(skeleton, dict) or not skeleton.get("meta"):
+            self.console.print("[yellow]骨架生成失败，回退到整体生成模式。[/yellow]")
+            return self.create_setting(selected_idea, requirements)
+
+        # 2. Remaining sections concurrently, as schema-validated fragments
+        section_context = f"{full_context}\n\n【已确定的骨架】\n{json.dumps(skeleton, ensure_ascii=False)}"
+        fragments = self._generate_sections(list(prompt_config.SETTING_SECTION_SPECS), section_context)
+
+        # 3. Merge
+        return self._merge_setting(skeleton, fragments)
+
+    def _section_messages(self, section, section_context):
+        spec = prompt_config.SETTING_SECTION_SPECS[section]
+        sys_content = prompt_config.SETTING_SECTION_SYSTEM.content.format(
+            section_title=spec["title"],
+            section_schema=json.dumps(spec["schema"], ensure_ascii=False, indent=4)
+        )
+        return [
+            {"role": "system", "content": sys_content},
+            {"role": "user", "content": f"请生成【{spec['title']}】部分：\n{section_context}"}
+        ]
+
+    def _generate_sections(self, sections, section_context, max_attempts=2):
+        """Generate sections in parallel; regenerate only the fragments that fail validation."""
+        fragments = {}
+        pending = list(sections)
+        for attempt in range(max_attempts):
+            responses = self.chat_parallel(
+                [self._section_messages(sec, section_context) for sec in pending],
+                description="正在并行构建设定集各部分..." if attempt == 0 else "正在重新生成未通过校验的部分..."
+            )
+            failed = []
+            for sec, response in zip(pending, responses):
+                fragment = self._parse_fragment(sec, response, allow_repair=attempt == max_attempts - 1)
+                if fragment is None:
+                    failed.append(sec)
+                else:
+                    fragments[sec] = fragment
+            if not failed:
+                break
+            pending = failed
+
+        missing = [s for s in sections if s not in fragments]
+        if missing:
+            titles = "、".join(prompt_config.SETTING_SECTION_SPECS[s]["title"] for s in missing)
+            self.console.print(f"[yellow]以下部分生成失败，将留空：{titles}[/yellow]")
+        return fragments
+
+    def _parse_fragment(self, section, response, allow_repair=False):
+        """Parse and validate one fragment against its schema. Returns None if invalid."""
+        if not response or response.startswith("Error"):
+            return None
+        cleaned = self.clean_json(response)
+        try:
+            data = json.loads(cleaned, strict=False)
+        except json.JSONDecodeError:
+            # A fresh generation of a small fragment is cheaper than an LLM repair; repair only on the last try
+            if not allow_repair:
+                return None
+            data = self._repair_json_with_llm(cleaned)
+        return data if self._validate_fragment(section, data) else None
+
+    @staticmethod
+    def _validate_fragment(section, data):
+        """
+        Check required keys and value types against the section schema.
+        A list given for a text field is accepted and joined into one string ("；"-separated).
+        """
+        if not isinstance(data, dict):
+            return False
+        for key, example in prompt_config.SETTING_SECTION_SPECS[section]["schema"].items():
+            value = data.get(key)
+            if value in (None, "", [], {}):
+                return False
+            if isinstance(example, list) and not isinstance(value, list):
+                return False
+            if isinstance(example, str):
+                if isinstance(value, list):
+                    data[key] = "；".join(PlanningAgent._as_text(item) for item in value)
+                elif not isinstance(value, str):
+                    return False
+        return True
+
+    @staticmethod
+    def _as_text(item) -> str:
+        """One list item of a text field as a string (e.g. {"name": .., "description": ..} -> "name: description")."""
+        if isinstance(item, str):
+            return item
+        if isinstance(item, dict):
+            return "：".join(str(v) for v in item.values() if v not in (None, ""))
+        return str(item)
+
+    @staticmethod
+    def _merge_setting(skeleton, fragments):
+        """Merge skeleton and section fragments into the setting.json layout."""
+        setting = dict(skeleton)
+        characters = dict(setting.get("characters", {}))
+        world_view = dict(fragments.get("world_view", {}))
+
+        if "power_system" in fragments:
+            world_view["power_system"] = fragments["power_system"]["power_system"]
+        if "factions" in fragments:
+            world_view["factions"] = fragments["factions"]["factions"]
+        if "supporting" in fragments:
+            characters["supporting"] = fragments["supporting"]["supporting"]
+        if "relationships" in fragments:
+            characters["relationships"] = fragments["relationships"]["relationships"]
+
+        setting["world_view"] = world_view
+        setting["characters"] = characters
+        return setting
+
     def init_author_profile(self, setting_json):
         """Initializes the AI author persona."""
         sys_prompt = prompt_config.AUTHOR_INIT_JSON_SYSTEM
@@ -78,3 +241,29 @@ class PlanningAgent(BaseAgent):
         
         plan_content = self.chat(messages, description="正在规划全书结构...")
         return self.parse_json_safe(plan_content) or {}
+
+    def plan_volume_detail(self, volume, setting_summary, story_so_far, quiet=False):
+        """
+        Plans the chapter-level outline of a single volume.
+        Called lazily just before the volume starts, so the plan follows what was actually written.
+
+        Args:
+            quiet: Use the non-Live LLM path (required when running in a background thread).
+        """
+        messages = [
+            {"role": "system", "content": prompt_config.VOLUME_DETAIL_PLANNING_SYSTEM.content},
+            {"role": "user", "content": f"【分卷骨架】\n{json.dumps(volume, ensure_ascii=False)}\n\n"
+                                        f"【设定摘要】\n{setting_summary}\n\n【已写剧情】\n{story_so_far}"}
+        ]
+        if quiet:
+            # No LLM repair here: it would open a live status display from a background thread
+            try:
+                plan = json.loads(self.clean_json(self.llm.chat_quiet(messages) or ""), strict=False)
+            except json.JSONDecodeError:
+                return []
+        else:
+            plan_content = self.chat(messages, description=f"正在规划第 {volume.get('volume_id', '?')} 卷细纲...")
+            plan = self.parse_json_safe(plan_content)
+        if isinstance(plan, dict):
+            plan = plan.get("chapters", [])
+        return [c for c in plan if isinstance(c, dict)] if isinstance(plan, list) else []
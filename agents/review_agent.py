@@ -1,7 +1,7 @@
-import json
 from rich.panel import Panel
 from agents.base import BaseAgent
 import config.prompt_config as prompt_config
+from core import codec
 
 class ReviewAgent(BaseAgent):
     """
@@ -14,7 +14,7 @@ class ReviewAgent(BaseAgent):
         
         messages = [
             {"role": "system", "content": sys_prompt.content},
-            {"role": "user", "content": f"【待审核章节】\n{content}\n\n【上下文】\n{json.dumps(context_data, ensure_ascii=False)}"}
+            {"role": "user", "content": f"【待审核章节】\n{content}\n\n【上下文】\n{codec.dumps(context_data)}"}
         ]
         
         res = self.chat(messages, description="正在审核章节...")
@@ -24,7 +24,7 @@ class ReviewAgent(BaseAgent):
         """Revises the chapter based on feedback."""
         messages = [
             {"role": "system", "content": prompt_config.CHAPTER_REVISE_SYSTEM.content},
-            {"role": "user", "content": f"原文：\n{content}\n\n意见：\n{json.dumps(feedback, ensure_ascii=False)}\n\n目标字数：{target_words}"}
+            {"role": "user", "content": f"原文：\n{content}\n\n意见：\n{codec.dumps(feedback)}\n\n目标字数：{target_words}"}
         ]
         
         return self.chat(messages, description="正在根据意见精修章节...", target_length=target_words)
@@ -0,0 +1,147 @@
+import json
+import threading
+from typing import Dict, List, Optional, Set
+from rich.console import Console
+
+from core.data_manager import DataManager
+from core.structure_index import StructureIndex
+from agents.planning_agent import PlanningAgent
+
+console = Console()
+
+
+class VolumePlanner:
+    """
+    Lazy, volume-at-a-time chapter planning for long novels.
+    长篇小说的按卷惰性细纲规划。
+
+    setting.json only holds the volume skeleton from PlanningAgent.plan_structure.
+    The chapter-level outline of a volume is planned right before that volume starts
+    (from what was actually written), or in the background while the last chapters
+    of the previous volume are being written. Plans are stored in
+    pacing_guide["volume_details"][volume_id].
+    """
+
+    # Start planning the next volume this many chapters before the current one ends
+    PREFETCH_CHAPTERS = 3
+
+    def __init__(self, data_manager: DataManager, planner: PlanningAgent):
+        self.data_manager = data_manager
+        self.planner = planner
+        self._lock = threading.Lock()
+        self._prefetching: Dict[str, threading.Thread] = {}
+        self._failed: Set[str] = set()  # Volumes whose planning failed this run (written from the skeleton only)
+
+    def pacing_guide(self) -> Dict:
+        """Current pacing guide, normalized to the dict form {"structure": [...], ...}."""
+        return StructureIndex.normalize(self.data_manager.get_setting().get("pacing_guide", {}))
+
+    def volume_for(self, chap_num: int) -> Optional[Dict]:
+        return StructureIndex.of(self.data_manager).volume_for(chap_num, include_phases=False)
+
+    def _volume_key(self, volume: Dict) -> str:
+        return str(volume.get("volume_id", volume.get("chapter_start")))
+
+    def get_plan(self, volume: Dict) -> Optional[Dict]:
+        details = self.pacing_guide().get("volume_details", {})
+        return details.get(self._volume_key(volume)) if isinstance(details, dict) else None
+
+    def ensure_plan(self, chap_num: int) -> Optional[Dict]:
+        """
+        Make sure the volume containing `chap_num` has a chapter-level plan, planning it now if needed.
+        Returns the volume plan, or None if the novel has no volume skeleton.
+        """
+        volume = self.volume_for(chap_num)
+        if not volume:
+            return None
+        key = self._volume_key(volume)
+        with self._lock:
+            prefetch = self._prefetching.get(key)
+            failed = key in self._failed
+        if prefetch and prefetch.is_alive():
+            console.print(f"[dim]等待第 {key} 卷细纲后台规划完成...[/dim]")
+            prefetch.join()
+
+        plan = self.get_plan(volume)
+        if plan or failed:
+            return plan
+        chapters = self.planner.plan_volume_detail(volume, self._setting_summary(), self._story_so_far())
+        if not chapters:
+            # Do not re-plan before every chapter: the rest of this run follows the volume skeleton
+            with self._lock:
+                self._failed.add(key)
+            console.print(f"[yellow]第 {key} 卷细纲规划失败，本次运行将按卷纲写作。[/yellow]")
+            return None
+        return self._store(volume, chapters, planned_after=chap_num - 1)
+
+    def prefetch_next(self, chap_num: int):
+        """
+        If `chap_num` is within PREFETCH_CHAPTERS of its volume's end, plan the next volume
+        in a background thread so it is ready when the volume starts.
+        """
+        if not self.volume_for(chap_num):
+            return
+        _, volume_end = StructureIndex.of(self.data_manager).bounds(chap_num)
+        if volume_end - chap_num >= self.PREFETCH_CHAPTERS:
+            return
+        next_volume = self.volume_for(volume_end + 1)
+        if not next_volume or self.get_plan(next_volume):
+            return
+        key = self._volume_key(next_volume)
+        with self._lock:
+            if key in self._prefetching and self._prefetching[key].is_alive():
+                return
+            thread = threading.Thread(target=self._prefetch, args=(next_volume, chap_num),
+                                      name=f"volume-plan-{key}", daemon=True)
+            self._prefetching[key] = thread
+            thread.start()
+        console.print(f"[dim]已在后台规划第 {key} 卷细纲。[/dim]")
+
+    def _prefetch(self, volume: Dict, chap_num: int):
+        try:
+            chapters = self.planner.plan_volume_detail(volume, self._setting_summary(), self._story_so_far(), quiet=True)
+            if chapters:
+                self._store(volume, chapters, planned_after=chap_num)
+        except Exception as e:
+            # ensure_plan will plan the volume synchronously instead
+            console.print(f"[yellow]第 {self._volume_key(volume)} 卷细纲后台规划失败: {e}[/yellow]")
+
+    def chapter_outline(self, chap_num: int) -> str:
+        """Text block describing the current volume and this chapter's planned outline, for the brief."""
+        volume = self.volume_for(chap_num)
+        if not volume:
+            return ""
+        text = (f"【本卷规划】第 {volume.get('volume_id', '?')} 卷《{volume.get('volume_title', '')}》"
+                f"(第 {volume.get('chapter_start')}-{volume.get('chapter_end')} 章)\n"
+                f"- 核心事件：{volume.get('core_event', '')}\n- 本卷目标：{volume.get('objective', '')}\n")
+        beat = StructureIndex.of(self.data_manager).beat_for(chap_num)
+        if beat and "outline" in beat:
+            text += f"- 本章细纲：{beat.get('title', '')} —— {beat.get('outline', '')}\n"
+        return text
+
+    def _store(self, volume: Dict, chapters: List[Dict], planned_after: int) -> Optional[Dict]:
+        if not chapters:
+            return None
+        plan = {"chapters": chapters, "planned_after_chapter": planned_after}
+
+        def add_plan(setting):
+            # Runs under the setting lock, so this (possibly background) write cannot lose other setting updates
+            guide = dict(StructureIndex.normalize(setting.get("pacing_guide", {})))
+            details = dict(guide["volume_details"]) if isinstance(guide.get("volume_details"), dict) else {}
+            details[self._volume_key(volume)] = plan
+            guide["volume_details"] = details
+            # The normalized guide replaces a legacy list-form pacing_guide (a list is not merged into)
+            return {"pacing_guide": guide}
+
+        self.data_manager.update_setting(add_plan)
+        return plan
+
+    def _setting_summary(self) -> str:
+        meta = self.data_manager.get_setting().get("meta", {})
+        return json.dumps(meta, ensure_ascii=False)
+
+    def _story_so_far(self) -> str:
+        history = self.data_manager.get_history()
+        recent = [{"chapter": c.get("chapter"), "summary": c.get("summary", "")}
+                  for c in history.get("chapters", [])[-10:] if isinstance(c, dict)]
+        return f"{history.get('rolling_summary', '') or '（尚未开篇）'}\n\n{json.dumps(recent, ensure_ascii=False)}"
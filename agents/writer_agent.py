@@ -3,6 +3,7 @@ import random
 from rich.panel import Panel
 from agents.base import BaseAgent
 import config.prompt_config as prompt_config
+from core.message_builder import MessageBuilder
 
 class WriterAgent(BaseAgent):
     """
@@ -29,10 +30,11 @@ class WriterAgent(BaseAgent):
         # 确保是整数
         target_words = int(target_words)
 
-        messages = [
-            {"role": "system", "content": prompt_config.CHAPTER_GEN_SYSTEM.content.format(target_words=target_words)},
-            {"role": "user", "content": f"【第 {chap_num} 章创作指令】\n\n{pacing_guidance}\n\n{context}"}
-        ]
+        # Brief first, then the per-chapter instruction and pacing, so the prompt prefix stays cacheable
+        messages = (MessageBuilder(prompt_config.CHAPTER_GEN_SYSTEM.content.format(target_words=target_words))
+                    .add(MessageBuilder.RECENT, str(context))
+                    .add(MessageBuilder.TASK, f"【第 {chap_num} 章创作指令】\n\n{pacing_guidance}")
+                    .build())
         
         content = self.chat(messages, description=f"正在撰写第 {chap_num} 章正文 (目标字数: {target_words})...", target_length=target_words)
         return self._enforce_word_count(content, target_words)
@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import codec
+
+console = Console()
+
+
+def sample_history(chapters: int) -> dict:
+    """A history.json-shaped document with `chapters` archived entries."""
+    return {
+        "status": {"current_volume": 3},
+        "rolling_summary": "主角在宗门大比中崭露头角，结识了来自北境的剑修，却也因此卷入长老之间的暗斗。" * 20,
+        "foreshadowing": [f"第 {i} 章埋下的伏笔：古剑上的裂痕" for i in range(0, chapters, 7)],
+        "chapters": [
+            {
+                "chapter": i,
+                "title": f"第 {i} 章 风起青萍",
+                "summary": "林远在藏经阁发现一卷残缺的剑谱，夜里独自参悟，险些走火入魔，幸得师姐相助。" * 3,
+                "key_events": ["发现剑谱", "夜间修炼", "师姐相助"],
+                "foreshadowing": ["剑谱缺失的最后一页"],
+                "items_acquired": ["残缺剑谱"],
+                "score": 82 + i % 10,
+            }
+            for i in range(1, chapters + 1)
+        ],
+    }
+
+
+def backends():
+    """(name, dumps(obj, indent) -> bytes, loads(bytes)) for every codec installed here."""
+    found = [("json", lambda o, indent: (json.dumps(o, ensure_ascii=False, indent=2) if indent
+                                         else json.dumps(o, ensure_ascii=False, separators=(",", ":"))).encode("utf-8"),
+              json.loads)]
+    if codec.orjson is not None:
+        orjson = codec.orjson
+        found.append(("orjson", lambda o, indent: orjson.dumps(o, option=orjson.OPT_INDENT_2 if indent else 0),
+                      orjson.loads))
+    if codec.msgspec is not None:
+        msgspec = codec.msgspec
+        encoder, decoder = msgspec.json.Encoder(), msgspec.json.Decoder()
+        found.append(("msgspec", lambda o, indent: msgspec.json.format(encoder.encode(o), indent=2) if indent
+                      else encoder.encode(o), decoder.decode))
+    return found
+
+
+def timed(fn, rounds: int) -> float:
+    """Best-of-3 average milliseconds per call."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        best = min(best, (time.perf_counter() - start) / rounds)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON codecs on history-shaped data / JSON 编解码基准")
+    parser.add_argument("--chapters", type=int, default=500, help="Chapters in the sample history")
+    parser.add_argument("--rounds", type=int, default=50, help="Calls per measurement")
+    args = parser.parse_args()
+
+    doc = sample_history(args.chapters)
+    table = Table(title=f"{args.chapters} 章历史数据（当前后端：{codec.BACKEND}）")
+    for col in ["后端", "格式", "编码 ms", "解码 ms", "大小 KB"]:
+        table.add_column(col)
+    for name, dumps, loads in backends():
+        for indent in (True, False):
+            data = dumps(doc, indent)
+            assert loads(data) == doc
+            table.add_row(name, "缩进" if indent else "紧凑",
+                          f"{timed(lambda: dumps(doc, indent), args.rounds):.2f}",
+                          f"{timed(lambda: loads(data), args.rounds):.2f}",
+                          f"{len(data) / 1024:.1f}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
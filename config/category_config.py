@@ -1,4 +1,5 @@
 # category_config.py
+import random
 
 # 1. 题材分类树 (Category Tree)
 CATEGORY_DATA = {
@@ -190,3 +191,76 @@ def get_style_tags():
 
 def get_difficulty_info(level_name):
     return DIFFICULTY_LEVELS.get(level_name, DIFFICULTY_LEVELS["入门"])
+
+# 4. 批量组合 (Batch Combinations)
+# 用于批量建书：主轴（频道 × 主分类 × 难度）穷举，其余标签按种子随机抽取
+RANDOM_TAG = "随机"
+
+# 每个标签维度抽取的数量，与交互式选择的上限一致
+LONG_TAG_COUNTS = {"主题": 2, "角色": 2, "情节": 2}
+SHORT_TAG_COUNTS = {"情节": 3, "角色": 3, "情绪": 2, "背景": 2}
+
+def _concrete(options):
+    return [opt for opt in options if opt != RANDOM_TAG]
+
+def _build_combination(rng, novel_type, channel, main_category, difficulty):
+    counts = SHORT_TAG_COUNTS if novel_type == "short" else LONG_TAG_COUNTS
+    tags = {}
+    for category_type, k in counts.items():
+        options = _concrete(get_options(channel, category_type, novel_type))
+        tags[category_type] = rng.sample(options, min(k, len(options)))
+    style = {name: rng.choice(_concrete(values)) for name, values in STYLE_TAGS.items()}
+    return {
+        "novel_type": novel_type,
+        "channel": channel,
+        "main_category": main_category,
+        "tags": tags,
+        "style": style,
+        "difficulty": difficulty
+    }
+
+def iter_combinations(novel_type="long", channels=None, difficulties=None, seed=None):
+    """
+    Enumerate every (channel, main category, difficulty) combination.
+    Secondary tags and style tags are sampled with a seeded RNG so a run is reproducible.
+    novel_type: 'long' or 'short' (short novels have no channel)
+    """
+    rng = random.Random(seed)
+    if novel_type == "short":
+        channels = [None]
+    else:
+        channels = channels or list(CATEGORY_DATA.keys())
+    difficulties = difficulties or list(DIFFICULTY_LEVELS.keys())
+    for channel in channels:
+        for main_category in _concrete(get_options(channel, "主分类", novel_type)):
+            for difficulty in difficulties:
+                yield _build_combination(rng, novel_type, channel, main_category, difficulty)
+
+def sample_combinations(count, novel_type="long", channels=None, difficulties=None, seed=None):
+    """Randomly sample `count` distinct primary combinations (see iter_combinations)."""
+    rng = random.Random(seed)
+    combos = list(iter_combinations(novel_type, channels, difficulties, seed=seed))
+    return rng.sample(combos, min(count, len(combos)))
+
+def format_combination(combo):
+    """Render a combination as the same 【分类标签】 summary the interactive flow produces."""
+    tags = combo.get("tags", {})
+    if combo.get("novel_type") == "short":
+        lines = ["类型: 短篇小说", f"主分类: {combo['main_category']}"]
+    else:
+        lines = [f"频道: {combo['channel']}", f"主分类: {combo['main_category']}"]
+    for category_type, values in tags.items():
+        lines.append(f"{category_type}: {', '.join(values) if values else '无'}")
+
+    style = combo.get("style", {})
+    style_lines = [f"{name}: {value}" for name, value in style.items()]
+    difficulty = combo.get("difficulty", "入门")
+    difficulty_info = get_difficulty_info(difficulty)
+
+    summary = "\n【分类标签】\n" + "\n".join(lines) + "\n"
+    if combo.get("main_category") in DESCRIPTIONS:
+        summary += f"分类说明: {get_description(combo['main_category'])}\n"
+    if style_lines:
+        summary += "\n【风格标签】\n" + "\n".join(style_lines) + "\n"
+    summary += f"\n【难度】\n{difficulty}: {difficulty_info['description']}\n"
+    return summary
@@ -1,6 +1,10 @@
 import os
+import re
+import copy
 import time
 import json
+import asyncio
+import threading
 from typing import List, Optional, Dict, Any
 from openai import OpenAI, RateLimitError, APIError
 from core.monitor import monitor
@@ -36,199 +40,253 @@ class Validator:
             raise ValueError(f"Invalid JSON format: {str(e)}")
 
 class RateLimiter:
-    """Simple rate limiter to control request frequency."""
+    """
+    Thread-safe rate limiter to control request frequency.
+    线程安全的请求频率限制器。
+
+    Each caller reserves the next free slot for its model under a lock and then
+    sleeps outside the lock, so concurrent callers are spaced by min_interval
+    instead of all waking up at once.
+    """
     
     def __init__(self, min_interval: float = 1.0):
         self.min_interval = min_interval
         self.last_request_time = {}
+        self._lock = threading.Lock()
 
-    def wait(self, model_key: str):
+    def wait(self, model_key: str, min_interval: Optional[float] = None):
         """Wait if necessary to respect the minimum interval for the given model."""
-        now = time.time()
-        last = self.last_request_time.get(model_key, 0)
-        elapsed = now - last
+        interval = self.min_interval if min_interval is None else min_interval
+        with self._lock:
+            now = time.time()
+            slot = max(now, self.last_request_time.get(model_key, 0) + interval)
+            self.last_request_time[model_key] = slot
         
-        if elapsed < self.min_interval:
-            time.sleep(self.min_interval - elapsed)
-            
-        self.last_request_time[model_key] = time.time()
+        delay = slot - time.time()
+        if delay > 0:
+            time.sleep(delay)
 
 class LLMConfig:
     """
-    LLM Configuration Manager.
-    LLM 配置管理器。
+    Session-scoped LLM configuration.
+    会话级 LLM 配置。
+
+    Each instance holds its own model table, active author/reviewer models and
+    fallback order, so concurrent pipelines can switch models without affecting
+    each other. Use LLMConfig.from_file() to load llm.json and copy() to fork a
+    session from an existing configuration.
     """
     # Context Management / 上下文管理
-    DEFAULT_CONTEXT_WINDOW_CHARS = 50000 # Approx 30k-40k tokens
+    # Used when a model in llm.json does not declare input_window / output_window (tokens)
+    DEFAULT_INPUT_WINDOW = 28000
+    DEFAULT_OUTPUT_WINDOW = 4096
     
     # Defaults / 默认值
-    SHOW_THINKING = True
-    AUTHOR_MODEL_KEY = "doubao"
-    REVIEWER_MODEL_KEY = "doubao"
-    FALLBACK_ORDER = []
-    MODELS = {}
+    DEFAULT_MODEL_KEY = "doubao"
+    CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'llm.json')
+
+    def __init__(self, models: Optional[Dict[str, Dict]] = None, author_model_key: str = DEFAULT_MODEL_KEY,
+                 reviewer_model_key: str = DEFAULT_MODEL_KEY, fallback_order: Optional[List[str]] = None,
+                 show_thinking: bool = True):
+        self.models = models or {}
+        self.author_model_key = author_model_key
+        self.reviewer_model_key = reviewer_model_key
+        self.fallback_order = list(fallback_order or [])
+        self.show_thinking = show_thinking
+        self._lock = threading.RLock()
 
     @classmethod
-    def load_config(cls):
+    def from_file(cls, config_path: Optional[str] = None) -> "LLMConfig":
         """
         Load configuration from JSON file (supports comments).
         从 JSON 文件加载配置（支持注释）。
         """
-        config_path = os.path.join(os.path.dirname(__file__), 'llm.json')
+        config = cls()
+        config_path = config_path or cls.CONFIG_PATH
         if not os.path.exists(config_path):
              print("Error: config/llm.json not found.")
              print("Please copy config/llm-demo.json to config/llm.json and configure your API keys.")
-             return
+             return config
 
         try:
             with open(config_path, 'r', encoding='utf-8') as f:
                 content = f.read()
                 
             # Remove comments (// ... and /* ... */)
-            # Fix: Handle control characters if any (some editors might add them)
-            # Also, strictly parse JSON.
-            import re
-            
-            # Simple comment removal
             # Fix: avoid matching // in URLs (e.g. https://) by using negative lookbehind (?<!:)
             content_no_comments = re.sub(r'(?<!:)//.*?$|/\*.*?\*/', '', content, flags=re.MULTILINE|re.DOTALL)
             
-            # Remove control characters (e.g. from copy-paste) except newline/tab
-            # But be careful not to remove Chinese characters.
-            # json.loads usually handles standard control chars. 
-            # The error "Invalid control character" often means unescaped newline in string or similar.
-            # Or it could be a real control char like \x05.
-            
-            # Let's try to parse directly first if no comments found, or fallback to strict mode?
-            # Actually, the error might be in the file content itself.
-            
-            # Attempt to clean invisible characters if json decode fails?
             try:
                 data = json.loads(content_no_comments)
             except json.JSONDecodeError:
-                # Fallback: strict=False allows control characters inside strings in some python versions? 
-                # No, standard json lib doesn't support strict=False for control chars.
-                # We might need to escape them or remove them.
-                # Common issue: newlines in strings.
-                
-                # Let's try to remove non-printable characters that are not whitespace
-                # This regex removes control characters (0-31) except tab, newline, carriage return
+                # Remove non-printable control characters (0-31) except tab, newline, carriage return,
+                # then retry with strict=False to allow control characters inside strings
                 cleaned = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', content_no_comments)
-                
-                # Also try strict=False
                 data = json.loads(cleaned, strict=False)
 
-            cls.MODELS = data.get("models", {})
             active = data.get("active_config", {})
-            cls.AUTHOR_MODEL_KEY = active.get("author_model_key", cls.AUTHOR_MODEL_KEY)
-            cls.REVIEWER_MODEL_KEY = active.get("reviewer_model_key", cls.REVIEWER_MODEL_KEY)
-            cls.SHOW_THINKING = active.get("show_thinking", cls.SHOW_THINKING)
-            cls.FALLBACK_ORDER = data.get("fallback_order", cls.FALLBACK_ORDER)
+            config.models = data.get("models", {})
+            config.author_model_key = active.get("author_model_key", config.author_model_key)
+            config.reviewer_model_key = active.get("reviewer_model_key", config.reviewer_model_key)
+            config.show_thinking = active.get("show_thinking", config.show_thinking)
+            config.fallback_order = data.get("fallback_order", config.fallback_order)
         except Exception as e:
             print(f"Error loading config: {e}")
+        return config
 
-    @classmethod
-    def get_config(cls, key):
+    def copy(self) -> "LLMConfig":
+        """
+        Fork an independent session configuration.
+        复制出一个独立的会话配置。
+        """
+        with self._lock:
+            return LLMConfig(
+                models=copy.deepcopy(self.models),
+                author_model_key=self.author_model_key,
+                reviewer_model_key=self.reviewer_model_key,
+                fallback_order=list(self.fallback_order),
+                show_thinking=self.show_thinking
+            )
+
+    def get_config(self, key):
         """
         Get configuration for a specific model.
         获取特定模型的配置。
         """
-        return cls.MODELS.get(key, cls.MODELS.get("doubao", {})) # Fallback to empty dict if doubao missing
+        return self.models.get(key, self.models.get(self.DEFAULT_MODEL_KEY, {})) # Fallback to empty dict if doubao missing
 
-    @classmethod
-    def get_available_models(cls):
+    def get_input_window(self, key) -> int:
+        """
+        Max prompt tokens of a model ("input_window" in llm.json).
+        获取模型的最大输入 token 数。
+        """
+        model = self.get_config(key)
+        if "input_window" in model:
+            return int(model["input_window"])
+        if "context_window" in model:
+            # Shared window: whatever the output does not need
+            return int(model["context_window"]) - self.get_output_window(key)
+        return self.DEFAULT_INPUT_WINDOW
+
+    def get_output_window(self, key) -> int:
+        """
+        Max completion tokens of a model ("output_window" in llm.json).
+        获取模型的最大输出 token 数。
+        """
+        return int(self.get_config(key).get("output_window", self.DEFAULT_OUTPUT_WINDOW))
+
+    def get_available_models(self):
         """
         Get list of available model keys.
         获取可用模型键列表。
         """
-        return list(cls.MODELS.keys())
+        return list(self.models.keys())
     
-    @classmethod
-    def set_show_thinking(cls, show: bool):
+    def set_show_thinking(self, show: bool):
         """
         Enable or disable thinking process display.
         启用或禁用思考过程显示。
         """
-        cls.SHOW_THINKING = show
+        self.show_thinking = show
 
-    @classmethod
-    def set_author_model(cls, key):
+    def set_author_model(self, key):
         """
         Set the active author model.
         设置当前作者模型。
         """
-        if key in cls.MODELS:
-            old = cls.AUTHOR_MODEL_KEY
-            cls.AUTHOR_MODEL_KEY = key
-            monitor.log_switch(old, key, "Manual/Config Change")
-            return True
-        return False
+        with self._lock:
+            if key in self.models:
+                old = self.author_model_key
+                self.author_model_key = key
+                monitor.log_switch(old, key, "Manual/Config Change")
+                return True
+            return False
 
-    @classmethod
-    def set_reviewer_model(cls, key):
+    def set_reviewer_model(self, key):
         """
         Set the active reviewer model.
         设置当前审核模型。
         """
-        if key in cls.MODELS:
-            old = cls.REVIEWER_MODEL_KEY
-            cls.REVIEWER_MODEL_KEY = key
-            monitor.log_switch(old, key, "Manual/Config Change")
-            return True
-        return False
+        with self._lock:
+            if key in self.models:
+                old = self.reviewer_model_key
+                self.reviewer_model_key = key
+                monitor.log_switch(old, key, "Manual/Config Change")
+                return True
+            return False
 
-    @classmethod
-    def switch_to_next_model(cls, current_key: str, reason: str) -> str:
+    def switch_to_next_model(self, current_key: str, reason: str) -> str:
         """
         Switch to the next available model in fallback order.
         切换到回退顺序中的下一个可用模型。
         """
-        try:
-            current_idx = cls.FALLBACK_ORDER.index(current_key)
-            next_idx = (current_idx + 1) % len(cls.FALLBACK_ORDER)
-            next_key = cls.FALLBACK_ORDER[next_idx]
-        except ValueError:
-            next_key = cls.FALLBACK_ORDER[0] if cls.FALLBACK_ORDER else current_key
-            
-        monitor.log_switch(current_key, next_key, reason)
-        
-        if cls.AUTHOR_MODEL_KEY == current_key:
-            cls.AUTHOR_MODEL_KEY = next_key
-        if cls.REVIEWER_MODEL_KEY == current_key:
-            cls.REVIEWER_MODEL_KEY = next_key
+        with self._lock:
+            try:
+                current_idx = self.fallback_order.index(current_key)
+                next_idx = (current_idx + 1) % len(self.fallback_order)
+                next_key = self.fallback_order[next_idx]
+            except ValueError:
+                next_key = self.fallback_order[0] if self.fallback_order else current_key
+                
+            monitor.log_switch(current_key, next_key, reason)
             
-        return next_key
+            if self.author_model_key == current_key:
+                self.author_model_key = next_key
+            if self.reviewer_model_key == current_key:
+                self.reviewer_model_key = next_key
+                
+            return next_key
 
-# Load config on module import
-LLMConfig.load_config()
+# Default configuration loaded on module import / 模块导入时加载的默认配置
+default_config = LLMConfig.from_file()
 
 class LLMClient:
-    def __init__(self):
+    """
+    Thread-safe LLM client bound to one LLMConfig session.
+    绑定到一个 LLMConfig 会话的线程安全 LLM 客户端。
+
+    The OpenAI client cache and rate limiter are guarded by locks and may be
+    shared between sessions (see with_config), so several sessions still respect
+    one provider quota. Async callers can use achat_author / achat_reviewer.
+    """
+    def __init__(self, config: Optional[LLMConfig] = None, rate_limiter: Optional[RateLimiter] = None):
+        self.config = config or default_config
         self.clients = {}
-        self.rate_limiter = RateLimiter()
+        self._clients_lock = threading.Lock()
+        self.rate_limiter = rate_limiter or RateLimiter()
         self.validator = Validator()
+
+    def with_config(self, config: LLMConfig) -> "LLMClient":
+        """
+        Create a client for another session, sharing connections and rate limits.
+        为另一个会话创建客户端，共享连接与频率限制。
+        """
+        client = LLMClient(config, rate_limiter=self.rate_limiter)
+        client.clients = self.clients
+        client._clients_lock = self._clients_lock
+        return client
         
     def _get_client(self, model_key):
-        if model_key not in self.clients:
-            config = LLMConfig.MODELS.get(model_key)
-            if not config:
-                # Try getting via get_config which handles fallback, but for connection test we want to be strict?
-                # Actually, let's just be strict.
-                raise ValueError(f"Model '{model_key}' is not configured in llm.json.")
-            
-            api_key = config.get("api_key")
-            base_url = config.get("base_url")
-            
-            if not api_key:
-                raise ValueError(f"Missing 'api_key' for model '{model_key}'")
-            if not base_url:
-                raise ValueError(f"Missing 'base_url' for model '{model_key}'")
-
-            self.clients[model_key] = OpenAI(
-                api_key=api_key,
-                base_url=base_url
-            )
-        return self.clients[model_key], LLMConfig.get_config(model_key).get("model_name", model_key)
+        with self._clients_lock:
+            if model_key not in self.clients:
+                config = self.config.models.get(model_key)
+                if not config:
+                    raise ValueError(f"Model '{model_key}' is not configured in llm.json.")
+                
+                api_key = config.get("api_key")
+                base_url = config.get("base_url")
+                
+                if not api_key:
+                    raise ValueError(f"Missing 'api_key' for model '{model_key}'")
+                if not base_url:
+                    raise ValueError(f"Missing 'base_url' for model '{model_key}'")
+
+                self.clients[model_key] = OpenAI(
+                    api_key=api_key,
+                    base_url=base_url
+                )
+            client = self.clients[model_key]
+        return client, self.config.get_config(model_key).get("model_name", model_key)
 
     def test_connection(self, model_key):
         """Test connection to a specific model"""
@@ -255,15 +313,49 @@ class LLMClient:
 
     def chat_author(self, messages, temperature=0.7, stream=False):
         """Send chat request to Author LLM with auto-retry and switching"""
-        return self._chat_with_retry(LLMConfig.AUTHOR_MODEL_KEY, messages, temperature, stream)
+        return self._chat_with_retry(self.config.author_model_key, messages, temperature, stream)
 
     def chat_reviewer(self, messages, temperature=0.3, stream=False):
         """Send chat request to Reviewer LLM with auto-retry and switching"""
-        return self._chat_with_retry(LLMConfig.REVIEWER_MODEL_KEY, messages, temperature, stream)
+        return self._chat_with_retry(self.config.reviewer_model_key, messages, temperature, stream)
+
+    def chat_author_samples(self, messages, n, temperature=0.9) -> List[str]:
+        """
+        Get `n` independent samples from the Author LLM.
+        Uses the provider's `n` parameter when the model declares "supports_n": true in llm.json,
+        otherwise issues `n` requests concurrently.
+        """
+        model_config = self.config.get_config(self.config.author_model_key)
+        if n > 1 and model_config.get("supports_n", False):
+            result = self._chat_with_retry(self.config.author_model_key, messages, temperature, False, n=n)
+            if isinstance(result, list):
+                return result
+            # Fall through to concurrent single requests if the n-request failed
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, n)) as pool:
+            return list(pool.map(lambda _: self.chat_author(messages, temperature), range(n)))
+
+    async def achat_author(self, messages, temperature=0.7):
+        """Async variant of chat_author (runs the blocking call in a worker thread)."""
+        return await asyncio.to_thread(self.chat_author, messages, temperature, False)
+
+    async def achat_reviewer(self, messages, temperature=0.3):
+        """Async variant of chat_reviewer (runs the blocking call in a worker thread)."""
+        return await asyncio.to_thread(self.chat_reviewer, messages, temperature, False)
+
+    @staticmethod
+    def _track_stream(model_key, response):
+        """Pass stream chunks through, logging usage chunks (which carry no choices) to the monitor."""
+        for chunk in response:
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                monitor.log_usage(model_key, usage)
+            if chunk.choices:
+                yield chunk
 
-    def _chat_with_retry(self, start_model_key, messages, temperature, stream):
+    def _chat_with_retry(self, start_model_key, messages, temperature, stream, n=1):
         current_key = start_model_key
-        max_model_switches = len(LLMConfig.FALLBACK_ORDER)
+        max_model_switches = len(self.config.fallback_order)
         switches = 0
 
         while switches < max_model_switches:
@@ -271,27 +363,39 @@ class LLMClient:
             for attempt in range(3): # Max 3 retries for rate limit
                 try:
                     # Rate limiting wait
-                    config = LLMConfig.get_config(current_key)
-                    self.rate_limiter.min_interval = config.get("min_interval", 1.0)
-                    self.rate_limiter.wait(current_key)
+                    config = self.config.get_config(current_key)
+                    self.rate_limiter.wait(current_key, config.get("min_interval", 1.0))
 
                     client, model_name = self._get_client(current_key)
                     start_time = time.time()
                     
+                    request_args = {}
+                    if n > 1:
+                        request_args["n"] = n
+                    if stream and config.get("stream_usage", False):
+                        # Usage (including cached prompt tokens) arrives in a final chunk without choices
+                        request_args["stream_options"] = {"include_usage": True}
                     response = client.chat.completions.create(
                         model=model_name,
                         messages=messages,
                         temperature=temperature,
-                        stream=stream
+                        stream=stream,
+                        **request_args
                     )
                     
                     if not stream:
                         duration = time.time() - start_time
+                        if getattr(response, "usage", None):
+                            monitor.log_usage(current_key, response.usage)
+                        if n > 1:
+                            contents = [choice.message.content for choice in response.choices]
+                            monitor.log_generation(current_key, f"chat(n={n})", len(str(messages)), len(str(contents)), duration)
+                            return contents
                         content = response.choices[0].message.content
                         monitor.log_generation(current_key, "chat", len(str(messages)), len(str(content)), duration)
                         return content
                     else:
-                        return response
+                        return self._track_stream(current_key, response)
 
                 except RateLimitError:
                     wait_time = 2 ** (attempt + 1)
@@ -308,11 +412,11 @@ class LLMClient:
             # Switch Model
             reason = "API Error / Rate Limit Exhausted"
             old_key = current_key
-            current_key = LLMConfig.switch_to_next_model(old_key, reason)
+            current_key = self.config.switch_to_next_model(old_key, reason)
             switches += 1
             print(f"[系统提示] 自动切换至备用模型: {current_key}")
             
         return f"Error: All models failed after {switches} switches."
 
-# Global instance
-llm_client = LLMClient()
+# Default client for the default session / 默认会话的客户端
+llm_client = LLMClient(default_config)
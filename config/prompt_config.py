@@ -131,6 +131,104 @@ SETTING_CREATE_JSON_SYSTEM = PromptTemplate(
     evaluation_criteria="内容是否具体（无占位符）？要素是否齐全？逻辑是否自洽？"
 )
 
+# --- Sectioned Setting Creation (skeleton first, then sections in parallel) ---
+
+SETTING_SKELETON_SYSTEM = PromptTemplate(
+    template="""你是一位拥有宏大叙事能力的**世界观架构师**。
+请根据创意模板和用户需求，先确定《小说设定集》的**核心骨架**：元数据、主角与最终反派。后续的世界观、势力、配角等章节将以此为准分别展开。
+
+### 核心任务
+1.  **拒绝空泛**：所有字段必须填充具体的、有创造性的内容，**严禁使用“姓名”、“待定”、“书名”等占位符**。
+2.  **定调**：骨架决定全书基调，主角的金手指与反派的动机必须形成核心冲突。
+
+### 输出格式（JSON）
+请严格按照以下 JSON 格式输出：
+```json
+{
+    "meta": {
+        "title": "书名（必须具体，如《诡秘之主》）",
+        "tags": ["标签1", "标签2", "标签3"],
+        "core_hook": "核心卖点（一句话）",
+        "theme": "核心主题",
+        "estimated_word_count": "预计总字数（如：200万字）"
+    },
+    "characters": {
+        "protagonist": {
+            "name": "主角全名（严禁使用‘主角’）",
+            "age": "年龄",
+            "personality": "性格详解（3-5个关键词及描述）",
+            "goal": "终极目标",
+            "gold_finger": "金手指机制（详细规则）",
+            "appearance": "外貌描写"
+        },
+        "antagonist": {
+            "name": "最终反派全名",
+            "title": "称号/头衔",
+            "background": "背景故事",
+            "motivation": "作恶动机"
+        }
+    }
+}
+```""",
+    input_variables=["template", "requirements"],
+    evaluation_criteria="核心设定是否具体？主角与反派是否构成核心冲突？"
+)
+
+SETTING_SECTION_SYSTEM = PromptTemplate(
+    template="""你是一位拥有宏大叙事能力的**世界观架构师**，正在分章节撰写《小说设定集》。
+核心骨架（书名、主角、反派）已经确定，你现在只负责其中的**【{section_title}】**部分。
+
+### 要求
+1.  **严格服从骨架**：不得修改骨架中的人名、设定和基调，内容必须与之自洽。
+2.  **拒绝空泛**：所有字段必须填充具体的、有创造性的内容，严禁使用占位符。
+3.  **只输出本部分**：不要输出其他章节的内容。
+
+### 输出格式（JSON）
+请严格按照以下 JSON 格式输出，不要包含任何额外说明：
+```json
+{section_schema}
+```""",
+    input_variables=["section_title", "section_schema"],
+    evaluation_criteria="是否与骨架一致？是否只包含本部分？格式是否为合法JSON？"
+)
+
+# Section specs for sectioned setting creation.
+# `schema` is shown to the model and also defines the required keys and their types.
+SETTING_SECTION_SPECS = {
+    "world_view": {
+        "title": "世界观",
+        "schema": {
+            "background": "时代/地理背景（详细描述）",
+            "world_rules": "世界底层规则（如：灵气复苏、末世法则）",
+            "geography": "主要地图/场景描述"
+        }
+    },
+    "power_system": {
+        "title": "力量体系",
+        "schema": {
+            "power_system": "力量体系/等级划分（从低到高详细列出）"
+        }
+    },
+    "factions": {
+        "title": "势力",
+        "schema": {
+            "factions": [{"name": "势力名称", "description": "势力特点与立场"}]
+        }
+    },
+    "supporting": {
+        "title": "配角",
+        "schema": {
+            "supporting": [{"name": "配角全名", "role": "功能/关系", "trait": "性格特征", "background": "简要背景"}]
+        }
+    },
+    "relationships": {
+        "title": "人物关系网",
+        "schema": {
+            "relationships": "主要人物关系网描述（如：A是B的杀父仇人，C暗恋A）"
+        }
+    }
+}
+
 AUTHOR_INIT_JSON_SYSTEM = PromptTemplate(
     template="""你是一个**AI作者人格构建器**。
 请根据小说设定，构建一个最适合该风格的“作者人格”。这个人格将决定后续写作的文风、用词习惯和叙事偏好。
@@ -164,6 +262,7 @@ NOVEL_PLANNING_SYSTEM = PromptTemplate(
 1.  **大纲结构**：通常分为“开篇-发展-高潮-结局”或“换地图”模式。
 2.  **分卷合理**：每卷 50-100 章（约 10-20 万字），每卷必须有一个核心主题和一次大的高潮事件。
 3.  **节奏起伏**：卷与卷之间要有衔接和节奏调整。
+4.  **只给骨架**：此处只规划分卷骨架，不要展开到章节细纲（细纲会在每卷开写前单独规划）。
 
 ### 输出格式（JSON List）
 ```json
@@ -190,6 +289,30 @@ NOVEL_PLANNING_SYSTEM = PromptTemplate(
     evaluation_criteria="分卷是否合理？是否覆盖总字数？"
 )
 
+VOLUME_DETAIL_PLANNING_SYSTEM = PromptTemplate(
+    template="""你是一位**长篇小说分卷细纲规划师**。
+请根据【分卷骨架】中本卷的核心事件与目标，结合【已写剧情】，为本卷规划**逐章细纲**。
+
+### 规划原则
+1.  **承上启下**：必须紧接已写剧情，不得与已发生的事件、人物状态冲突；未解伏笔要有所安排。
+2.  **覆盖完整**：章节编号必须从本卷 chapter_start 连续到 chapter_end，不得遗漏或越界。
+3.  **卷内节奏**：卷首铺垫、卷中升级、卷末迎来本卷高潮，并为下一卷留下钩子。
+4.  **精简**：每章只写一句话梗概（不超过 40 字），不要展开正文。
+
+### 输出格式（JSON List）
+```json
+[
+    {
+        "chapter": 51,
+        "title": "章节标题",
+        "outline": "一句话梗概"
+    }
+]
+```""",
+    input_variables=["volume", "setting_summary", "story_so_far"],
+    evaluation_criteria="细纲是否覆盖本卷全部章节？是否与已写剧情衔接？"
+)
+
 SHORT_NOVEL_PLANNING_SYSTEM = PromptTemplate(
     template="""你是一位**短篇小说结构规划师**。
 请根据总字数（通常 1-15 万字）规划全书的**关键节点**（无分卷，但有清晰的阶段）。
@@ -291,6 +414,21 @@ STORY_COMPRESSION_SYSTEM = PromptTemplate(
     evaluation_criteria="摘要是否精炼？关键信息是否丢失？"
 )
 
+MEMORY_ROLLUP_SYSTEM = PromptTemplate(
+    template="""你是一位擅长**分层归纳**的资深编辑，负责维护长篇小说的多级剧情记忆（章 → 剧情段 → 卷 → 全书）。
+请把【下级摘要】合并为一份更高层级的**{level}摘要**。
+
+### 核心要求
+1.  **主线优先**：保留主线推进、核心冲突的结果、人物关系与立场的变化、主角实力/身份的关键跃迁。
+2.  **伏笔不丢**：仍未回收的伏笔用【伏笔】标记保留；已回收的伏笔只写结果。
+3.  **按时间顺序**：叙述连贯，不要逐段罗列下级摘要。
+4.  **严格限长**：全文不超过 {max_chars} 字。
+
+请直接输出{level}摘要正文（纯文本）。""",
+    input_variables=["level", "max_chars"],
+    evaluation_criteria="是否覆盖主线与未回收伏笔？是否在限长内？"
+)
+
 CHAPTER_GEN_SYSTEM = PromptTemplate(
     template="""你是一位**金牌网文作家**（风格匹配设定）。
 请根据提供的《创作简报》撰写小说正文。
@@ -447,6 +585,37 @@ DISCUSSION_WORLD_EXPERT = PromptTemplate(
     evaluation_criteria="建议是否符合世界观？是否增强了沉浸感？"
 )
 
+DISCUSSION_CROSS_CRITIQUE = PromptTemplate(
+    template="""**其他专家的意见**：
+{other_opinions}
+
+**你上一轮的意见**：
+{own_opinion}
+
+**请进行交叉点评（150字以内）**：
+1.  **冲突识别**：其他专家的建议与你的意见是否存在矛盾？
+2.  **取长补短**：吸收其他专家的亮点，修正你的建议。
+3.  **最终建议**：给出你修正后的最终建议。
+
+请直接输出，言简意赅。""",
+    input_variables=["other_opinions", "own_opinion"],
+    evaluation_criteria="是否回应了其他专家的意见？修正是否合理？"
+)
+
+DISCUSSION_DIGEST_SYSTEM = PromptTemplate(
+    template="""你是研讨会的**会议记录员**。
+请把【已有纪要】和【本轮专家意见】合并为一份精炼的**研讨纪要**，供下一轮讨论参考。
+
+### 要求
+1.  **只保留结论**：保留已达成的共识、仍存在的分歧和尚未解决的问题，删除论证过程和客套话。
+2.  **标注来源**：分歧点注明是哪位专家的主张。
+3.  **严格限长**：全文不超过 300 字。
+
+请直接输出纪要正文。""",
+    input_variables=["digest", "round_opinions"],
+    evaluation_criteria="是否精炼？共识与分歧是否清晰？"
+)
+
 DISCUSSION_SUMMARY_SYSTEM = PromptTemplate(
     template="""你是一位**资深主编**，负责主持剧情研讨会。
 请汇总各位专家（剧情、角色、世界观）的意见，形成一份最终的**【剧情指导方案】**。
@@ -0,0 +1,162 @@
+"""
+JSON codec used for persistence and prompt assembly.
+JSON 编解码层：优先使用 orjson / msgspec，未安装时回退到标准库 json。
+
+All backends produce the same data: UTF-8 text with non-ASCII characters unescaped
+(like json.dumps(..., ensure_ascii=False)), compact unless `indent` is set, and
+2-space indentation when it is. NOVEL_JSON_CODEC=json forces the stdlib backend.
+
+On-disk snapshots (setting.json, history.json, ...) are indented by default so they
+stay hand-editable; NOVEL_JSON_FORMAT=compact writes them without whitespace.
+Readers accept both formats.
+"""
+
+import json
+import os
+from typing import Any, Dict, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+_FORCED = os.environ.get("NOVEL_JSON_CODEC", "auto")
+if orjson is not None and _FORCED in ("auto", "orjson"):
+    BACKEND = "orjson"
+elif msgspec is not None and _FORCED in ("auto", "msgspec"):
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+DISK_COMPACT = os.environ.get("NOVEL_JSON_FORMAT", "pretty") == "compact"
+
+if BACKEND == "msgspec":
+    _encoder = msgspec.json.Encoder()
+    _decoder = msgspec.json.Decoder()
+
+
+def _stdlib_dumps(obj: Any, indent: bool) -> str:
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize to a JSON string (compact, or indented by 2 spaces)."""
+    return dump_bytes(obj, indent).decode("utf-8")
+
+
+def dump_bytes(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes."""
+    try:
+        if BACKEND == "orjson":
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0))
+        if BACKEND == "msgspec":
+            data = _encoder.encode(obj)
+            return msgspec.json.format(data, indent=2) if indent else data
+    except (TypeError, ValueError, OverflowError):
+        # Types the fast codecs reject (e.g. integers over 64 bits) still go through the stdlib
+        pass
+    return _stdlib_dumps(obj, indent).encode("utf-8")
+
+
+def disk_dumps(obj: Any) -> str:
+    """Serialize a snapshot file in the configured on-disk format."""
+    return dumps(obj, indent=not DISK_COMPACT)
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """Parse JSON text. Raises ValueError on invalid input, like json.loads."""
+    if BACKEND == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise ValueError(str(e)) from e
+    if BACKEND == "msgspec":
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return json.loads(data)
+
+
+# --- Record schemas ---
+# field -> (type, default); a default of REQUIRED means the field must be present.
+# "number" accepts int or float. Fields not listed are kept as they are.
+
+REQUIRED = object()
+
+CHAPTER_ENTRY: Dict[str, Tuple[Any, Any]] = {
+    "chapter": (int, REQUIRED),
+    "title": (str, ""),
+    "summary": (str, ""),
+    "key_events": (list, []),
+    "foreshadowing": (list, []),
+    "items_acquired": (list, []),
+    "characters_involved": (list, []),
+    "score": ("number", 0),
+}
+
+REVIEW: Dict[str, Tuple[Any, Any]] = {
+    "chapter": (int, REQUIRED),
+    "attempt": (int, 1),
+    "score": ("number", 0),
+    "passed": (bool, False),
+}
+
+
+def _is(value: Any, kind: Any) -> bool:
+    if kind == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, kind)
+
+
+def _convert(value: Any, kind: Any) -> Any:
+    if kind == "number":
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    if kind is int:
+        return int(float(value))
+    if kind is str:
+        return "" if value is None else str(value)
+    if kind is list:
+        return [] if value in (None, "") else [value]
+    if kind is bool:
+        return str(value).strip().lower() in ("1", "true", "yes", "是")
+    raise TypeError(kind)
+
+
+def validate(schema: Dict[str, Tuple[Any, Any]], record: Dict, name: str = "record") -> Dict:
+    """
+    Check `record` against `schema`, converting mistyped fields (e.g. a score of "85").
+    Returns `record` itself when it already matches, otherwise a corrected copy
+    with missing optional fields filled in. Raises ValueError if a required field
+    is missing or cannot be converted.
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f"{name} must be an object, got {type(record).__name__}")
+    fixes = {}
+    for field, (kind, default) in schema.items():
+        if field not in record or record[field] is None:
+            if default is REQUIRED:
+                raise ValueError(f"{name} is missing required field '{field}'")
+            fixes[field] = list(default) if isinstance(default, list) else default
+        elif not _is(record[field], kind):
+            try:
+                fixes[field] = _convert(record[field], kind)
+            except (TypeError, ValueError):
+                if default is REQUIRED:
+                    raise ValueError(f"{name} field '{field}' is not a valid {getattr(kind, '__name__', kind)}")
+                fixes[field] = list(default) if isinstance(default, list) else default
+    if not fixes:
+        return record
+    fixed = dict(record)
+    fixed.update(fixes)
+    return fixed
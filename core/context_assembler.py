@@ -0,0 +1,122 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.tokenizer import estimate_tokens
+
+
+class ContextAssembler:
+    """
+    Packs prioritized context sections into a token budget.
+    按优先级把上下文分段装入 token 预算。
+
+    Sections are filled in priority order (lower number first) and rendered in the
+    order they were added. A text section that does not fit is cut at a line boundary;
+    an item section (e.g. recent chapters) keeps as many items as fit, in the order given.
+    Whatever was cut or dropped is listed in `report`.
+    """
+
+    TRUNCATED_MARK = "……（已截断）"
+
+    def __init__(self, budget: int, estimate: Optional[Callable[[str], int]] = None):
+        """
+        Args:
+            budget: Token budget for all sections together.
+            estimate: Token counter (see core.tokenizer); defaults to the CJK-aware estimate.
+        """
+        self.budget = max(0, int(budget))
+        self.estimate = estimate or estimate_tokens
+        self.report: List[Dict] = []
+        self._sections: List[Dict] = []
+
+    def add(self, name: str, text: str, priority: int, required: bool = False, size: Optional[int] = None):
+        """
+        Add a text section. Required sections are always kept in full, even over budget.
+        `size` is the text's token count if the caller already knows it (e.g. a cached setting).
+        """
+        if text and text.strip():
+            self._sections.append({"name": name, "header": "", "text": text.strip(), "size": size,
+                                   "items": None, "priority": priority, "required": required})
+
+    def add_items(self, name: str, header: str, items: List[str], priority: int, newest_first: bool = True):
+        """
+        Add a section made of separate items (one per line under `header`).
+        With newest_first, items are given oldest-to-newest and packed from the end,
+        but still rendered in their original order.
+        """
+        items = [i for i in items if i]
+        if items:
+            self._sections.append({"name": name, "header": header, "text": "",
+                                   "items": items, "priority": priority, "newest_first": newest_first,
+                                   "required": False})
+
+    def assemble(self) -> str:
+        """Pack the sections and return the context text."""
+        return "\n\n".join(text for _, text in self.assemble_sections())
+
+    def assemble_sections(self) -> List[Tuple[str, str]]:
+        """Pack the sections and return (name, text) for each one kept, in the order added."""
+        self.report = []
+        remaining = self.budget
+        rendered: Dict[int, str] = {}
+        for index in sorted(range(len(self._sections)), key=lambda i: self._sections[i]["priority"]):
+            section = self._sections[index]
+            if section["items"] is None:
+                text, used = self._pack_text(section, remaining)
+            else:
+                text, used = self._pack_items(section, remaining)
+            remaining -= used
+            if text:
+                rendered[index] = text
+        return [(self._sections[i]["name"], rendered[i]) for i in sorted(rendered)]
+
+    def summary(self) -> str:
+        """One-line description of what was cut, or "" if everything fit."""
+        if not self.report:
+            return ""
+        parts = []
+        for entry in self.report:
+            if entry["status"] == "dropped":
+                parts.append(f"丢弃 {entry['name']}")
+            elif "items" in entry:
+                parts.append(f"{entry['name']} 保留 {entry['kept']}/{entry['items']} 条")
+            else:
+                parts.append(f"{entry['name']} 截断至 {entry['kept']}/{entry['total']}")
+        return f"上下文预算 {self.budget} tokens：" + "，".join(parts)
+
+    def _pack_text(self, section: Dict, remaining: int):
+        text = section["text"]
+        size = section["size"] if section["size"] is not None else self.estimate(text)
+        if section["required"] or size <= remaining:
+            return text, size
+
+        # Cut at a line boundary
+        kept, used = [], self.estimate(self.TRUNCATED_MARK)
+        for line in text.split("\n"):
+            cost = self.estimate(line) + 1
+            if used + cost > remaining:
+                break
+            kept.append(line)
+            used += cost
+        if not kept:
+            self.report.append({"name": section["name"], "status": "dropped", "total": size})
+            return "", 0
+        self.report.append({"name": section["name"], "status": "truncated", "kept": used, "total": size})
+        return "\n".join(kept) + "\n" + self.TRUNCATED_MARK, used
+
+    def _pack_items(self, section: Dict, remaining: int):
+        items = section["items"]
+        order = list(reversed(range(len(items)))) if section["newest_first"] else list(range(len(items)))
+        used = self.estimate(section["header"]) + 1
+        chosen = []
+        for i in order:
+            cost = self.estimate(items[i]) + 1
+            if used + cost > remaining:
+                break
+            chosen.append(i)
+            used += cost
+        if not chosen:
+            self.report.append({"name": section["name"], "status": "dropped", "items": len(items)})
+            return "", 0
+        if len(chosen) < len(items):
+            self.report.append({"name": section["name"], "status": "truncated",
+                                "kept": len(chosen), "items": len(items)})
+        return section["header"] + "\n" + "\n".join(items[i] for i in sorted(chosen)), used
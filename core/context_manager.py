@@ -1,59 +1,117 @@
-import json
+from typing import Optional
+
+from core.tokenizer import counter_for
+from core import codec
 
 class ContextManager:
     """
     Manages context size and compression decisions to avoid token exhaustion.
     Inspired by Kimi-Writer's smart context management.
+
+    Sizes are in tokens of the target model (the session's author model unless `model_key`
+    is given), counted with that model's tokenizer from llm.json or a CJK-aware estimate.
+    The model is resolved on every call, so switching models mid-session takes effect.
     """
-    def __init__(self, max_chars=50000, trigger_ratio=0.8):
+    def __init__(self, llm_config=None, model_key: Optional[str] = None, max_tokens: Optional[int] = None,
+                 trigger_ratio=0.8):
         """
         Args:
-            max_chars: Estimated character limit for context (safe proxy for tokens).
-            trigger_ratio: Ratio of max_chars at which to trigger compression.
+            llm_config: LLMConfig of the session (defaults to the global default configuration).
+            model_key: Target model; defaults to the session's current author model.
+            max_tokens: Override the model's input window.
+            trigger_ratio: Ratio of the window at which to trigger compression.
         """
-        self.max_chars = max_chars
+        self.llm_config = llm_config
+        self.model_key = model_key
+        self._max_tokens = max_tokens
         self.trigger_ratio = trigger_ratio
+        self._last_settings = None  # (settings text, counter, size)
+
+    def _config(self):
+        if self.llm_config is None:
+            from config.llm_config import default_config
+            self.llm_config = default_config
+        return self.llm_config
+
+    def _target(self) -> str:
+        return self.model_key or self._config().author_model_key
+
+    @property
+    def max_tokens(self) -> int:
+        """Input window of the target model, in tokens."""
+        if self._max_tokens:
+            return self._max_tokens
+        return self._config().get_input_window(self._target())
 
     def estimate_size(self, text: str) -> int:
-        """Estimate size in characters."""
-        return len(text)
+        """Size of `text` in tokens of the target model."""
+        return self._counter()(text)
+
+    def get_context_size(self, settings: str, history: dict, data_manager=None) -> int:
+        """
+        Calculate total estimated size of the context.
+        With `data_manager`, history sizes come from its running counters instead of re-serializing,
+        and the setting's size from its current rendering, cached per setting version
+        (`settings` is then only measured if it is not that rendering).
+        """
+        count = self._counter()
+        if data_manager is not None and settings == data_manager.generate_markdown_setting():
+            # Measured once per setting version and shared by everyone using this DataManager;
+            # compared by value, since a caller's copy is a different object after any setting save
+            settings_size = data_manager.setting_tokens(count)
+        else:
+            settings_size = self._settings_size(settings, count)
+        if data_manager is not None:
+            sizes = data_manager.history_size(count)
+            return settings_size + sizes["summary"] + sizes["chapters"]
 
-    def get_context_size(self, settings: str, history: dict) -> int:
-        """Calculate total estimated size of the context."""
         rolling_summary = history.get("rolling_summary", "")
         chapters = history.get("chapters", [])
-        
+
         # We usually send recent chapters as JSON or text
-        chapters_text = json.dumps(chapters, ensure_ascii=False)
-        
+        chapters_text = codec.dumps(chapters)
+
         # Total = Settings + Rolling Summary + Active Chapters
-        total = len(settings) + len(rolling_summary) + len(chapters_text)
+        total = settings_size + count(rolling_summary) + count(chapters_text)
         return total
 
-    def should_compress(self, settings: str, history: dict) -> bool:
+    def _counter(self):
+        return counter_for(self._config().get_config(self._target()))
+
+    def _settings_size(self, settings: str, count) -> int:
+        # The same settings text is measured several times per chapter; remember the last one
+        cached = self._last_settings
+        if cached and cached[1] is count and cached[0] == settings:
+            return cached[2]
+        size = count(settings)
+        self._last_settings = (settings, count, size)
+        return size
+
+    def should_compress(self, settings: str, history: dict, data_manager=None) -> bool:
         """Check if compression is needed based on size or chapter count."""
-        current_size = self.get_context_size(settings, history)
-        threshold = self.max_chars * self.trigger_ratio
-        
+        current_size = self.get_context_size(settings, history, data_manager)
+        threshold = self.max_tokens * self.trigger_ratio
+
         # Also enforce a hard limit on chapter count (e.g., max 15 active chapters)
         # to prevent infinite growth even if text is short
         chapter_count = len(history.get("chapters", []))
-        
+
         return current_size > threshold or chapter_count >= 15
 
-    def calculate_keep_count(self, settings: str, history: dict, default_keep=5) -> int:
+    def calculate_keep_count(self, settings: str, history: dict, default_keep=5, data_manager=None) -> int:
         """
         Determine how many chapters to keep active.
         If context is tight, reduce the number of active chapters.
         """
-        current_size = self.get_context_size(settings, history)
-        
+        current_size = self.get_context_size(settings, history, data_manager)
+        max_tokens = self.max_tokens
+
         # If we are critically close to limit (95%), reduce keep count
-        if current_size > self.max_chars * 0.95:
+        if current_size > max_tokens * 0.95:
             return max(1, default_keep - 3) # Keep ~2
-        
+
         # If we are just over trigger (80%), reduce slightly
-        if current_size > self.max_chars * 0.8:
+        if current_size > max_tokens * 0.8:
             return max(2, default_keep - 2) # Keep ~3
-            
+
         return default_keep
@@ -1,23 +1,68 @@
 from typing import List, Dict, Optional, Any
+import hashlib
 import json
 import os
 import time
-from typing import List, Dict, Optional, Any
+from typing import Callable, List, Dict, Optional, Any, Union
 from rich.console import Console
 from rich.markdown import Markdown
-from config.llm_config import llm_client
+from config.llm_config import llm_client as default_llm_client
+from core import codec
+from core.storage import StorageBackend, SQLiteStorage
+from core.file_watcher import FileWatcher, Subscription, default_watcher
 import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl  # POSIX advisory locks for cross-process commits
+except ImportError:
+    fcntl = None
 
 console = Console()
 
+
+class ChapterConflictError(Exception):
+    """Raised when a chapter commit conflicts with what is already on disk."""
+
+
 class DataManager:
     """
     Manages the 4 core JSON files: setting.json, author.json, history.json, review.json.
-    Ensures atomic updates, data consistency, hot-reloading, and auto-repair.
+    Ensures atomic updates (temp file + fsync + rename), data consistency, hot-reloading, and auto-repair.
+    Files are loaded lazily on first access; use NovelView for read-only listings and status.
+    Use transaction() to coalesce several updates to the same file into one write.
+
+    Chapter and review appends go to append-only JSONL journals (history.journal.jsonl,
+    review.journal.jsonl) instead of rewriting the JSON file. The JSON file is a snapshot;
+    the in-memory data is the snapshot plus the replayed journal. Every journal record has
+    a sequence number and the snapshot stores the last one it contains ("journal_seq"),
+    so replaying after a crash between snapshot and journal reset never applies a record twice.
+    Journals are compacted into the snapshot in the background every COMPACT_EVERY records.
+
+    With a StorageBackend (e.g. SQLiteStorage, used automatically when the novel directory
+    has a novel.db), the files it covers are loaded from and written to the backend instead;
+    hot reload then follows the backend's version counter.
     """
-    def __init__(self, novel_dir: str, enable_auto_repair: bool = True):
+
+    JOURNALED = ("history", "review")
+    COMPACT_EVERY = 50
+    def __init__(self, novel_dir: str, enable_auto_repair: bool = True, llm_client=None, storage="auto",
+                 watcher="auto"):
+        """
+        Args:
+            storage: "auto" (SQLite if the novel has a novel.db, else JSON files), "json",
+                     or a StorageBackend instance.
+            watcher: FileWatcher deciding when files need a stat for hot reload; "auto" uses the
+                     process-wide inotify/polling watcher, None stats on every access.
+        """
         self.novel_dir = novel_dir
+        if storage == "auto":
+            storage = SQLiteStorage.for_novel(novel_dir)
+        self.storage: Optional[StorageBackend] = storage if isinstance(storage, StorageBackend) else None
+        self._storage_versions = {}  # key -> backend version of the data in memory
         self.enable_auto_repair = enable_auto_repair
+        self.llm_client = llm_client or default_llm_client  # Used only for auto-repair
         self.files = {
             "setting": os.path.join(novel_dir, "setting.json"),
             "author": os.path.join(novel_dir, "author.json"),
@@ -31,20 +76,83 @@ class DataManager:
             "review": {"reviews": [], "audience_profile": {}, "suggestions_track": []}
         }
         self._mtimes = {}  # Cache for file modification times
-        
-        if self.enable_auto_repair:
-            self._load_all()
-
-    def _load_all(self):
-        """Initial load of all files."""
-        for key in self.files:
-            self._load_file(key)
+        self._versions = {key: 0 for key in self.files}  # Bumped whenever a file's data changes on reload or is saved
+        self._derived = {}  # name -> (source version, value), see derived()
+        self._mutexes = {key: threading.RLock() for key in self.files}  # In-process guards for read-modify-write
+        self._history_mutex = self._mutexes["history"]
+        self._lock_depth = {key: 0 for key in self.files}  # Re-entry depth of _file_lock per key
+        self._journals = {}  # key -> {"ino", "offset", "seq", "base_seq"} of the replayed journal
+        self._compacting = set()
+        self._pending = set()  # Keys saved inside a transaction but not yet written
+        self._pending_lock = threading.Lock()
+        self._tx = threading.local()  # Per-thread transaction depth
+        self.watcher: Optional[FileWatcher] = default_watcher() if watcher == "auto" else watcher
+        self._recheck = set()  # Keys to stat on their next load regardless of the watcher
+        # Our own change state: other DataManagers sharing the watcher must not consume it
+        self._subscription: Optional[Subscription] = self.watcher.subscribe() if self.watcher else None
+        if self.watcher:
+            try:
+                for key in self.files:
+                    for path in self._watch_paths(key):
+                        self.watcher.watch(path)
+            except OSError:
+                # Directory not created yet, or out of inotify watches: stat on every access instead
+                self.watcher = None
+                self._subscription = None
+        self._size_trackers = {}  # token counter -> running history sizes, see history_size()
+        # Files are loaded (and, if enabled, repaired) lazily on first access
 
     def _load_file(self, key: str, force: bool = False):
         """
-        Loads a file with caching and hot-reload support.
+        Loads a file with caching and hot-reload support, then replays its journal (if any).
         If file is missing or corrupt, attempts LLM-based repair.
         """
+        with self._mutexes[key]:
+            if not force and not self._may_have_changed(key):
+                return  # Served from memory, no syscalls
+            if self._in_storage(key):
+                self._load_from_storage(key, force)
+                return
+            reloaded = self._load_snapshot(key, force)
+            if key in self.JOURNALED:
+                self._replay_journal(key, reset=reloaded)
+            if reloaded and key == "setting" and self.storage:
+                self.storage.index_setting(self.data["setting"])
+
+    def _watch_paths(self, key: str) -> List[str]:
+        if self._in_storage(key):
+            return self.storage.watch_paths()
+        if key in self.JOURNALED:
+            return [self.files[key], self._journal_path(key)]
+        return [self.files[key]]
+
+    def _may_have_changed(self, key: str) -> bool:
+        """Whether the files behind `key` need a stat (they may have been changed by someone else)."""
+        if self.watcher is None:
+            return True
+        changed = key in self._recheck
+        self._recheck.discard(key)
+        for path in self._watch_paths(key):
+            changed = self._subscription.changed(path) or changed  # Update every path's state
+        return changed
+
+    def _in_storage(self, key: str) -> bool:
+        return self.storage is not None and key in self.storage.KEYS
+
+    def _load_from_storage(self, key: str, force: bool = False):
+        if not force and key in self._pending:
+            return
+        version = self.storage.version(key)
+        if not force and self._storage_versions.get(key) == version:
+            return
+        loaded = self.storage.load(key)
+        self._storage_versions[key] = version
+        if loaded is not None and loaded != self.data.get(key):
+            self.data[key] = loaded
+            self._versions[key] += 1
+
+    def _load_snapshot(self, key: str, force: bool = False) -> bool:
+        """Load the JSON file itself. Returns True if self.data[key] was replaced."""
         path = self.files[key]
         
         # 1. Handle Missing File
@@ -58,15 +166,17 @@ class DataManager:
                     if key not in self.data or not self.data[key]:
                         # self.data already has defaults from __init__, just warn
                         console.print(f"[yellow]Warning: {key}.json not found and repair skipped. Using defaults.[/yellow]")
-                    return
+                    return False
             else:
-                return
+                return False
 
-        # 2. Check for Hot Reload (Mtime)
+        # 2. Check for Hot Reload (Mtime). Unwritten coalesced changes must not be replaced by the file.
+        if not force and key in self._pending:
+            return False
         try:
             current_mtime = os.path.getmtime(path)
             if not force and key in self._mtimes and current_mtime == self._mtimes[key]:
-                return  # Cache hit
+                return False  # Cache hit
         except OSError:
             pass # File might have been deleted/moved in the split second
 
@@ -77,20 +187,28 @@ class DataManager:
                 if not content.strip():
                     raise ValueError("Empty file")
                 
-                loaded = json.loads(content)
+                loaded = codec.loads(content)
                 if loaded:
+                    # Ensure default config exists for author
+                    if key == "author" and isinstance(loaded, dict) and "config" not in loaded:
+                        loaded["config"] = {"enable_instability": False, "enable_life_events": False}
+                    if loaded != self.data.get(key):
+                        # Re-reading unchanged content (e.g. a forced reload under a lock) keeps the version
+                        self._versions[key] += 1
                     self.data[key] = loaded
                     self._mtimes[key] = current_mtime
-                    
-                    # Ensure default config exists for author
-                    if key == "author" and "config" not in self.data["author"]:
-                        self.data["author"]["config"] = {"enable_instability": False, "enable_life_events": False}
-                        
+                    return True
+
         except (json.JSONDecodeError, ValueError) as e:
+            if not self.enable_auto_repair:
+                # Read-only callers (listings, status, the job coordinator) must never trigger LLM calls
+                console.print(f"[red]Error loading {key}.json: {e}.[/red]")
+                return False
             console.print(f"[red]Error loading {key}.json: {e}. Attempting auto-repair...[/red]")
             if self._repair_corrupt_file(key, content if 'content' in locals() else ""):
                 # Retry load recursively (force=True to bypass mtime check if file just written)
-                self._load_file(key, force=True)
+                return self._load_snapshot(key, force=True)
+        return False
 
     def _repair_missing_file(self, key: str) -> bool:
         """Attempts to create a missing file using LLM or defaults."""
@@ -119,7 +237,7 @@ class DataManager:
                 novel_name = os.path.basename(self.novel_dir)
                 prompt = f"请为一个名为《{novel_name}》的小说生成一个标准的 setting.json 配置文件模板。只返回 JSON 内容，不要Markdown格式。"
                 messages = [{"role": "user", "content": prompt}]
-                response = llm_client.chat_author(messages)
+                response = self.llm_client.chat_author(messages)
                 cleaned = self._clean_json(response)
                 data = json.loads(cleaned)
                 # Ensure critical fields
@@ -147,7 +265,7 @@ class DataManager:
         try:
             prompt = f"以下是一个损坏的 JSON 文件内容，请修复它并返回合法的 JSON。不要改变数据结构和键值，只修复语法错误。\n\n{content[:2000]}" # Limit context
             messages = [{"role": "user", "content": prompt}]
-            response = llm_client.chat_author(messages)
+            response = self.llm_client.chat_author(messages)
             cleaned = self._clean_json(response)
             data = json.loads(cleaned)
             
@@ -169,14 +287,238 @@ class DataManager:
             return match.group(1)
         return text.strip()
 
+    # --- Journals ---
+
+    def _journal_path(self, key: str) -> str:
+        return os.path.join(self.novel_dir, f"{key}.journal.jsonl")
+
+    def _replay_journal(self, key: str, reset: bool = False):
+        """
+        Apply journal records not yet in memory. Only the new tail of the file is read;
+        `reset` (the snapshot was just reloaded) replays everything after the snapshot's journal_seq.
+        """
+        state = self._journals.get(key)
+        if reset or state is None:
+            base_seq = int(self.data[key].get("journal_seq", 0)) if isinstance(self.data[key], dict) else 0
+            state = self._journals[key] = {"ino": None, "offset": 0, "seq": base_seq, "base_seq": base_seq}
+        try:
+            stat = os.stat(self._journal_path(key))
+        except OSError:
+            return
+        if state["ino"] is not None and stat.st_ino != state["ino"]:
+            # Compacted by another process: the snapshot has changed too
+            if not reset and self._load_snapshot(key, force=True):
+                self._replay_journal(key, reset=True)
+                return
+            state.update(offset=0)
+        state["ino"] = stat.st_ino
+        if stat.st_size <= state["offset"]:
+            return
+
+        with open(self._journal_path(key), "rb") as f:
+            f.seek(state["offset"])
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1  # An unterminated last line is a write in progress (or torn by a crash)
+        applied = 0
+        for line in chunk[:end].splitlines():
+            try:
+                record = codec.loads(line)
+            except ValueError:
+                continue
+            if record.get("seq", 0) <= state["seq"]:
+                continue
+            self._apply_record(key, record)
+            state["seq"] = record["seq"]
+            applied += 1
+        state["offset"] += end
+        if applied:
+            self._versions[key] += 1
+
+    def _apply_record(self, key: str, record: Dict):
+        if record.get("op") == "append":
+            self.data[key].setdefault(record["field"], []).append(record["value"])
+
+    def _journal_append(self, key: str, field: str, value: Any):
+        """
+        Append `value` to data[key][field] with an O(1) journal write instead of rewriting the file.
+        Call with _file_lock(key) held.
+        """
+        self._load_file(key)
+        if self._in_storage(key):
+            self._storage_versions[key] = self.storage.append(key, field, value)
+            self._apply_record(key, {"op": "append", "field": field, "value": value})
+            self._versions[key] += 1
+            return
+        state = self._journals.setdefault(key, {"ino": None, "offset": 0, "seq": 0, "base_seq": 0})
+        record = {"seq": state["seq"] + 1, "op": "append", "field": field, "value": value}
+        try:
+            with open(self._journal_path(key), "ab") as f:
+                f.write(codec.dump_bytes(record) + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+                state["offset"] = f.tell()
+                state["ino"] = os.fstat(f.fileno()).st_ino
+        except OSError as e:
+            console.print(f"[red]Error writing {key} journal: {e}[/red]")
+            return
+        self._apply_record(key, record)
+        state["seq"] = record["seq"]
+        self._versions[key] += 1
+        if state["seq"] - state["base_seq"] >= self.COMPACT_EVERY:
+            self._schedule_compaction(key)
+
+    def _schedule_compaction(self, key: str):
+        with self._mutexes[key]:
+            if key in self._compacting:
+                return
+            self._compacting.add(key)
+        threading.Thread(target=self.compact, args=(key,), name=f"compact-{key}").start()
+
+    def compact(self, key: str):
+        """Fold the journal of `key` into its JSON snapshot and start a new, empty journal."""
+        try:
+            with self._file_lock(key):
+                self._load_file(key)
+                self._write(key)
+        finally:
+            with self._mutexes[key]:
+                self._compacting.discard(key)
+
+    # --- Saving ---
+
+    @contextmanager
+    def transaction(self):
+        """
+        Coalesce writes: inside the block, save() only marks files dirty, and each dirty
+        file is written once when the outermost transaction exits (even on error).
+        Journal appends are not deferred. Nested transactions join the outer one.
+        """
+        depth = getattr(self._tx, "depth", 0)
+        self._tx.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self._tx.depth = depth
+            if depth == 0:
+                self.flush()
+
+    def flush(self, key: Optional[str] = None):
+        """Write pending (coalesced) saves now: all of them, or only `key`."""
+        with self._pending_lock:
+            keys = [k for k in self.files if k in self._pending and (key is None or k == key)]
+        for k in keys:
+            self._write(k, bump=False)
+
     def save(self, key: str):
         if key not in self.files: return
+        if getattr(self._tx, "depth", 0):
+            with self._pending_lock:
+                self._pending.add(key)
+            self._versions[key] += 1
+            return
+        self._write(key)
+
+    def _write(self, key: str, bump: bool = True):
+        """Write data[key] to disk now, atomically."""
+        with self._pending_lock:
+            self._pending.discard(key)
+        if self._in_storage(key):
+            with self._file_lock(key):
+                self._storage_versions[key] = self.storage.save(key, self.data[key])
+            if bump:
+                self._versions[key] += 1
+            return
+        if key in self.JOURNALED:
+            # The snapshot will contain every journaled record; hold the lock so no append slips
+            # between writing it and resetting the journal
+            with self._file_lock(key):
+                self._save_snapshot(key, bump)
+            return
+        with self._mutexes[key]:  # Not while another thread is updating the data
+            self._save_snapshot(key, bump)
+
+    def _save_snapshot(self, key: str, bump: bool = True):
         path = self.files[key]
+        state = self._journals.get(key)
+        if state and isinstance(self.data[key], dict):
+            self.data[key]["journal_seq"] = state["seq"]
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(self.data[key], f, ensure_ascii=False, indent=2)
+            self._atomic_write(path, lambda f: f.write(codec.disk_dumps(self.data[key])))
         except Exception as e:
             console.print(f"[red]Error saving {key}.json: {e}[/red]")
+        else:
+            if key in self.JOURNALED:
+                self._reset_journal(key)
+            if key == "setting" and self.storage:
+                self.storage.index_setting(self.data["setting"])
+        self._after_save(key, bump)
+
+    def _atomic_write(self, path: str, write):
+        """
+        Write via a temp file in the same directory, fsync it, and rename it over `path`.
+        A crash leaves either the old or the new file, never a truncated one.
+        """
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._fsync_dir(os.path.dirname(path))
+
+    @staticmethod
+    def _fsync_dir(directory: str):
+        """Persist a rename (POSIX); a no-op where directories cannot be opened."""
+        try:
+            fd = os.open(directory or ".", os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _reset_journal(self, key: str):
+        """Replace the journal with an empty file (a new inode, so other processes notice)."""
+        journal = self._journal_path(key)
+        state = self._journals.setdefault(key, {"ino": None, "offset": 0, "seq": 0, "base_seq": 0})
+        self._atomic_write(journal, lambda f: None)
+        state.update(ino=os.stat(journal).st_ino, offset=0, base_seq=state["seq"])
+
+    def _after_save(self, key: str, bump: bool = True):
+        path = self.files[key]
+        try:
+            # Our own write is not an external change: do not reload it on the next access
+            self._mtimes[key] = os.path.getmtime(path)
+        except OSError:
+            pass
+        if bump:
+            self._versions[key] += 1
+
+    def version(self, key: str) -> int:
+        """Change counter for a file's data (after hot-reload check)."""
+        self._load_file(key)
+        return self._versions.get(key, 0)
+
+    def derived(self, name: str, source_key: str, builder):
+        """
+        Memoize a value computed from data[source_key].
+        It is rebuilt only when that file's version changes (reload or save).
+        """
+        current = self.version(source_key)
+        cached = self._derived.get(name)
+        if cached and cached[0] == current:
+            return cached[1]
+        value = builder(self.data[source_key])
+        self._derived[name] = (current, value)
+        return value
 
     # --- Accessors & Updaters ---
 
@@ -209,46 +551,193 @@ class DataManager:
         self._load_file("setting")
         return self.data["setting"]
 
-    def update_setting(self, updates: Dict):
-        self._load_file("setting") # Ensure we have latest before update
-        self._deep_update(self.data["setting"], updates)
-        self.save("setting")
+    def replace(self, key: str, data: Dict, save: bool = True):
+        """
+        Replace a file's whole data. Always use this rather than assigning data[key]:
+        it bumps the version, so derived values (e.g. the rendered setting) are rebuilt.
+        With save=False the data is only kept in memory (e.g. for a preview).
+        """
+        with self._mutexes[key]:
+            self.data[key] = data
+            self._versions[key] += 1
+            if save:
+                self.save(key)
+
+    def update_setting(self, updates: Union[Dict, Callable[[Dict], Optional[Dict]]]):
+        """
+        Deep-merge `updates` into setting.json and save.
+        `updates` may be a callable taking the latest setting and returning the updates (or None
+        to change nothing); it runs under the setting lock, so read-modify-write cannot lose updates.
+        """
+        with self._file_lock("setting"):  # Serialize with background writers (e.g. volume prefetch)
+            self._load_file("setting") # Ensure we have latest before update
+            if callable(updates):
+                updates = updates(self.data["setting"])
+                if updates is None:
+                    return
+            self._deep_update(self.data["setting"], updates)
+            self.save("setting")
 
     def get_author(self) -> Dict:
         self._load_file("author")
         return self.data["author"]
 
     def update_author(self, updates: Dict):
-        self._load_file("author")
-        self._deep_update(self.data["author"], updates)
-        self.save("author")
+        with self._file_lock("author"):
+            self._load_file("author")
+            self._deep_update(self.data["author"], updates)
+            self.save("author")
         
     def get_history(self) -> Dict:
         self._load_file("history")
         return self.data["history"]
 
     def update_history(self, updates: Dict):
-        self._load_file("history")
-        self._deep_update(self.data["history"], updates)
-        self.save("history")
+        with self._file_lock("history"):
+            self._load_file("history")
+            self._deep_update(self.data["history"], updates)
+            self.save("history")
 
     def add_chapter_history(self, chapter_data: Dict):
-        self._load_file("history")
-        if "chapters" not in self.data["history"]:
-            self.data["history"]["chapters"] = []
-        self.data["history"]["chapters"].append(chapter_data)
-        self.save("history")
+        chapter_data = codec.validate(codec.CHAPTER_ENTRY, chapter_data, "chapter entry")
+        with self._history_lock():
+            self._load_file("history")
+            base_version = self._versions["history"]
+            self._journal_append("history", "chapters", chapter_data)
+            self._track_append(chapter_data, base_version)
+
+    def _history_lock(self):
+        """Exclusive lock on history.json: a thread lock plus a POSIX file lock across processes."""
+        return self._file_lock("history")
+
+    @contextmanager
+    def _file_lock(self, key: str):
+        """Exclusive, re-entrant lock on one data file: a thread lock plus a POSIX file lock across processes."""
+        with self._mutexes[key]:
+            if self._lock_depth[key]:
+                # Already held by this thread; a second flock on a new descriptor would deadlock
+                self._lock_depth[key] += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth[key] -= 1
+                return
+            with open(self.files[key] + ".lock", "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Another process may have written just before we got the lock; do not trust the watcher
+                self._recheck.add(key)
+                self._lock_depth[key] = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth[key] = 0
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def swap_memory(self, updates: Dict, folded_through: int, base_version: int) -> bool:
+        """
+        Install a memory version computed off the critical path (e.g. by a background fold).
+        Under the history lock: the swap is rejected if memory_version moved since `base_version`
+        (another fold won); otherwise `updates` are applied, active chapters up to `folded_through`
+        are dropped (chapters archived meanwhile stay), and memory_version is bumped.
+        """
+        with self._history_lock():
+            # A coalesced history save must reach disk first, or the forced reload would discard it
+            self.flush("history")
+            self._load_file("history", force=True)
+            history = self.data["history"]
+            if history.get("memory_version", 0) != base_version:
+                return False
+            history.update(updates)
+            chapters = history.get("chapters", [])
+            keep = [not isinstance(c, dict) or int(c.get("chapter", 0)) > folded_through for c in chapters]
+            history["chapters"] = [c for c, k in zip(chapters, keep) if k]
+            history["memory_version"] = base_version + 1
+            file_version = self._versions["history"]
+            # Written immediately even inside a transaction: other writers check memory_version on disk
+            self._write("history")
+            self._track_swap(keep, file_version)
+            return True
+
+    def commit_chapter(self, chapter_data: Dict, expected_chapter: Optional[int] = None):
+        """
+        Append a chapter entry with conflict detection, for writers that may race
+        (e.g. distributed workers sharing a novel directory).
+        The on-disk history is re-read under an exclusive file lock; the commit is
+        rejected if the chapter already exists or does not follow the last entry.
+        """
+        chapter_data = codec.validate(codec.CHAPTER_ENTRY, chapter_data, "chapter entry")
+        chap_num = chapter_data["chapter"]
+        if expected_chapter is not None and chap_num != expected_chapter:
+            raise ChapterConflictError(f"Chapter {chap_num} does not match expected chapter {expected_chapter}")
+
+        with self._history_lock():
+            # Any write by another process appends to or replaces the journal, which _load_file checks
+            self._load_file("history")
+            chapters = self.data["history"].setdefault("chapters", [])
+            existing = [c.get("chapter") for c in chapters if isinstance(c, dict)]
+            if chap_num in existing:
+                raise ChapterConflictError(f"Chapter {chap_num} has already been committed")
+            last = max([int(c) for c in existing if c is not None], default=0)
+            if chapters and chap_num != last + 1:
+                raise ChapterConflictError(f"Chapter {chap_num} does not follow last committed chapter {last}")
+            base_version = self._versions["history"]
+            self._journal_append("history", "chapters", chapter_data)
+            self._track_append(chapter_data, base_version)
+
+    # --- History size counters ---
+
+    def history_size(self, count=len) -> Dict[str, int]:
+        """
+        Size of the history context in units of `count` (e.g. a token counter):
+        {"summary": rolling_summary size, "chapters": active chapters as JSON, "count": active chapters}.
+
+        Running counters are kept per counter and updated as chapters are appended or folded,
+        so this is O(1); they are rebuilt only when history.json changes some other way.
+        """
+        with self._history_mutex:
+            current = self.version("history")
+            tracker = self._size_trackers.get(count)
+            if not tracker or tracker["version"] != current:
+                history = self.data["history"]
+                sizes = [self._entry_size(count, c) for c in history.get("chapters", [])]
+                tracker = {"version": current, "sizes": sizes, "chapters": sum(sizes),
+                           "summary": count(history.get("rolling_summary", "") or "")}
+                self._size_trackers[count] = tracker
+            return {"summary": tracker["summary"], "chapters": tracker["chapters"], "count": len(tracker["sizes"])}
+
+    @staticmethod
+    def _entry_size(count, entry) -> int:
+        return count(codec.dumps(entry))
+
+    def _track_append(self, entry: Dict, base_version: int):
+        """Update counters that were current at `base_version` for one appended chapter."""
+        for count, tracker in self._size_trackers.items():
+            if tracker["version"] == base_version:
+                size = self._entry_size(count, entry)
+                tracker["sizes"].append(size)
+                tracker["chapters"] += size
+                tracker["version"] = self._versions["history"]
+
+    def _track_swap(self, keep: List[bool], base_version: int):
+        """Update counters after a memory swap dropped folded chapters and replaced the summary."""
+        summary = self.data["history"].get("rolling_summary", "") or ""
+        for count, tracker in self._size_trackers.items():
+            if tracker["version"] == base_version and len(tracker["sizes"]) == len(keep):
+                tracker["sizes"] = [size for size, k in zip(tracker["sizes"], keep) if k]
+                tracker["chapters"] = sum(tracker["sizes"])
+                tracker["summary"] = count(summary)
+                tracker["version"] = self._versions["history"]
 
     def get_review(self) -> Dict:
         self._load_file("review")
         return self.data["review"]
 
     def add_review(self, review_data: Dict):
-        self._load_file("review")
-        if "reviews" not in self.data["review"]:
-            self.data["review"]["reviews"] = []
-        self.data["review"]["reviews"].append(review_data)
-        self.save("review")
+        review_data = codec.validate(codec.REVIEW, review_data, "review")
+        with self._file_lock("review"):
+            self._journal_append("review", "reviews", review_data)
 
     def save_chapter_text(self, chapter_num: int, content: str, title: str = None):
         """Saves the chapter content to a text file."""
@@ -266,8 +755,7 @@ class DataManager:
         path = os.path.join(chapters_dir, filename)
         
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(content)
+            self._atomic_write(path, lambda f: f.write(content))
             console.print(f"[green]已保存章节文件: {filename}[/green]")
         except Exception as e:
             console.print(f"[red]保存章节文件失败: {e}[/red]")
@@ -280,9 +768,66 @@ class DataManager:
                 target[k] = v
 
     def generate_markdown_setting(self) -> str:
-        """Convert setting.json to human-readable Markdown for LLM context."""
-        s = self.data["setting"]
+        """
+        Convert setting.json to human-readable Markdown for LLM context.
+        Rendered once per setting version; the same string object is returned until the setting changes.
+        """
+        return self.rendered_setting()["text"]
+
+    def rendered_setting(self) -> Dict:
+        """
+        Markdown setting memoized by setting version (bumped by update_setting, saves and reloads):
+        {"text", "hash": sha256 of text (a key for prompt-prefix and response caches),
+         "version", "tokens": counter -> size, see setting_tokens()}.
+        """
+        def render(setting):
+            text = self._render_markdown_setting(setting)
+            return {"text": text, "hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                    "version": self._versions["setting"], "tokens": {}}
+        return self.derived("setting_markdown", "setting", render)
+
+    def setting_tokens(self, count=len) -> int:
+        """Size of the rendered setting in units of `count`, measured once per setting version."""
+        rendered = self.rendered_setting()
+        tokens = rendered["tokens"]
+        if count not in tokens:
+            tokens[count] = count(rendered["text"])
+        return tokens[count]
+
+    def setting_projection(self, context_text: str = "", names=(), include_index: bool = True) -> str:
+        """
+        Markdown setting limited to what a chapter involves: factions and supporting characters
+        named in `context_text` (e.g. the brief, plan or recent chapters) or listed in `names`
+        (e.g. characters_involved), plus the protagonist, antagonist and world view.
+        With include_index, everything left out is listed by name in a compact index.
+        """
+        setting = self.get_setting()
+        relevant = {n for n in self.setting_entities() if n in context_text or n in names}
+        antagonist = (setting.get("characters") or {}).get("antagonist") if isinstance(setting.get("characters"), dict) else None
+        if isinstance(antagonist, dict) and antagonist.get("name"):
+            relevant.add(antagonist["name"])  # Always shown, so keep its relationships too
+        return self._render_markdown_setting(setting, relevant, include_index)
+
+    def setting_entities(self) -> List[str]:
+        """Names of the supporting characters and factions in setting.json (memoized per setting version)."""
+        def collect(s):
+            chars = s.get("characters", {}) if isinstance(s.get("characters"), dict) else {}
+            wv = s.get("world_view", s.get("world_setting", {})) or {}
+            names = [sup.get("name") for sup in chars.get("supporting", []) or [] if isinstance(sup, dict)]
+            factions = wv.get("factions", []) if isinstance(wv, dict) else []
+            if isinstance(factions, list):
+                names += [f.get("name") if isinstance(f, dict) else str(f) for f in factions]
+            return [n for n in names if n]
+        return self.derived("setting_entities", "setting", collect)
+
+    @staticmethod
+    def _render_markdown_setting(s: Dict, relevant=None, include_index: bool = True) -> str:
+        """Render setting.json; with a `relevant` set of names, only those factions and supporting characters."""
         if not s: return "暂无设定"
+
+        def keep(name):
+            return relevant is None or name in relevant
+        omitted_factions, omitted_characters = [], []
         
         meta = s.get("meta", {})
         wv = s.get("world_view", s.get("world_setting", {})) # Compatible with both keys
@@ -296,7 +841,7 @@ class DataManager:
         
         tags = meta.get('tags', [])
         if isinstance(tags, list):
-            md += f"* **标签**: {', '.join(tags)}\n\n"
+            md += f"* **标签**: {', '.join(map(str, tags))}\n\n"
         else:
             md += f"* **标签**: {tags}\n\n"
         
@@ -307,7 +852,7 @@ class DataManager:
         
         power = wv.get('power_system', [])
         if isinstance(power, list):
-            md += f"* **力量体系**: {'; '.join(power)}\n"
+            md += f"* **力量体系**: {'; '.join(map(str, power))}\n"
         else:
             md += f"* **力量体系**: {power}\n"
             
@@ -316,8 +861,11 @@ class DataManager:
             md += "* **势力**:\n"
             if isinstance(factions, list):
                 for f in factions:
-                    if isinstance(f, dict):
-                        md += f"  - {f.get('name', '?')}: {f.get('description', '')}\n"
+                    name = f.get('name', '?') if isinstance(f, dict) else str(f)
+                    if not keep(name):
+                        omitted_factions.append(name)
+                    elif isinstance(f, dict):
+                        md += f"  - {name}: {f.get('description', '')}\n"
                     else:
                         md += f"  - {f}\n"
             else:
@@ -335,14 +883,19 @@ class DataManager:
         
         # New relationships field at characters level
         rels = chars.get('relationships')
+        if rels and relevant is not None:
+            # Only the clauses that mention someone this chapter involves
+            rels = "；".join(part for part in re.split(r"[；;。\n]", str(rels))
+                            if part.strip() and any(name in part for name in relevant))
         if rels:
              md += f"* **人际关系网**: {rels}\n"
         
         # Old relationships field inside protagonist
-        elif 'relationships' in p:
+        elif 'relationships' in p and not chars.get('relationships'):
             md += "* **人际关系**:\n"
             for rel in p['relationships']:
-                md += f"  - {rel.get('name', '?')} ({rel.get('relation', '?')}): {rel.get('attitude', '?')}\n"
+                if keep(rel.get('name', '?')):
+                    md += f"  - {rel.get('name', '?')} ({rel.get('relation', '?')}): {rel.get('attitude', '?')}\n"
         
         a = chars.get("antagonist", {})
         if a:
@@ -351,13 +904,82 @@ class DataManager:
             md += f"* **动机**: {a.get('motivation', '未知')}\n"
             md += f"* **背景**: {a.get('background', '')}\n"
         
-        supporting = chars.get("supporting", [])
-        if supporting:
+        supporting = [sup for sup in chars.get("supporting", []) or [] if isinstance(sup, dict)]
+        shown = [sup for sup in supporting if keep(sup.get('name', '未命名'))]
+        omitted_characters = [f"{sup.get('name', '未命名')}({sup.get('role', '路人')})"
+                              for sup in supporting if sup not in shown]
+        if shown:
             md += "\n### 配角:\n"
-            for sup in supporting:
+            for sup in shown:
                 name = sup.get('name', '未命名')
                 role = sup.get('role', '路人')
                 trait = sup.get('trait', '')
                 md += f"* **{name}** ({role}): {trait}\n"
+
+        if include_index and (omitted_characters or omitted_factions):
+            md += "\n## 4. 其他设定索引（本章未涉及，仅列名称）\n"
+            if omitted_characters:
+                md += f"* **其他角色**: {'、'.join(omitted_characters)}\n"
+            if omitted_factions:
+                md += f"* **其他势力**: {'、'.join(omitted_factions)}\n"
             
         return md
+
+
+class NovelView:
+    """
+    Read-only, lazily loaded view of a novel for listings and status checks.
+    小说的只读轻量视图，用于列表与状态查询。
+
+    Only the files that are actually asked for are read. It never repairs, never writes,
+    never calls an LLM and registers no file watches, so scanning many novels stays cheap.
+    """
+
+    def __init__(self, novel_dir: str):
+        self.novel_dir = novel_dir
+        self.name = os.path.basename(os.path.normpath(novel_dir))
+        self._dm: Optional[DataManager] = None
+
+    @staticmethod
+    def is_novel(path: str) -> bool:
+        return os.path.isfile(os.path.join(path, "setting.json"))
+
+    @property
+    def _data(self) -> DataManager:
+        if self._dm is None:
+            self._dm = DataManager(self.novel_dir, enable_auto_repair=False, watcher=None)
+        return self._dm
+
+    @property
+    def setting(self) -> Dict:
+        return self._data.get_setting()
+
+    @property
+    def config(self) -> Dict:
+        return self.setting.get("config", {})
+
+    @property
+    def title(self) -> str:
+        return self.setting.get("meta", {}).get("title") or self.name
+
+    @property
+    def novel_type(self) -> str:
+        return self.config.get("novel_type", "long")
+
+    def last_chapter(self) -> int:
+        """Number of the last archived chapter (0 if none); reads history only."""
+        chapters = self._data.get_history().get("chapters", [])
+        if not chapters:
+            return 0
+        last = chapters[-1].get("chapter") if isinstance(chapters[-1], dict) else None
+        return max(len(chapters), int(last or 0))
+
+    def status(self) -> Dict:
+        return {
+            "name": self.name,
+            "title": self.title,
+            "novel_type": self.novel_type,
+            "chapters": self.last_chapter(),
+            "total_words_wan": self.config.get("total_words_wan"),
+        }
+
@@ -0,0 +1,165 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Dict, Optional, Set
+
+
+class FileWatcher:
+    """
+    Tells DataManager when a file may have changed, so reads need no syscalls otherwise.
+    文件变更检测：只有文件可能被改动时才需要 stat，平时读取直接走内存。
+
+    A watcher is shared by every DataManager in the process. It only keeps a change
+    generation per path; each reader checks it through its own Subscription, so one
+    reader noticing a change never hides it from another.
+    A True answer only means "stat it now"; the caller still compares mtimes,
+    so its own writes never cause a reload.
+    """
+
+    max_age = float("inf")  # A path is also reported once it has not been checked for this long
+
+    def watch(self, path: str):
+        """Start tracking `path`."""
+        raise NotImplementedError
+
+    def generation(self, path: str) -> int:
+        """Counter that changes whenever `path` may have changed. Pure in-memory."""
+        raise NotImplementedError
+
+    def subscribe(self) -> "Subscription":
+        """Change state for one reader (e.g. one DataManager)."""
+        return Subscription(self)
+
+
+class Subscription:
+    """One reader's view of a FileWatcher: the generation and check time it last saw per path."""
+
+    def __init__(self, watcher: FileWatcher):
+        self.watcher = watcher
+        self._seen: Dict[str, int] = {}
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def changed(self, path: str) -> bool:
+        """True if `path` may have changed since this subscriber last got True for it (first call: True)."""
+        generation = self.watcher.generation(path)
+        now = time.monotonic()
+        with self._lock:
+            if (self._seen.get(path) != generation
+                    or now - self._checked.get(path, float("-inf")) >= self.watcher.max_age):
+                self._seen[path] = generation
+                self._checked[path] = now
+                return True
+            return False
+
+
+class PollingWatcher(FileWatcher):
+    """TTL-bounded stat cache: each subscriber re-checks a path at most once every `ttl` seconds."""
+
+    def __init__(self, ttl: float = 1.0):
+        self.max_age = ttl
+
+    def watch(self, path: str):
+        pass
+
+    def generation(self, path: str) -> int:
+        return 0
+
+
+class InotifyWatcher(FileWatcher):
+    """
+    Linux inotify (via ctypes) on the directories of watched files.
+    Directories rather than files are watched, because saves replace files by renaming.
+    inotify does not see writes made by other hosts on network filesystems, so a path is
+    also reported as changed once a subscriber has not checked it for `max_age` seconds.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, max_age: float = 30.0):
+        self.max_age = max_age
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._lock = threading.Lock()
+        self._dirs: Dict[int, str] = {}       # watch descriptor -> directory
+        self._watched_dirs: Set[str] = set()
+        self._generations: Dict[str, int] = {}  # path -> number of events seen for it
+        self._epoch = 0  # Bumped on queue overflow, which invalidates every path
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+
+    def watch(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        with self._lock:
+            if directory in self._watched_dirs:
+                return
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self._dirs[wd] = directory
+            self._watched_dirs.add(directory)
+
+    def generation(self, path: str) -> int:
+        path = os.path.abspath(path)
+        with self._lock:
+            return self._epoch + self._generations.get(path, 0)
+
+    def _run(self):
+        while True:
+            select.select([self._fd], [], [])
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            with self._lock:
+                while offset + self._EVENT.size <= len(data):
+                    wd, mask, _cookie, length = self._EVENT.unpack_from(data, offset)
+                    name = data[offset + self._EVENT.size:offset + self._EVENT.size + length].rstrip(b"\0")
+                    offset += self._EVENT.size + length
+                    if mask & self.IN_Q_OVERFLOW:
+                        # Events were lost: treat everything as changed
+                        self._epoch += 1 << 32
+                        continue
+                    directory = self._dirs.get(wd)
+                    if directory and name:
+                        path = os.path.join(directory, os.fsdecode(name))
+                        self._generations[path] = self._generations.get(path, 0) + 1
+
+
+_default_watcher: Optional[FileWatcher] = None
+_default_lock = threading.Lock()
+
+
+def default_watcher() -> FileWatcher:
+    """
+    Process-wide watcher: inotify on Linux, a 1-second stat cache elsewhere (or if inotify
+    is unavailable). NOVEL_FILE_WATCHER=poll forces polling.
+    """
+    global _default_watcher
+    with _default_lock:
+        if _default_watcher is None:
+            if sys.platform.startswith("linux") and os.environ.get("NOVEL_FILE_WATCHER", "auto") != "poll":
+                try:
+                    _default_watcher = InotifyWatcher()
+                except (OSError, AttributeError):
+                    _default_watcher = PollingWatcher()
+            else:
+                _default_watcher = PollingWatcher()
+        return _default_watcher
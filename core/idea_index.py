@@ -0,0 +1,130 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from rich.console import Console
+from core import codec
+from core.similarity import char_shingles, MinHasher
+
+console = Console()
+
+
+def idea_text(idea: Dict) -> str:
+    """Text used to fingerprint an idea: title, hook and synopsis."""
+    if not isinstance(idea, dict):
+        return str(idea)
+    return " ".join(str(idea.get(k, "")) for k in ("title", "hook", "synopsis"))
+
+
+class IdeaDeduplicator:
+    """
+    Drops near-duplicate novel ideas using MinHash over character shingles.
+    使用字符 shingle 的 MinHash 过滤近似重复的创意。
+    """
+
+    def __init__(self, threshold: float = 0.5, shingle_size: int = 3, num_perm: int = 64):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm=num_perm)
+
+    def signature(self, text: str) -> List[int]:
+        return self.hasher.signature(char_shingles(text, self.shingle_size))
+
+    def filter(self, ideas: List[Dict], index: Optional["IdeaIndex"] = None) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Returns (kept, dropped). An idea is dropped if it is too similar to an idea
+        kept earlier in the same batch or to one already used by an existing novel.
+        """
+        existing = index.signatures() if index else {}
+        kept, kept_sigs, dropped = [], [], []
+        for idea in ideas:
+            sig = self.signature(idea_text(idea))
+            match = next((name for name, other in existing.items()
+                          if MinHasher.similarity(sig, other) >= self.threshold), None)
+            if match is None and any(MinHasher.similarity(sig, other) >= self.threshold for other in kept_sigs):
+                match = "本批次"
+            if match is None:
+                kept.append(idea)
+                kept_sigs.append(sig)
+            else:
+                dropped.append({"idea": idea, "duplicate_of": match})
+        return kept, dropped
+
+
+class IdeaIndex:
+    """
+    Persistent index of ideas already used by existing novels.
+    已有小说所用创意的持久化索引。
+
+    Each root directory (e.g. novel/, short_novels/) keeps a `.idea_index.json`
+    cache of signatures keyed by novel folder and the mtime of its setting.json,
+    so refreshing only re-fingerprints novels whose setting changed.
+    """
+
+    INDEX_FILE = ".idea_index.json"
+
+    def __init__(self, root_dirs: List[str], deduplicator: Optional[IdeaDeduplicator] = None):
+        self.root_dirs = root_dirs
+        self.deduplicator = deduplicator or IdeaDeduplicator()
+        self._signatures: Dict[str, List[int]] = {}
+
+    @staticmethod
+    def setting_idea(setting: Dict) -> Dict:
+        """Reconstruct the idea fields from a novel's setting.json."""
+        source = setting.get("source_idea")
+        if isinstance(source, dict) and source:
+            return source
+        meta = setting.get("meta", {})
+        return {"title": meta.get("title", ""), "hook": meta.get("core_hook", ""), "synopsis": meta.get("theme", "")}
+
+    def refresh(self) -> Dict[str, List[int]]:
+        signatures = {}
+        for root in self.root_dirs:
+            if not os.path.isdir(root):
+                continue
+            cache_path = os.path.join(root, self.INDEX_FILE)
+            cache = self._read_cache(cache_path)
+            updated = {}
+            for name in os.listdir(root):
+                setting_path = os.path.join(root, name, "setting.json")
+                try:
+                    mtime = os.path.getmtime(setting_path)
+                except OSError:
+                    continue
+                entry = cache.get(name)
+                if not entry or entry.get("mtime") != mtime:
+                    try:
+                        with open(setting_path, "r", encoding="utf-8") as f:
+                            setting = codec.loads(f.read())
+                    except (OSError, ValueError):
+                        continue
+                    entry = {"mtime": mtime, "signature": self.deduplicator.signature(idea_text(self.setting_idea(setting)))}
+                updated[name] = entry
+                signatures[name] = entry["signature"]
+            if updated != cache:
+                self._write_cache(cache_path, updated)
+        self._signatures = signatures
+        return signatures
+
+    def signatures(self) -> Dict[str, List[int]]:
+        return self.refresh()
+
+    @staticmethod
+    def _read_cache(path: str) -> Dict:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return codec.loads(f.read())
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_cache(path: str, data: Dict):
+        # Temp file + rename: factory threads and other processes may be reading the index
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(codec.dumps(data))
+            os.replace(tmp, path)
+        except OSError as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            console.print(f"[yellow]无法写入创意索引 {path}: {e}[/yellow]")
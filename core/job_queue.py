@@ -0,0 +1,391 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Dict, List, Optional
+from rich.console import Console
+from core.monitor import monitor
+
+console = Console()
+
+# Job kinds / 任务类型
+JOB_CHAPTER = "chapter"  # Write exactly one chapter (payload: {"chapter": N})
+JOB_NOVEL = "novel"      # Write several chapters in a row (payload: {"chapters": N})
+
+# Job states / 任务状态
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class JobBroker:
+    """
+    Pluggable broker interface for chapter/novel jobs.
+    章节/小说任务的可插拔队列接口。
+
+    Jobs are plain dicts with keys: id, kind, novel_dir, payload, status, worker,
+    lease_until, attempts, max_attempts, result, error.
+    Jobs of the same novel are handed out strictly in enqueue order, one at a time,
+    because chapters of a novel must be written sequentially.
+    """
+
+    def enqueue(self, kind: str, novel_dir: str, payload: Optional[Dict] = None,
+                priority: int = 1, max_attempts: int = 3) -> int:
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[Dict]:
+        """Atomically claim the next runnable job, or return None."""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """Extend a lease. Returns False if the worker no longer owns the job."""
+        raise NotImplementedError
+
+    def complete(self, job_id: int, worker_id: str, result: Optional[Dict] = None) -> bool:
+        raise NotImplementedError
+
+    def fail(self, job_id: int, worker_id: str, error: str, retry: bool = True) -> bool:
+        raise NotImplementedError
+
+    def list_jobs(self, novel_dir: Optional[str] = None) -> List[Dict]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        counts = {STATUS_PENDING: 0, STATUS_LEASED: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        for job in self.list_jobs():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+
+class SQLiteBroker(JobBroker):
+    """
+    SQLite-backed broker. The database file may live on storage shared by several hosts.
+    基于 SQLite 的任务队列，数据库文件可放在多台机器共享的存储上。
+
+    Uses the rollback journal rather than WAL, since WAL needs shared memory and
+    does not work over network filesystems. Every operation opens its own
+    connection so the broker can be used from worker and heartbeat threads alike.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        novel_dir TEXT NOT NULL,
+        payload TEXT NOT NULL DEFAULT '{}',
+        priority INTEGER NOT NULL DEFAULT 1,
+        status TEXT NOT NULL DEFAULT 'pending',
+        worker TEXT,
+        lease_until REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, priority, id);
+    CREATE INDEX IF NOT EXISTS idx_jobs_novel ON jobs(novel_dir, status, id);
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        parent = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        with closing(self._connect()) as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _row_to_job(row) -> Dict:
+        job = dict(row)
+        job["payload"] = json.loads(job.get("payload") or "{}")
+        if job.get("result"):
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def enqueue(self, kind, novel_dir, payload=None, priority=1, max_attempts=3):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (kind, novel_dir, payload, priority, max_attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, os.path.abspath(novel_dir), json.dumps(payload or {}, ensure_ascii=False),
+                 priority, max_attempts, now, now)
+            )
+            return cur.lastrowid
+
+    def lease(self, worker_id, lease_seconds):
+        now = time.time()
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front so two workers cannot claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            # A job whose lease keeps expiring (its worker crashed or was killed) fails once out of attempts,
+            # instead of being retried forever and blocking the rest of its novel
+            exhausted = conn.execute(
+                "SELECT id, worker FROM jobs WHERE status = 'leased' AND lease_until < ? AND attempts >= max_attempts",
+                (now,)
+            ).fetchall()
+            for dead in exhausted:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, worker = NULL, lease_until = NULL, updated_at = ? "
+                    "WHERE id = ?",
+                    ("lease expired on the last attempt", now, dead["id"])
+                )
+                monitor.log_event("JOB_FAILED", {"job": dead["id"], "worker": dead["worker"],
+                                                 "error": "lease expired on the last attempt"})
+            row = conn.execute(
+                """
+                SELECT * FROM jobs j
+                WHERE (j.status = 'pending'
+                       OR (j.status = 'leased' AND j.lease_until < ? AND j.attempts < j.max_attempts))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM jobs o
+                      WHERE o.novel_dir = j.novel_dir AND o.id < j.id
+                        AND (o.status = 'pending' OR o.status = 'leased')
+                  )
+                ORDER BY j.priority, j.id
+                LIMIT 1
+                """,
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            if row["status"] == STATUS_LEASED:
+                monitor.log_event("JOB_LEASE_EXPIRED", {"job": row["id"], "worker": row["worker"]})
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row["id"])
+            )
+            conn.execute("COMMIT")
+            job = self._row_to_job(row)
+            job.update({"status": STATUS_LEASED, "worker": worker_id, "attempts": row["attempts"] + 1})
+            return job
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id, worker_id, lease_seconds):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + lease_seconds, now, job_id, worker_id)
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id, worker_id, result=None):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (json.dumps(result or {}, ensure_ascii=False), now, job_id, worker_id)
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id, worker_id, error, retry=True):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN ? AND attempts < max_attempts THEN 'pending' ELSE 'failed' END,
+                    error = ?, worker = NULL, lease_until = NULL, updated_at = ?
+                WHERE id = ? AND worker = ? AND status = 'leased'
+                """,
+                (1 if retry else 0, error, now, job_id, worker_id)
+            )
+            return cur.rowcount == 1
+
+    def list_jobs(self, novel_dir=None):
+        with closing(self._connect()) as conn:
+            if novel_dir:
+                rows = conn.execute("SELECT * FROM jobs WHERE novel_dir = ? ORDER BY id",
+                                    (os.path.abspath(novel_dir),)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+
+# Broker registry: "sqlite:///path/to/queue.db" -> SQLiteBroker("path/to/queue.db")
+BROKERS = {
+    "sqlite": SQLiteBroker
+}
+
+
+def register_broker(scheme: str, broker_cls):
+    """Register an additional broker implementation under a URL scheme."""
+    BROKERS[scheme] = broker_cls
+
+
+def create_broker(spec: str) -> JobBroker:
+    """Create a broker from a 'scheme://location' spec. A bare path means SQLite."""
+    if "://" not in spec:
+        return SQLiteBroker(spec)
+    scheme, location = spec.split("://", 1)
+    if scheme not in BROKERS:
+        raise ValueError(f"Unknown broker scheme '{scheme}'. Available: {', '.join(BROKERS)}")
+    return BROKERS[scheme](location)
+
+
+class JobCoordinator:
+    """Enqueues chapter or novel jobs for worker nodes."""
+
+    def __init__(self, broker: JobBroker):
+        self.broker = broker
+
+    def _next_unqueued_chapter(self, novel_dir: str) -> int:
+        from core.data_manager import NovelView
+
+        # Read-only view: reads history only and never triggers repairs or LLM calls
+        next_chapter = NovelView(novel_dir).last_chapter() + 1
+        for job in self.broker.list_jobs(novel_dir):
+            if job["kind"] == JOB_CHAPTER and job["status"] in (STATUS_PENDING, STATUS_LEASED, STATUS_DONE):
+                next_chapter = max(next_chapter, int(job["payload"].get("chapter", 0)) + 1)
+        return next_chapter
+
+    def enqueue_chapters(self, novel_dir: str, count: int, priority: int = 1) -> List[int]:
+        """Enqueue one job per chapter, continuing after chapters already written or queued."""
+        start = self._next_unqueued_chapter(novel_dir)
+        return [
+            self.broker.enqueue(JOB_CHAPTER, novel_dir, {"chapter": chap}, priority=priority)
+            for chap in range(start, start + count)
+        ]
+
+    def enqueue_novel(self, novel_dir: str, chapters: int, priority: int = 1) -> int:
+        """Enqueue a single job that writes `chapters` chapters in a row."""
+        return self.broker.enqueue(JOB_NOVEL, novel_dir, {"chapters": chapters}, priority=priority)
+
+
+class LeaseLostError(Exception):
+    """Raised when a worker's lease was taken over before it could commit."""
+
+
+class JobWorker:
+    """
+    Leases jobs, keeps the lease alive with a heartbeat thread, and commits results
+    through DataManager.commit_chapter, which rejects conflicting writes.
+    """
+
+    def __init__(self, broker: JobBroker, worker_id: Optional[str] = None, lease_seconds: float = 600.0,
+                 poll_interval: float = 5.0, llm_client=None):
+        self.broker = broker
+        self.llm_client = llm_client
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def run(self, max_jobs: Optional[int] = None, exit_when_idle: bool = False):
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            job = self.broker.lease(self.worker_id, self.lease_seconds)
+            if job is None:
+                if exit_when_idle:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            self.process(job)
+            processed += 1
+        return processed
+
+    def process(self, job: Dict):
+        console.print(f"[cyan][{self.worker_id}] 领取任务 #{job['id']} ({job['kind']}) {os.path.basename(job['novel_dir'])}[/cyan]")
+        lost = threading.Event()
+        stop = threading.Event()
+
+        def _beat():
+            while not stop.wait(self.lease_seconds / 3):
+                if not self.broker.heartbeat(job["id"], self.worker_id, self.lease_seconds):
+                    lost.set()
+                    return
+
+        beat = threading.Thread(target=_beat, name=f"heartbeat-{job['id']}", daemon=True)
+        beat.start()
+        try:
+            result = self._execute(job, lost)
+            if self.broker.complete(job["id"], self.worker_id, result):
+                console.print(f"[green][{self.worker_id}] 任务 #{job['id']} 完成[/green]")
+            else:
+                console.print(f"[yellow][{self.worker_id}] 任务 #{job['id']} 完成时租约已失效[/yellow]")
+        except Exception as e:
+            from core.data_manager import ChapterConflictError
+            # Conflicts and lost leases will not go away on retry
+            retry = not isinstance(e, (ChapterConflictError, LeaseLostError))
+            monitor.log_event("JOB_FAILED", {"job": job["id"], "worker": self.worker_id, "error": str(e)})
+            console.print(f"[red][{self.worker_id}] 任务 #{job['id']} 失败: {e}[/red]")
+            self.broker.fail(job["id"], self.worker_id, str(e), retry=retry)
+        finally:
+            stop.set()
+            beat.join()
+
+    def _execute(self, job: Dict, lost: threading.Event) -> Dict:
+        from agents.novel_pipeline import NovelPipeline
+
+        pipeline = NovelPipeline(job["novel_dir"], llm_client=self.llm_client)
+
+        def _before_commit():
+            # Re-check ownership right before touching the novel's files
+            if lost.is_set() or not self.broker.heartbeat(job["id"], self.worker_id, self.lease_seconds):
+                raise LeaseLostError(f"Lease on job #{job['id']} lost")
+
+        try:
+            if job["kind"] == JOB_CHAPTER:
+                chapter = int(job["payload"]["chapter"])
+                entry = pipeline.write_next_chapter(expected_chapter=chapter, before_commit=_before_commit)
+                if entry is None:
+                    raise RuntimeError(f"第 {chapter} 章未通过审核")
+                return {"chapters": [entry["chapter"]]}
+
+            if job["kind"] == JOB_NOVEL:
+                written = []
+                for _ in range(int(job["payload"].get("chapters", 1))):
+                    if pipeline.is_complete():
+                        break
+                    entry = pipeline.write_next_chapter(before_commit=_before_commit)
+                    if entry is None:
+                        break
+                    written.append(entry["chapter"])
+                return {"chapters": written}
+        finally:
+            # Background memory folds must land before the job is reported done
+            pipeline.close()
+
+        raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+def _worker_process(broker_spec: str, lease_seconds: float, exit_when_idle: bool):
+    """multiprocessing entry point: each process opens its own broker connection."""
+    JobWorker(create_broker(broker_spec), lease_seconds=lease_seconds).run(exit_when_idle=exit_when_idle)
+
+
+def run_local_workers(broker_spec: str, processes: int, lease_seconds: float = 600.0, exit_when_idle: bool = True):
+    """Run several worker processes on this host (no external services needed)."""
+    import multiprocessing
+
+    procs = [
+        multiprocessing.Process(target=_worker_process, args=(broker_spec, lease_seconds, exit_when_idle),
+                                name=f"job-worker-{i}")
+        for i in range(processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
@@ -3,7 +3,7 @@ import time
 from rich.console import Console
 from rich.text import Text
 from rich.live import Live
-from config.llm_config import llm_client, LLMConfig
+from config.llm_config import llm_client as default_llm_client
 
 console = Console()
 
@@ -12,17 +12,24 @@ class LLMInterface:
     Unified interface for LLM interactions.
     Handles streaming, thinking process display, and JSON cleaning.
     """
+
+    def __init__(self, client=None):
+        """
+        Args:
+            client: LLMClient session to use (defaults to the global default client).
+        """
+        self.client = client or default_llm_client
     
-    @staticmethod
-    def chat_with_status(messages, description="正在生成...", target_length=None):
+    def chat_with_status(self, messages, description="正在生成...", target_length=None):
         """Generic LLM chat with real-time status line."""
         full_content = ""
         full_reasoning = ""
         is_thinking = False
         
         # Determine initial status
-        model_config = LLMConfig.get_config(LLMConfig.AUTHOR_MODEL_KEY)
-        show_thinking = LLMConfig.SHOW_THINKING and model_config.get("supports_thinking", False)
+        config = self.client.config
+        model_config = config.get_config(config.author_model_key)
+        show_thinking = config.show_thinking and model_config.get("supports_thinking", False)
         
         status_text = Text(f"🚀 连接中... {description}", style="bold cyan")
         
@@ -33,7 +40,7 @@ class LLMInterface:
             live.refresh()
             
             try:
-                response_stream = llm_client.chat_author(messages, stream=True)
+                response_stream = self.client.chat_author(messages, stream=True)
                 
                 # Handle non-stream response (error or mock)
                 if isinstance(response_stream, str):
@@ -94,6 +101,17 @@ class LLMInterface:
             
         return full_content
 
+    def chat_quiet(self, messages, temperature=0.7):
+        """
+        Non-streaming chat without the live status line.
+        Safe to call from worker threads, where only one rich Live display may be active.
+        """
+        return self.client.chat_author(messages, temperature=temperature, stream=False)
+
+    def chat_samples(self, messages, n, temperature=0.9):
+        """Get `n` independent samples (provider `n` parameter or concurrent requests)."""
+        return self.client.chat_author_samples(messages, n, temperature=temperature)
+
     @staticmethod
     def clean_json_response(text: str) -> str:
         """Extract JSON from markdown code blocks if present."""
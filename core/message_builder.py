@@ -0,0 +1,49 @@
+import hashlib
+from typing import Dict, List
+
+
+class MessageBuilder:
+    """
+    Builds chat messages ordered from most static to most volatile content.
+    按“从稳定到多变”的顺序组织提示内容，以命中服务商的前缀缓存。
+
+    Providers cache the longest prompt prefix already seen, so everything that stays the
+    same from one chapter to the next (system prompt, setting, long-term memory) must come
+    before what changes every call (recent chapters, pacing, the task itself).
+    Sections are rendered by layer, then in the order they were added within a layer;
+    prefix_hash() tells whether two prompts share the same static prefix.
+    """
+
+    SYSTEM = 0   # Rendered as the system message
+    SETTING = 1  # Setting / world view: changes only when the setting is edited
+    MEMORY = 2   # Long-term memory: rolling summary, arcs, open foreshadowing
+    RECENT = 3   # Recent chapters, brief, per-chapter outline
+    TASK = 4     # Pacing data and the instruction for this call
+
+    def __init__(self, system: str = ""):
+        self._sections: List[Dict] = []
+        if system:
+            self.add(self.SYSTEM, system)
+
+    def add(self, layer: int, text: str) -> "MessageBuilder":
+        """Add a section to a layer (empty text is ignored). Returns self for chaining."""
+        if text and text.strip():
+            self._sections.append({"layer": layer, "text": text.strip()})
+        return self
+
+    def _layer_texts(self, low: int, high: int) -> List[str]:
+        return [s["text"] for s in sorted(self._sections, key=lambda s: s["layer"]) if low <= s["layer"] <= high]
+
+    def build(self) -> List[Dict]:
+        """The messages: a system message (if any) and one user message with the other layers."""
+        messages = []
+        system = "\n\n".join(self._layer_texts(self.SYSTEM, self.SYSTEM))
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": "\n\n".join(self._layer_texts(self.SETTING, self.TASK))})
+        return messages
+
+    def prefix_hash(self, through: int = MEMORY) -> str:
+        """Hash of the layers up to `through`: calls with equal hashes share a cacheable prefix."""
+        prefix = "\n\n".join(self._layer_texts(self.SYSTEM, through))
+        return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
@@ -2,6 +2,7 @@ import logging
 import datetime
 import os
 import json
+import threading
 
 class Monitor:
     LOG_FILE = "llm.report"
@@ -16,6 +17,8 @@ class Monitor:
             formatter = logging.Formatter('%(asctime)s - [%(levelname)s] - %(message)s')
             handler.setFormatter(formatter)
             self.logger.addHandler(handler)
+        self.cache_stats = {}  # model -> prompt/cached token totals, see log_usage()
+        self._stats_lock = threading.Lock()
 
     def log_event(self, event_type: str, details: dict):
         """Generic event logger."""
@@ -43,6 +46,46 @@ class Monitor:
         }
         self.log_event("GENERATION", details)
 
+    def log_usage(self, model: str, usage):
+        """
+        Log token usage of a response, including prompt tokens served from the provider's prefix cache
+        (usage.prompt_tokens_details.cached_tokens, or prompt_cache_hit_tokens on DeepSeek).
+        Running totals per model are kept in cache_stats; see cache_hit_rate().
+        """
+        prompt_tokens = _field(usage, "prompt_tokens") or 0
+        cached = _field(_field(usage, "prompt_tokens_details"), "cached_tokens")
+        if cached is None:
+            cached = _field(usage, "prompt_cache_hit_tokens")
+        with self._stats_lock:
+            stats = self.cache_stats.setdefault(model, {"requests": 0, "prompt_tokens": 0,
+                                                        "reported_prompt_tokens": 0, "cached_tokens": 0})
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            if cached is not None:
+                # Only responses that report caching count towards the hit rate
+                stats["reported_prompt_tokens"] += prompt_tokens
+                stats["cached_tokens"] += cached
+        details = {
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _field(usage, "completion_tokens") or 0,
+            "cached_tokens": cached,
+            "cache_hit_rate": self.cache_hit_rate(model)
+        }
+        self.log_event("USAGE", details)
+
+    def cache_hit_rate(self, model: str = None):
+        """Share of prompt tokens served from the prefix cache (all models if None); None if never reported."""
+        with self._stats_lock:
+            if model:
+                stats = [self.cache_stats[model]] if model in self.cache_stats else []
+            else:
+                stats = list(self.cache_stats.values())
+            reported = sum(s["reported_prompt_tokens"] for s in stats)
+            if not reported:
+                return None
+            return round(sum(s["cached_tokens"] for s in stats) / reported, 4)
+
     def log_rate_limit(self, model: str, wait_time: float, retry_count: int):
         """Log rate limit hit."""
         details = {
@@ -60,5 +103,13 @@ class Monitor:
         }
         self.logger.error(f"[ERROR] {json.dumps(details, ensure_ascii=False)}")
 
+def _field(obj, name):
+    """Read a usage field from an SDK object or a plain dict."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
 # Global instance
 monitor = Monitor()
@@ -0,0 +1,281 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+from rich.console import Console
+from config.llm_config import llm_client as default_llm_client
+from core.llm import LLMInterface
+from core.monitor import monitor
+
+console = Console()
+
+# Request priorities (lower value is served first)
+# 请求优先级（数值越小越先执行）
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class _NovelLane:
+    """Per-novel queue, quota and fairness bookkeeping."""
+
+    def __init__(self, novel_id: str, weight: float, max_concurrency: int, client=None):
+        self.novel_id = novel_id
+        self.client = client  # LLMClient session of this novel (None: the scheduler's client)
+        self.weight = max(weight, 0.01)
+        self.max_concurrency = max(1, max_concurrency)
+        self.pending = []  # heap of (priority, seq, request)
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self.completed = 0
+
+    def eligible(self) -> bool:
+        return bool(self.pending) and self.in_flight < self.max_concurrency
+
+
+class LLMScheduler:
+    """
+    In-process scheduler that shares one LLM client between many novel pipelines.
+    进程内调度器：多本小说共享同一个 LLM 客户端与配额。
+
+    Requests from all novels go into a global priority queue. Among requests of
+    equal priority, novels are served by weighted fair queuing (each dispatch
+    advances the novel's virtual time by 1/weight), and no novel may exceed its
+    own concurrency cap. A fixed pool of workers keeps up to `max_workers`
+    requests in flight, so aggregate throughput is bounded by the provider's
+    limits rather than by a single novel's serial chain.
+    """
+
+    def __init__(self, client=None, max_workers: int = 8, requests_per_minute: Optional[float] = None,
+                 default_max_concurrency: int = 2):
+        """
+        Args:
+            client: LLMClient session to dispatch to (defaults to the global default client).
+            max_workers: Global number of concurrent in-flight requests.
+            requests_per_minute: Optional global dispatch rate cap.
+            default_max_concurrency: Per-novel cap for novels registered implicitly.
+        """
+        self.client = client or default_llm_client
+        self.max_workers = max(1, max_workers)
+        self.min_dispatch_interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.default_max_concurrency = default_max_concurrency
+        self._lanes: Dict[str, _NovelLane] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._last_dispatch = 0.0
+        self._workers: List[threading.Thread] = []
+        self._running = False
+
+    # --- Lifecycle ---
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.max_workers):
+            t = threading.Thread(target=self._worker_loop, name=f"llm-scheduler-{i}", daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def shutdown(self, wait: bool = True):
+        """Stop workers. Pending requests are cancelled."""
+        with self._cond:
+            self._running = False
+            for lane in self._lanes.values():
+                while lane.pending:
+                    _, _, request = heapq.heappop(lane.pending)
+                    request["future"].cancel()
+            self._cond.notify_all()
+        if wait:
+            for t in self._workers:
+                t.join()
+        self._workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    # --- Registration & Submission ---
+
+    def register(self, novel_id: str, weight: float = 1.0, max_concurrency: Optional[int] = None, client=None):
+        """
+        Register (or update) a novel's share of the quota.
+        `client` is the novel's own LLMClient session (see fork_client); requests of this
+        novel are sent through it, so a model switch in one novel does not affect the others.
+        """
+        with self._cond:
+            cap = max_concurrency or self.default_max_concurrency
+            lane = self._lanes.get(novel_id)
+            if lane:
+                lane.weight = max(weight, 0.01)
+                lane.max_concurrency = max(1, cap)
+                if client is not None:
+                    lane.client = client
+            else:
+                self._lanes[novel_id] = _NovelLane(novel_id, weight, cap, client)
+
+    def fork_client(self):
+        """
+        A client with its own copy of the configuration, sharing connections and rate limits.
+        为单本小说复制独立的模型配置，共享连接与频率限制。
+        """
+        return self.client.with_config(self.client.config.copy())
+
+    def client_for(self, novel_id: str):
+        """The LLMClient session a novel's requests are sent through."""
+        with self._cond:
+            lane = self._lanes.get(novel_id)
+            return (lane.client if lane else None) or self.client
+
+    def submit(self, novel_id: str, messages, priority: int = PRIORITY_NORMAL,
+               temperature: float = 0.7, role: str = "author") -> Future:
+        """Queue a chat request and return a Future resolving to the response text."""
+        future = Future()
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("LLMScheduler is not running. Call start() first.")
+            lane = self._lanes.get(novel_id)
+            if lane is None:
+                lane = _NovelLane(novel_id, 1.0, self.default_max_concurrency)
+                self._lanes[novel_id] = lane
+            if not lane.pending and lane.in_flight == 0:
+                # A lane returning from idle must not bank credit from the time it was away
+                lane.virtual_time = max(lane.virtual_time, self._min_active_virtual_time())
+            request = {
+                "novel_id": novel_id,
+                "messages": messages,
+                "temperature": temperature,
+                "role": role,
+                "future": future,
+                "queued_at": time.time()
+            }
+            heapq.heappush(lane.pending, (priority, next(self._seq), request))
+            self._cond.notify()
+        return future
+
+    def chat(self, novel_id: str, messages, priority: int = PRIORITY_NORMAL,
+             temperature: float = 0.7, role: str = "author") -> str:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(novel_id, messages, priority, temperature, role).result()
+
+    def interface(self, novel_id: str, priority: int = PRIORITY_NORMAL) -> "ScheduledLLMInterface":
+        """Return an LLMInterface-compatible object bound to a novel's lane."""
+        return ScheduledLLMInterface(self, novel_id, priority)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._cond:
+            return {
+                nid: {
+                    "weight": lane.weight,
+                    "pending": len(lane.pending),
+                    "in_flight": lane.in_flight,
+                    "completed": lane.completed
+                }
+                for nid, lane in self._lanes.items()
+            }
+
+    # --- Dispatch ---
+
+    def _min_active_virtual_time(self) -> float:
+        active = [l.virtual_time for l in self._lanes.values() if l.pending or l.in_flight]
+        return min(active) if active else 0.0
+
+    def _pick_lane(self) -> Optional[_NovelLane]:
+        """Highest priority first, then the lane with the smallest virtual time."""
+        best, best_key = None, None
+        for lane in self._lanes.values():
+            if not lane.eligible():
+                continue
+            priority, seq, _ = lane.pending[0]
+            key = (priority, lane.virtual_time, seq)
+            if best_key is None or key < best_key:
+                best, best_key = lane, key
+        return best
+
+    def _next_request(self):
+        """Block until a request may be dispatched. Returns (lane, request) or None on shutdown."""
+        with self._cond:
+            while True:
+                if not self._running:
+                    return None
+                lane = self._pick_lane()
+                if lane is None:
+                    self._cond.wait()
+                    continue
+                wait = self._last_dispatch + self.min_dispatch_interval - time.time()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                _, _, request = heapq.heappop(lane.pending)
+                lane.in_flight += 1
+                lane.virtual_time += 1.0 / lane.weight
+                self._last_dispatch = time.time()
+                return lane, request
+
+    def _worker_loop(self):
+        while True:
+            item = self._next_request()
+            if item is None:
+                return
+            lane, request = item
+            future = request["future"]
+            if not future.set_running_or_notify_cancel():
+                self._release(lane, completed=False)
+                continue
+            try:
+                client = lane.client or self.client
+                if request["role"] == "reviewer":
+                    result = client.chat_reviewer(request["messages"], temperature=request["temperature"])
+                else:
+                    result = client.chat_author(request["messages"], temperature=request["temperature"])
+                future.set_result(result)
+            except Exception as e:
+                monitor.log_error(lane.novel_id, str(e))
+                future.set_exception(e)
+            finally:
+                self._release(lane)
+
+    def _release(self, lane: _NovelLane, completed: bool = True):
+        with self._cond:
+            lane.in_flight -= 1
+            if completed:
+                lane.completed += 1
+            self._cond.notify_all()
+
+
+class ScheduledLLMInterface:
+    """
+    Drop-in replacement for LLMInterface that routes calls through an LLMScheduler.
+    Prints a one-line status instead of a Live display, so many novels can run in parallel threads.
+    """
+
+    def __init__(self, scheduler: LLMScheduler, novel_id: str, priority: int = PRIORITY_NORMAL):
+        self.scheduler = scheduler
+        self.novel_id = novel_id
+        self.priority = priority
+
+    @property
+    def client(self):
+        return self.scheduler.client_for(self.novel_id)
+
+    def chat_with_status(self, messages, description="正在生成...", target_length=None):
+        console.print(f"[dim][{self.novel_id}] {description}[/dim]")
+        return self.scheduler.chat(self.novel_id, messages, priority=self.priority)
+
+    def chat_quiet(self, messages, temperature=0.7):
+        return self.scheduler.chat(self.novel_id, messages, priority=self.priority, temperature=temperature)
+
+    def chat_samples(self, messages, n, temperature=0.9):
+        futures = [self.scheduler.submit(self.novel_id, messages, priority=self.priority, temperature=temperature)
+                   for _ in range(n)]
+        return [f.result() for f in futures]
+
+    @staticmethod
+    def clean_json_response(text: str) -> str:
+        return LLMInterface.clean_json_response(text)
@@ -0,0 +1,52 @@
+import random
+import zlib
+from typing import Iterable, List, Set
+
+# Mersenne prime for universal hashing
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def char_shingles(text: str, k: int = 3) -> Set[str]:
+    """
+    Character k-shingles. Works for CJK text, which has no word boundaries.
+    字符级 k-shingle，适用于没有词边界的中文文本。
+    """
+    text = "".join((text or "").split())
+    if len(text) < k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """Exact Jaccard similarity of two sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    MinHash signatures for fast approximate Jaccard similarity.
+    Uses crc32 plus seeded universal hashing, so signatures are stable across
+    processes (unlike Python's randomized hash()) and can be persisted.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 42):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shingles: Iterable[str]) -> List[int]:
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        if not hashes:
+            # No content: similar to nothing (like jaccard), rather than identical to every other empty idea
+            return []
+        return [min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in self._params]
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """Estimated Jaccard similarity: fraction of matching signature slots."""
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
@@ -0,0 +1,346 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import codec
+
+
+class StorageBackend:
+    """
+    Pluggable storage for DataManager.
+    DataManager 的可插拔存储接口。
+
+    A backend stores the documents named in KEYS ("history", "review", ...) as plain
+    dicts in the JSON layout; DataManager keeps the in-memory view and its accessor API.
+    Files not in KEYS stay as JSON files in the novel directory.
+    """
+
+    KEYS: Tuple[str, ...] = ()
+
+    def load(self, key: str) -> Optional[Dict]:
+        """The whole document, or None if it was never stored."""
+        raise NotImplementedError
+
+    def save(self, key: str, data: Dict) -> int:
+        """Replace the whole document. Returns the new version."""
+        raise NotImplementedError
+
+    def append(self, key: str, field: str, value: Any) -> int:
+        """Append `value` to the list data[field] (chapters, reviews). Returns the new version."""
+        raise NotImplementedError
+
+    def version(self, key: str) -> int:
+        """Change counter of a document, shared by every process using the store."""
+        raise NotImplementedError
+
+    def index_setting(self, setting: Dict):
+        """Called with setting.json whenever it is loaded or saved (for character lookups)."""
+
+    def watch_paths(self) -> List[str]:
+        """Files whose changes mean a document may have changed (for FileWatcher)."""
+        return []
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    SQLite storage in <novel_dir>/novel.db with indexed tables.
+    基于 SQLite 的小说数据存储，章节、审核、角色、伏笔与作者演化均建表建索引。
+
+    history, review and author live in the database; setting.json stays a JSON file
+    (it is small, edited by hand and read by novel listings) and its characters are
+    indexed into the characters table. Unlike history.json, the chapters table keeps
+    folded chapters (active = 0), so queries cover the whole novel.
+    Like SQLiteBroker, it uses the rollback journal and one connection per operation.
+    """
+
+    FILENAME = "novel.db"
+    KEYS = ("history", "review", "author")
+    # Document fields stored in their own tables instead of the docs row
+    TABLE_FIELDS = {"history": "chapters", "review": "reviews", "author": "evolution"}
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS docs (
+        key TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS chapters (
+        chapter INTEGER PRIMARY KEY,
+        title TEXT,
+        summary TEXT,
+        score INTEGER,
+        active INTEGER NOT NULL DEFAULT 1,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_chapters_active ON chapters(active, chapter);
+    CREATE TABLE IF NOT EXISTS chapter_characters (
+        chapter INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (name, chapter)
+    );
+    CREATE TABLE IF NOT EXISTS foreshadowing (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chapter INTEGER NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_foreshadowing_chapter ON foreshadowing(chapter);
+    CREATE TABLE IF NOT EXISTS reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chapter INTEGER,
+        attempt INTEGER,
+        score REAL,
+        passed INTEGER,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_reviews_score ON reviews(score, chapter);
+    CREATE INDEX IF NOT EXISTS idx_reviews_chapter ON reviews(chapter, attempt);
+    CREATE TABLE IF NOT EXISTS characters (
+        name TEXT PRIMARY KEY,
+        role TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_characters_role ON characters(role);
+    CREATE TABLE IF NOT EXISTS author_evolution (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp REAL,
+        event TEXT,
+        effect TEXT,
+        data TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        with closing(self._connect()) as conn:
+            conn.executescript(self.SCHEMA)
+
+    @classmethod
+    def for_novel(cls, novel_dir: str) -> Optional["SQLiteStorage"]:
+        """The store of a novel directory, if it has been imported (novel.db exists)."""
+        path = os.path.join(novel_dir, cls.FILENAME)
+        return cls(path) if os.path.exists(path) else None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # --- StorageBackend ---
+
+    def watch_paths(self) -> List[str]:
+        return [self.db_path]
+
+    def version(self, key: str) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT version FROM docs WHERE key = ?", (key,)).fetchone()
+        return row["version"] if row else 0
+
+    def load(self, key: str) -> Optional[Dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT data FROM docs WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            data = codec.loads(row["data"])
+            if key == "history":
+                data["chapters"] = [codec.loads(r["data"]) for r in conn.execute(
+                    "SELECT data FROM chapters WHERE active = 1 ORDER BY chapter")]
+            elif key == "review":
+                data["reviews"] = [codec.loads(r["data"]) for r in conn.execute(
+                    "SELECT data FROM reviews ORDER BY id")]
+            elif key == "author":
+                data["evolution"] = [codec.loads(r["data"]) for r in conn.execute(
+                    "SELECT data FROM author_evolution ORDER BY id")]
+        return data
+
+    def save(self, key: str, data: Dict) -> int:
+        field = self.TABLE_FIELDS.get(key)
+        doc = {k: v for k, v in data.items() if k != field}
+        items = data.get(field, []) if field else []
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if key == "history":
+                    # Chapters missing from the list were folded into memory: keep them, inactive
+                    conn.execute("UPDATE chapters SET active = 0")
+                    for entry in items:
+                        self._insert_chapter(conn, entry)
+                elif key == "review":
+                    conn.execute("DELETE FROM reviews")
+                    for review in items:
+                        self._insert_review(conn, review)
+                elif key == "author":
+                    conn.execute("DELETE FROM author_evolution")
+                    for event in items:
+                        self._insert_evolution(conn, event)
+                version = self._bump(conn, key, doc)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return version
+
+    def append(self, key: str, field: str, value: Any) -> int:
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if key == "history" and field == "chapters":
+                    self._insert_chapter(conn, value)
+                elif key == "review" and field == "reviews":
+                    self._insert_review(conn, value)
+                else:
+                    raise ValueError(f"Cannot append to {key}.{field}")
+                version = self._bump(conn, key)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return version
+
+    def index_setting(self, setting: Dict):
+        characters = setting.get("characters", {}) if isinstance(setting, dict) else {}
+        if not isinstance(characters, dict):
+            return
+        rows = []
+        for role in ("protagonist", "antagonist"):
+            char = characters.get(role)
+            if isinstance(char, dict) and char.get("name"):
+                rows.append((char["name"], role, codec.dumps(char)))
+        for char in characters.get("supporting", []) or []:
+            if isinstance(char, dict) and char.get("name"):
+                rows.append((char["name"], char.get("role", "supporting"), codec.dumps(char)))
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM characters")
+            conn.executemany("INSERT OR REPLACE INTO characters (name, role, data) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+
+    # --- Queries ---
+
+    def chapters_mentioning(self, name: str, include_folded: bool = True) -> List[Dict]:
+        """Chapter entries that involve character `name` (characters_involved, or named in the summary)."""
+        sql = """SELECT data FROM chapters WHERE (chapter IN (SELECT chapter FROM chapter_characters WHERE name = ?)
+                 OR summary LIKE ?)""" + ("" if include_folded else " AND active = 1") + " ORDER BY chapter"
+        with closing(self._connect()) as conn:
+            return [codec.loads(r["data"]) for r in conn.execute(sql, (name, f"%{name}%"))]
+
+    def reviews_below(self, score: float, chapter_range: Optional[Tuple[int, int]] = None) -> List[Dict]:
+        """Review records scoring under `score`, optionally within (first, last) chapters, e.g. one volume."""
+        sql, params = "SELECT data FROM reviews WHERE score < ?", [score]
+        if chapter_range:
+            sql += " AND chapter BETWEEN ? AND ?"
+            params += list(chapter_range)
+        with closing(self._connect()) as conn:
+            return [codec.loads(r["data"]) for r in conn.execute(sql + " ORDER BY chapter, attempt", params)]
+
+    def foreshadowing(self, since_chapter: int = 0) -> List[Dict]:
+        """Foreshadowing planted from `since_chapter` on: [{"chapter", "text"}]."""
+        with closing(self._connect()) as conn:
+            return [dict(r) for r in conn.execute(
+                "SELECT chapter, text FROM foreshadowing WHERE chapter >= ? ORDER BY chapter, id", (since_chapter,))]
+
+    def characters(self, role: Optional[str] = None) -> List[Dict]:
+        sql, params = "SELECT data FROM characters", ()
+        if role:
+            sql, params = sql + " WHERE role = ?", (role,)
+        with closing(self._connect()) as conn:
+            return [codec.loads(r["data"]) for r in conn.execute(sql + " ORDER BY name", params)]
+
+    def author_evolution(self, since: float = 0) -> List[Dict]:
+        with closing(self._connect()) as conn:
+            return [codec.loads(r["data"]) for r in conn.execute(
+                "SELECT data FROM author_evolution WHERE COALESCE(timestamp, 0) >= ? ORDER BY id", (since,))]
+
+    # --- Helpers ---
+
+    @staticmethod
+    def _bump(conn, key: str, doc: Optional[Dict] = None) -> int:
+        if doc is not None:
+            conn.execute("""INSERT INTO docs (key, data, version) VALUES (?, ?, 1)
+                            ON CONFLICT(key) DO UPDATE SET data = excluded.data, version = version + 1""",
+                         (key, codec.dumps(doc)))
+        else:
+            conn.execute("""INSERT INTO docs (key, data, version) VALUES (?, '{}', 1)
+                            ON CONFLICT(key) DO UPDATE SET version = version + 1""", (key,))
+        return conn.execute("SELECT version FROM docs WHERE key = ?", (key,)).fetchone()["version"]
+
+    @staticmethod
+    def _insert_chapter(conn, entry: Dict):
+        if not isinstance(entry, dict) or entry.get("chapter") is None:
+            return
+        chap = int(entry["chapter"])
+        conn.execute("""INSERT OR REPLACE INTO chapters (chapter, title, summary, score, active, data)
+                        VALUES (?, ?, ?, ?, 1, ?)""",
+                     (chap, entry.get("title"), entry.get("summary"), entry.get("score"),
+                      codec.dumps(entry)))
+        conn.execute("DELETE FROM chapter_characters WHERE chapter = ?", (chap,))
+        conn.executemany("INSERT OR IGNORE INTO chapter_characters (chapter, name) VALUES (?, ?)",
+                         [(chap, str(n)) for n in entry.get("characters_involved", []) or [] if n])
+        conn.execute("DELETE FROM foreshadowing WHERE chapter = ?", (chap,))
+        conn.executemany("INSERT INTO foreshadowing (chapter, text) VALUES (?, ?)",
+                         [(chap, str(f)) for f in entry.get("foreshadowing", []) or [] if f])
+
+    @staticmethod
+    def _insert_review(conn, review: Dict):
+        conn.execute("INSERT INTO reviews (chapter, attempt, score, passed, data) VALUES (?, ?, ?, ?, ?)",
+                     (review.get("chapter"), review.get("attempt"), review.get("score"),
+                      int(bool(review.get("passed"))), codec.dumps(review)))
+
+    @staticmethod
+    def _insert_evolution(conn, event: Dict):
+        event = event if isinstance(event, dict) else {"event": str(event)}
+        conn.execute("INSERT INTO author_evolution (timestamp, event, effect, data) VALUES (?, ?, ?, ?)",
+                     (event.get("timestamp"), event.get("event"), event.get("effect"),
+                      codec.dumps(event)))
+
+
+def import_json(novel_dir: str) -> str:
+    """
+    Copy a novel's JSON data (snapshots plus journals) into a new novel.db.
+    The JSON files are left in place as a backup; DataManager uses novel.db from now on.
+    """
+    from core.data_manager import DataManager
+    db_path = os.path.join(novel_dir, SQLiteStorage.FILENAME)
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists")
+    source = DataManager(novel_dir, enable_auto_repair=False, storage="json")
+    storage = SQLiteStorage(db_path + ".importing")
+    try:
+        for key in SQLiteStorage.KEYS:
+            source._load_file(key)
+            data = dict(source.data[key])
+            data.pop("journal_seq", None)
+            storage.save(key, data)
+        storage.index_setting(source.get_setting())
+    except Exception:
+        os.remove(storage.db_path)
+        raise
+    os.replace(storage.db_path, db_path)
+    return db_path
+
+
+def export_json(novel_dir: str, keep_db: bool = False) -> List[str]:
+    """
+    Write novel.db back to the JSON layout (history.json, review.json, author.json).
+    Unless keep_db, novel.db is renamed to novel.db.<timestamp>.bak so the JSON files are used again.
+    """
+    from core.data_manager import DataManager
+    storage = SQLiteStorage.for_novel(novel_dir)
+    if not storage:
+        raise FileNotFoundError(f"No {SQLiteStorage.FILENAME} in {novel_dir}")
+    target = DataManager(novel_dir, enable_auto_repair=False, storage="json")
+    written = []
+    for key in SQLiteStorage.KEYS:
+        data = storage.load(key)
+        if data is None:
+            continue
+        data.pop("journal_seq", None)
+        target.replace(key, data)
+        written.append(target.files[key])
+    if not keep_db:
+        os.replace(storage.db_path, f"{storage.db_path}.{int(time.time())}.bak")
+    return written
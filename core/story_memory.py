@@ -0,0 +1,177 @@
+import copy
+from typing import Dict, List, Optional, Tuple
+
+import config.prompt_config as prompt_config
+from core import codec
+
+
+class StoryMemory:
+    """
+    Hierarchical story memory: chapter -> arc -> volume -> book.
+    分层剧情记忆：章 -> 剧情段 -> 卷 -> 全书。
+
+    Archived chapter entries are folded into fixed-size arcs inside their volume.
+    Only the dirty path is recomputed: the touched arcs, their volumes, and the book.
+    So the work per fold depends on the arc and volume size, not the novel length.
+    The tree lives in history.json under "memory":
+        {"arcs": {start: {...}}, "volumes": {key: {...}}, "book": str, "book_volumes": [key], "prelude": str}
+    """
+
+    ARC_SIZE = 10            # Chapters per arc
+    ARCS_PER_VOLUME = 5      # Volume span when the novel has no volume skeleton
+    ARC_MAX_CHARS = 600
+    VOLUME_MAX_CHARS = 1200
+    BOOK_MAX_CHARS = 2000
+
+    def __init__(self, llm, structure_index=None, quiet: bool = False):
+        """
+        Args:
+            llm: LLM interface (chat_with_status / chat_quiet).
+            structure_index: Optional StructureIndex; volumes follow its skeleton when available.
+            quiet: Use the non-Live LLM path (for background threads).
+        """
+        self.llm = llm
+        self.structure_index = structure_index
+        self.quiet = quiet
+
+    @staticmethod
+    def empty(prelude: str = "") -> Dict:
+        """An empty tree. `prelude` keeps a legacy flat rolling_summary when a novel switches modes."""
+        return {"arcs": {}, "volumes": {}, "book": "", "book_volumes": [], "prelude": prelude}
+
+    # --- Tree layout ---
+
+    def volume_of(self, chap_num: int) -> Tuple[str, int, int]:
+        """(volume key, first chapter, last chapter) for `chap_num`."""
+        if self.structure_index:
+            volume = self.structure_index.volume_for(chap_num, include_phases=False)
+            if volume:
+                start, end = self.structure_index.bounds(chap_num)
+                return str(volume.get("volume_id", start)), start, end
+        span = self.ARC_SIZE * self.ARCS_PER_VOLUME
+        index = (chap_num - 1) // span
+        return str(index + 1), index * span + 1, (index + 1) * span
+
+    def arc_start(self, chap_num: int) -> int:
+        _, vol_start, _ = self.volume_of(chap_num)
+        return vol_start + ((chap_num - vol_start) // self.ARC_SIZE) * self.ARC_SIZE
+
+    # --- Updates ---
+
+    def fold(self, memory: Optional[Dict], chapters: List[Dict]) -> Optional[Dict]:
+        """
+        Fold archived chapter entries into the tree and return the updated copy.
+        Returns None if a summarization call failed (the caller should keep the chapters active).
+        """
+        memory = copy.deepcopy(memory) if memory else self.empty()
+        groups: Dict[int, List[Dict]] = {}
+        for entry in chapters:
+            chap = entry.get("chapter") if isinstance(entry, dict) else None
+            if chap is not None:
+                groups.setdefault(self.arc_start(int(chap)), []).append(entry)
+        if not groups:
+            return memory
+
+        # 1. Arcs
+        dirty_volumes = set()
+        for start, entries in sorted(groups.items()):
+            arc = memory["arcs"].get(str(start), {"chapter_start": start, "summary": ""})
+            summary = self._summarize(
+                prompt_config.STORY_COMPRESSION_SYSTEM.content,
+                f"【当前历史背景】\n{arc['summary']}\n\n【待压缩章节】\n{codec.dumps(entries, indent=True)}"
+                f"\n\n（本段摘要不超过 {self.ARC_MAX_CHARS} 字）",
+                f"正在归纳第 {start} 章起的剧情段...")
+            if summary is None:
+                return None
+            volume_key, vol_start, vol_end = self.volume_of(start)
+            arc.update({
+                "chapter_end": max(int(e["chapter"]) for e in entries + [{"chapter": arc.get("chapter_end", start)}]),
+                "volume": volume_key,
+                "summary": summary
+            })
+            memory["arcs"][str(start)] = arc
+            memory["volumes"].setdefault(volume_key, {"chapter_start": vol_start, "chapter_end": vol_end, "summary": ""})
+            dirty_volumes.add(volume_key)
+
+        # 2. Volumes (only those containing a dirty arc)
+        for volume_key in dirty_volumes:
+            arcs = self._arcs_of(memory, volume_key)
+            if len(arcs) == 1:
+                summary = arcs[0]["summary"]
+            else:
+                summary = self._rollup("卷", self.VOLUME_MAX_CHARS, [a["summary"] for a in arcs],
+                                       f"正在更新第 {volume_key} 卷摘要...")
+                if summary is None:
+                    return None
+            memory["volumes"][volume_key]["summary"] = summary
+
+        # 3. Book: fold in volumes that just closed (a later volume has started folding).
+        # Chapters fold in order, so a closed volume never becomes dirty again.
+        volumes = self._sorted_volumes(memory)
+        included = set(memory.get("book_volumes", []))
+        newly_closed = [(k, v) for k, v in volumes[:-1] if k not in included]
+        if newly_closed:
+            base = memory.get("book") or memory.get("prelude", "")
+            parts = ([base] if base else []) + [v["summary"] for _, v in newly_closed]
+            if len(parts) == 1:
+                book = parts[0]
+            else:
+                book = self._rollup("全书", self.BOOK_MAX_CHARS, parts, "正在更新全书摘要...")
+                if book is None:
+                    return None
+            memory["book"] = book
+            memory["book_volumes"] = [k for k, _ in volumes if k in included or any(k == n for n, _ in newly_closed)]
+        return memory
+
+    # --- Context assembly ---
+
+    def render(self, memory: Optional[Dict], current_chapter: int) -> str:
+        """
+        Story-so-far text with granularity by distance from `current_chapter`:
+        book summary for the distant past, the previous volume's summary, and the
+        arc summaries of the current volume. Active chapters are not included.
+        """
+        if not memory:
+            return ""
+        current_key, _, _ = self.volume_of(current_chapter)
+        earlier = [(k, v) for k, v in self._sorted_volumes(memory) if k != current_key]
+        blocks = []
+        if memory.get("book") and (len(earlier) > 1 or memory.get("prelude")):
+            # The book summary covers all closed volumes (and any legacy prelude)
+            blocks.append(f"【全书梗概】\n{memory['book']}")
+        elif memory.get("prelude"):
+            blocks.append(f"【前情提要】\n{memory['prelude']}")
+        if earlier:
+            key, volume = earlier[-1]
+            blocks.append(f"【上一卷（第 {key} 卷）】\n{volume.get('summary', '')}")
+        arcs = self._arcs_of(memory, current_key)
+        if arcs:
+            blocks.append("【本卷前情】\n" + "\n".join(
+                f"- 第 {a['chapter_start']}-{a.get('chapter_end', a['chapter_start'])} 章：{a['summary']}" for a in arcs))
+        return "\n\n".join(blocks)
+
+    # --- Helpers ---
+
+    @staticmethod
+    def _arcs_of(memory: Dict, volume_key: str) -> List[Dict]:
+        arcs = [a for a in memory.get("arcs", {}).values() if a.get("volume") == volume_key]
+        return sorted(arcs, key=lambda a: int(a["chapter_start"]))
+
+    @staticmethod
+    def _sorted_volumes(memory: Dict) -> List[Tuple[str, Dict]]:
+        return sorted(memory.get("volumes", {}).items(), key=lambda kv: int(kv[1].get("chapter_start", 0)))
+
+    def _rollup(self, level: str, max_chars: int, summaries: List[str], description: str) -> Optional[str]:
+        system = prompt_config.MEMORY_ROLLUP_SYSTEM.content.format(level=level, max_chars=max_chars)
+        body = "\n\n".join(f"[{i + 1}] {s}" for i, s in enumerate(summaries) if s)
+        return self._summarize(system, f"【下级摘要】\n{body}", description)
+
+    def _summarize(self, system: str, user: str, description: str) -> Optional[str]:
+        messages = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+        if self.quiet:
+            result = self.llm.chat_quiet(messages)
+        else:
+            result = self.llm.chat_with_status(messages, description)
+        if not result or "Error" in result:
+            return None
+        return result.strip()
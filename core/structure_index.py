@@ -0,0 +1,148 @@
+import bisect
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Progress thresholds and the stage each interval maps to (same labels as PacingAgent)
+STAGE_BOUNDS = [0.2, 0.5, 0.8]
+STAGE_LABELS = ["铺垫期 (0-20%)", "发展期 (20-50%)", "高潮期 (50-80%)", "收尾期 (80-100%)"]
+
+
+def _as_int(value, default: Optional[int] = None) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class StructureIndex:
+    """
+    Interval index over setting["pacing_guide"].
+    基于 pacing_guide 的区间索引，按章节号 O(log n) 查询所属卷/阶段、细纲与卷末状态。
+
+    All pacing_guide shapes are normalized here:
+      - list or {"structure": [...]}
+      - volume entries  {"volume_id", "chapter_start", "chapter_end", ...}   (long novels)
+      - phase entries   {"phase", "chapter_range": "1-5", "plot_point"}       (short novels)
+      - flat entries    {"chapter_id", ...}                                    (one per chapter)
+      - volume_details  {volume_id: {"chapters": [{"chapter", "title", "outline"}]}}
+    Build once per setting version (see DataManager.derived) rather than per chapter.
+    """
+
+    def __init__(self, pacing_guide):
+        guide = self.normalize(pacing_guide)
+        self.guide = guide
+        self.explicit_total = _as_int(guide.get("total_chapters"))
+
+        segments: List[Tuple[int, int, str, Dict]] = []
+        self.beats: Dict[int, Dict] = {}
+        flat_count = 0
+        for entry in guide.get("structure", []):
+            if not isinstance(entry, dict):
+                continue
+            if "chapter_end" in entry:
+                start, end = _as_int(entry.get("chapter_start"), 1), _as_int(entry.get("chapter_end"))
+                if end is not None:
+                    segments.append((start, end, "volume", entry))
+            elif "chapter_range" in entry:
+                bounds = [int(n) for n in re.findall(r"\d+", str(entry.get("chapter_range", "")))]
+                if bounds:
+                    segments.append((bounds[0], bounds[-1], "phase", entry))
+            elif "chapter_id" in entry:
+                flat_count += 1
+                chap = _as_int(entry.get("chapter_id"))
+                if chap is not None:
+                    self.beats[chap] = entry
+
+        details = guide.get("volume_details", {})
+        if isinstance(details, dict):
+            for plan in details.values():
+                for beat in (plan or {}).get("chapters", []) if isinstance(plan, dict) else []:
+                    chap = _as_int(beat.get("chapter")) if isinstance(beat, dict) else None
+                    if chap is not None:
+                        self.beats[chap] = beat
+
+        segments.sort(key=lambda s: s[0])
+        self._segments = segments
+        self._starts = [s[0] for s in segments]
+        self._volume_ends = {end for _, end, kind, _ in segments if kind == "volume"}
+
+        # Total implied by the structure itself (used when no explicit chapter_limit is configured).
+        # Short-novel phases are only guidance and never override the word-count target.
+        if self._volume_ends:
+            self.structure_total = max(self._volume_ends)
+        else:
+            self.structure_total = flat_count or None
+
+    @classmethod
+    def of(cls, data_manager) -> "StructureIndex":
+        """Shared index for a novel, rebuilt only when setting.json changes."""
+        return data_manager.derived("structure_index", "setting",
+                                    lambda setting: cls(setting.get("pacing_guide", {})))
+
+    @staticmethod
+    def normalize(pacing_guide) -> Dict:
+        """Return the pacing guide in dict form: {"structure": [...], ...}."""
+        if isinstance(pacing_guide, list):
+            return {"structure": pacing_guide}
+        if not isinstance(pacing_guide, dict):
+            return {"structure": []}
+        structure = pacing_guide.get("structure")
+        if not isinstance(structure, list):
+            pacing_guide = dict(pacing_guide, structure=[])
+        return pacing_guide
+
+    def _segment(self, chap_num: int) -> Optional[Tuple[int, int, str, Dict]]:
+        i = bisect.bisect_right(self._starts, chap_num) - 1
+        if i >= 0:
+            start, end, kind, entry = self._segments[i]
+            if start <= chap_num <= end:
+                return self._segments[i]
+        return None
+
+    def volume_for(self, chap_num: int, include_phases: bool = True) -> Optional[Dict]:
+        """The volume (or, if include_phases, short-novel phase) entry containing `chap_num`."""
+        segment = self._segment(chap_num)
+        if not segment or (not include_phases and segment[2] != "volume"):
+            return None
+        return segment[3]
+
+    def bounds(self, chap_num: int) -> Optional[Tuple[int, int]]:
+        """(first, last) chapter of the volume/phase containing `chap_num`."""
+        segment = self._segment(chap_num)
+        return (segment[0], segment[1]) if segment else None
+
+    def volumes(self) -> List[Dict]:
+        return [entry for _, _, kind, entry in self._segments if kind == "volume"]
+
+    def beat_for(self, chap_num: int) -> Optional[Dict]:
+        """Planned beat for `chap_num` (volume detail outline or flat structure entry)."""
+        return self.beats.get(chap_num)
+
+    def is_volume_end(self, chap_num: int) -> bool:
+        return chap_num in self._volume_ends
+
+    def total_chapters(self, default: int, chapter_limit: Optional[int] = None) -> int:
+        """
+        Target chapter count. An explicit pacing_guide.total_chapters wins; otherwise the
+        structure's last chapter, unless the user configured a chapter_limit.
+        """
+        if self.explicit_total:
+            return self.explicit_total
+        if self.structure_total and not chapter_limit:
+            return self.structure_total
+        return default
+
+    @staticmethod
+    def stage(progress: float) -> str:
+        return STAGE_LABELS[bisect.bisect_right(STAGE_BOUNDS, progress)]
+
+    def lookup(self, chap_num: int, total: int) -> Dict:
+        """Everything the pacing logic needs to know about one chapter."""
+        progress = chap_num / total if total > 0 else 0
+        return {
+            "volume": self.volume_for(chap_num),
+            "beat": self.beat_for(chap_num),
+            "is_volume_end": self.is_volume_end(chap_num),
+            "stage": self.stage(progress),
+            "progress": progress
+        }
@@ -0,0 +1,90 @@
+import math
+import re
+import threading
+from typing import Callable, Dict, Optional
+from rich.console import Console
+
+console = Console()
+
+# CJK ideographs, kana, hangul and full-width punctuation: roughly one token per character
+_CJK_RE = re.compile(r"[　-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]")
+# Latin text and code average about 4 characters per token; 3.5 keeps the estimate on the safe side
+_CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast CJK-aware token estimate (no tokenizer needed).
+    快速的中日韩感知 token 估算。
+
+    Deliberately errs high, since it is used to stay under context windows.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / _CHARS_PER_TOKEN)
+
+
+def _tiktoken_counter(name: str) -> Callable[[str], int]:
+    import tiktoken
+    try:
+        encoding = tiktoken.get_encoding(name)
+    except ValueError:
+        encoding = tiktoken.encoding_for_model(name)
+    return lambda text: len(encoding.encode(text, disallowed_special=())) if text else 0
+
+
+def _hf_counter(name: str) -> Callable[[str], int]:
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False)) if text else 0
+
+
+# Tokenizer families: "family:name" in a model's "tokenizer" field picks the factory
+_FACTORIES: Dict[str, Callable[[str], Callable[[str], int]]] = {
+    "tiktoken": _tiktoken_counter,   # e.g. "tiktoken:o200k_base" (OpenAI models)
+    "hf": _hf_counter,               # e.g. "hf:Qwen/Qwen2.5-7B-Instruct" (local / open-weight models)
+}
+_counters: Dict[str, Callable[[str], int]] = {}
+_lock = threading.Lock()
+
+
+def register_tokenizer(family: str, factory: Callable[[str], Callable[[str], int]]):
+    """Register a tokenizer family. `factory(name)` returns a function text -> token count."""
+    with _lock:
+        _FACTORIES[family] = factory
+        for spec in [s for s in _counters if s.split(":", 1)[0] == family]:
+            del _counters[spec]
+
+
+def get_counter(spec: Optional[str] = None) -> Callable[[str], int]:
+    """
+    Token counter for a tokenizer spec ("family:name"). Loaded once per spec.
+    Falls back to estimate_tokens when the spec is empty, unknown, or its library is missing.
+    """
+    if not spec:
+        return estimate_tokens
+    with _lock:
+        counter = _counters.get(spec)
+        if counter:
+            return counter
+        family, _, name = spec.partition(":")
+        factory = _FACTORIES.get(family)
+        try:
+            if not factory:
+                raise ValueError(f"unknown tokenizer family '{family}'")
+            counter = factory(name)
+        except Exception as e:
+            console.print(f"[yellow]分词器 {spec} 不可用 ({e})，改用估算。[/yellow]")
+            counter = estimate_tokens
+        _counters[spec] = counter
+        return counter
+
+
+def counter_for(model_config: Optional[Dict]) -> Callable[[str], int]:
+    """Token counter for a model config dict from llm.json (its "tokenizer" field)."""
+    return get_counter((model_config or {}).get("tokenizer"))
+
+
+def count_tokens(text: str, spec: Optional[str] = None) -> int:
+    return get_counter(spec)(text)
@@ -0,0 +1,69 @@
+import argparse
+from rich.console import Console
+from rich.table import Table
+
+from core.job_queue import create_broker, JobCoordinator, JobWorker, run_local_workers
+
+console = Console()
+
+
+def cmd_enqueue(args):
+    coordinator = JobCoordinator(create_broker(args.broker))
+    for novel_dir in args.novel:
+        if args.mode == "novel":
+            job_id = coordinator.enqueue_novel(novel_dir, args.chapters, priority=args.priority)
+            console.print(f"[green]已入队任务 #{job_id}: {novel_dir} ({args.chapters} 章)[/green]")
+        else:
+            job_ids = coordinator.enqueue_chapters(novel_dir, args.chapters, priority=args.priority)
+            console.print(f"[green]已入队 {len(job_ids)} 个章节任务: {novel_dir}[/green]")
+
+
+def cmd_worker(args):
+    if args.processes > 1:
+        run_local_workers(args.broker, args.processes, lease_seconds=args.lease, exit_when_idle=args.exit_when_idle)
+    else:
+        JobWorker(create_broker(args.broker), lease_seconds=args.lease).run(exit_when_idle=args.exit_when_idle)
+
+
+def cmd_status(args):
+    broker = create_broker(args.broker)
+    table = Table(title="任务队列")
+    for col in ["ID", "类型", "小说", "参数", "状态", "Worker", "尝试", "错误"]:
+        table.add_column(col)
+    for job in broker.list_jobs(args.novel):
+        table.add_row(str(job["id"]), job["kind"], job["novel_dir"], str(job["payload"]), job["status"],
+                      job.get("worker") or "", str(job["attempts"]), (job.get("error") or "")[:60])
+    console.print(table)
+    console.print(broker.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NovelTerminal distributed chapter job queue / 分布式章节任务队列")
+    parser.add_argument("--broker", default="jobs.db",
+                        help="Broker spec, e.g. sqlite:///mnt/shared/jobs.db (a bare path means SQLite)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_enqueue = sub.add_parser("enqueue", help="Enqueue chapter or novel jobs")
+    p_enqueue.add_argument("novel", nargs="+", help="Novel directories")
+    p_enqueue.add_argument("--chapters", type=int, default=1)
+    p_enqueue.add_argument("--mode", choices=["chapter", "novel"], default="chapter",
+                           help="chapter: one job per chapter; novel: one job for all chapters")
+    p_enqueue.add_argument("--priority", type=int, default=1)
+    p_enqueue.set_defaults(func=cmd_enqueue)
+
+    p_worker = sub.add_parser("worker", help="Run worker process(es) on this host")
+    p_worker.add_argument("--processes", type=int, default=1)
+    p_worker.add_argument("--lease", type=float, default=600.0, help="Lease duration in seconds")
+    p_worker.add_argument("--exit-when-idle", action="store_true")
+    p_worker.set_defaults(func=cmd_worker)
+
+    p_status = sub.add_parser("status", help="Show queue status")
+    p_status.add_argument("--novel", default=None)
+    p_status.set_defaults(func=cmd_status)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+from rich.console import Console
+from rich.table import Table
+
+from core.data_manager import DataManager
+from core.storage import SQLiteStorage, import_json, export_json
+from core.structure_index import StructureIndex
+
+console = Console()
+
+
+def _open_storage(novel_dir: str) -> SQLiteStorage:
+    storage = SQLiteStorage.for_novel(novel_dir)
+    if not storage:
+        raise SystemExit(f"{novel_dir} 尚未导入 SQLite（先运行 import）")
+    return storage
+
+
+def cmd_import(args):
+    for novel_dir in args.novel:
+        db_path = import_json(novel_dir)
+        console.print(f"[green]已导入 {novel_dir} -> {db_path}（原 JSON 文件保留为备份）[/green]")
+
+
+def cmd_export(args):
+    for novel_dir in args.novel:
+        written = export_json(novel_dir, keep_db=args.keep_db)
+        console.print(f"[green]已导出 {novel_dir}: {', '.join(written)}[/green]")
+
+
+def cmd_chapters(args):
+    storage = _open_storage(args.novel)
+    table = Table(title=f"涉及「{args.character}」的章节")
+    for col in ["章节", "标题", "摘要"]:
+        table.add_column(col)
+    for entry in storage.chapters_mentioning(args.character):
+        table.add_row(str(entry.get("chapter")), entry.get("title", ""), (entry.get("summary") or "")[:60])
+    console.print(table)
+
+
+def cmd_reviews(args):
+    storage = _open_storage(args.novel)
+    chapter_range = None
+    if args.volume is not None:
+        index = StructureIndex.of(DataManager(args.novel, enable_auto_repair=False))
+        volume = next((v for v in index.volumes() if str(v.get("volume_id")) == str(args.volume)), None)
+        if not volume:
+            raise SystemExit(f"未找到第 {args.volume} 卷")
+        chapter_range = (int(volume["chapter_start"]), int(volume["chapter_end"]))
+    table = Table(title=f"评分低于 {args.below} 的审核记录")
+    for col in ["章节", "轮次", "评分", "通过", "建议"]:
+        table.add_column(col)
+    for review in storage.reviews_below(args.below, chapter_range):
+        table.add_row(str(review.get("chapter")), str(review.get("attempt", "")), str(review.get("score")),
+                      "是" if review.get("passed") else "否",
+                      json.dumps(review.get("suggestions", ""), ensure_ascii=False)[:60])
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NovelTerminal SQLite storage tool / 小说数据 SQLite 存储工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="Import JSON files into novel.db")
+    p_import.add_argument("novel", nargs="+", help="Novel directories")
+    p_import.set_defaults(func=cmd_import)
+
+    p_export = sub.add_parser("export", help="Export novel.db back to JSON files")
+    p_export.add_argument("novel", nargs="+", help="Novel directories")
+    p_export.add_argument("--keep-db", action="store_true", help="Keep using novel.db after exporting")
+    p_export.set_defaults(func=cmd_export)
+
+    p_chapters = sub.add_parser("chapters", help="Chapters involving a character")
+    p_chapters.add_argument("novel")
+    p_chapters.add_argument("--character", required=True)
+    p_chapters.set_defaults(func=cmd_chapters)
+
+    p_reviews = sub.add_parser("reviews", help="Reviews scoring below a threshold")
+    p_reviews.add_argument("novel")
+    p_reviews.add_argument("--below", type=float, default=80)
+    p_reviews.add_argument("--volume", default=None, help="Only chapters of this volume_id")
+    p_reviews.set_defaults(func=cmd_reviews)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()